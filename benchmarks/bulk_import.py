@@ -0,0 +1,68 @@
+"""Compare writing imported recipes one at a time with add_recs_bulk.
+
+"add_rec" is the write path Importer.commit_rec used to take for every
+recipe: add_rec, add_ings and update_hashes. "add_recs_bulk" is what the
+importer now does with each batch of recipes.
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.common import CATEGORIES, CUISINES, UNITS, sentence, temporary_database
+
+
+def make_recs(n_recipes, seed=0):
+    rand = random.Random(seed)
+    recs = []
+    for _ in range(n_recipes):
+        ingredients = []
+        for pos in range(10):
+            item = sentence(rand, 2)
+            ingredients.append({"amount": rand.randint(1, 8) / 2, "unit": rand.choice(UNITS), "item": item, "ingkey": item.split()[-1], "position": pos})
+        recs.append(
+            {
+                "title": sentence(rand, 3).title(),
+                "instructions": sentence(rand, 60),
+                "cuisine": rand.choice(CUISINES),
+                "category": ", ".join(rand.sample(CATEGORIES, 2)),
+                "rating": rand.randint(0, 10),
+                "ingredients": ingredients,
+            }
+        )
+    return recs
+
+
+def add_one_at_a_time(rd, recs):
+    for rec in recs:
+        ings = rec.pop("ingredients")
+        r = rd.add_rec(rec)
+        for i in ings:
+            i["recipe_id"] = r.id
+        rd.add_ings(ings)
+        rd.update_hashes(r)
+
+
+def add_in_batches(rd, recs, batch_size):
+    for start in range(0, len(recs), batch_size):
+        rd.add_recs_bulk(recs[start : start + batch_size])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipes", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    print("%d recipes with 10 ingredients each" % args.recipes)
+    for name, add in [("add_rec", add_one_at_a_time), ("add_recs_bulk", lambda rd, recs: add_in_batches(rd, recs, args.batch_size))]:
+        rd = temporary_database()
+        recs = make_recs(args.recipes)
+        start = time.perf_counter()
+        add(rd, recs)
+        elapsed = time.perf_counter() - start
+        print("%-14s %8.2f s %10.0f recipes/s" % (name, elapsed, args.recipes / elapsed))
+
+
+if __name__ == "__main__":
+    main()
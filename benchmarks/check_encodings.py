@@ -0,0 +1,76 @@
+"""Compare reading a big text file with the old and the staged encoding detection.
+
+"whole file" is how check_encodings used to read a file: it read all of it
+and kept a copy decoded in each encoding it might be in, then split the
+chosen one into a list of lines. "staged" is GetFile, which reads only
+samples to choose an encoding and decodes lines as they are iterated
+over. Each is timed going through every line, with the peak memory that
+tracemalloc sees.
+"""
+
+import argparse
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from benchmarks.common import sentence
+from gourmand import check_encodings
+
+
+def whole_file(filename):
+    with open(filename, "rb") as fin:
+        txt = fin.read()
+    possible_encodings = {}
+    for e in check_encodings.CheckEncoding.encodings:
+        try:
+            d = txt.decode(e)
+            if d and (d not in possible_encodings.values()):
+                possible_encodings[e] = d
+        except UnicodeDecodeError:
+            pass
+    # Ask for the first, as the user might.
+    return possible_encodings[next(iter(possible_encodings))].splitlines()
+
+
+def staged(filename):
+    check_encodings.getEncoding = lambda encodings: next(iter(encodings))
+    return check_encodings.get_file(filename)
+
+
+def make_text(rand, megabytes):
+    lines, size = [], 0
+    while size < megabytes * 2**20:
+        line = sentence(rand, 12)
+        if rand.random() < 0.05:
+            line += " caf\xe9 cr\xe8me br\xfbl\xe9e"
+        lines.append(line)
+        size += len(line) + 2
+    return "\r\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megabytes", type=int, default=50)
+    args = parser.parse_args()
+
+    directory = Path(tempfile.mkdtemp(prefix="gourmand-benchmark-"))
+    text = make_text(random.Random(0), args.megabytes)
+    print("%d MB of text" % args.megabytes)
+    print("%-10s %-12s %10s %12s" % ("file", "", "time", "peak memory"))
+    for encoding in ["latin_1", "utf-8"]:
+        filename = str(directory / ("recipes.%s.txt" % encoding))
+        Path(filename).write_bytes(text.encode(encoding))
+        for name, read in [("whole file", whole_file), ("staged", staged)]:
+            tracemalloc.start()
+            start = time.perf_counter()
+            n_lines = sum(1 for line in read(filename))
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print("%-10s %-12s %8.2f s %9.1f MB  (%d lines)" % (encoding, name, elapsed, peak / 2**20, n_lines))
+
+
+if __name__ == "__main__":
+    main()
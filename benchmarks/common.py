@@ -0,0 +1,90 @@
+"""Helpers shared by the benchmark scripts.
+
+The benchmarks are plain scripts rather than tests, as they are far too
+slow for the test suite. Run them from the top of the source tree, e.g.:
+
+    python -m benchmarks.fts_search --recipes 50000
+"""
+
+import random
+import tempfile
+import time
+from pathlib import Path
+
+WORDS = (
+    "apple banana carrot dill egg flour garlic honey ice jam kale lemon mint nutmeg olive pepper quince rice "
+    "saffron thyme udon vanilla walnut yam zucchini bake boil braise chop dice fry grill knead mash roast simmer "
+    "stew whisk quick easy spicy sweet savory fresh hearty crisp golden creamy smoky tangy"
+).split()
+CATEGORIES = ["Dessert", "Entree", "Appetizer", "Soup", "Salad", "Bread", "Breakfast", "Drink", "Sauce", "Side"]
+CUISINES = ["American", "French", "Italian", "Mexican", "Indian", "Chinese", "Thai", "Greek", "Spanish", "Japanese"]
+UNITS = ["c.", "tbs.", "tsp.", "lb.", "oz.", "g.", "", "pinch"]
+
+
+def temporary_database():
+    """Return a RecData for a new, empty database in a temporary directory."""
+    from gourmand.backends.db import RecData
+
+    path = Path(tempfile.mkdtemp(prefix="gourmand-benchmark-")) / "recipes.db"
+    # Without a filename, like get_database(), so that bringing the new
+    # database up to date doesn't back it up behind a modal dialog.
+    return RecData(None, "sqlite:///%s" % path)
+
+
+def sentence(rand, length):
+    return " ".join(rand.choice(WORDS) for _ in range(length))
+
+
+def populate(rd, n_recipes, ingredients_per_recipe=10, seed=0):
+    """Fill rd with n_recipes generated recipes and return their IDs."""
+    rand = random.Random(seed)
+    start = (rd.db.execute("SELECT max(id) FROM recipe").scalar() or 0) + 1
+    ids = list(range(start, start + n_recipes))
+    recipes, categories, ingredients = [], [], []
+    for rid in ids:
+        recipes.append(
+            {
+                "id": rid,
+                "title": sentence(rand, 3).title(),
+                "instructions": sentence(rand, 60),
+                "modifications": sentence(rand, 10),
+                "description": sentence(rand, 15),
+                "cuisine": rand.choice(CUISINES),
+                "source": sentence(rand, 2),
+                "rating": rand.randint(0, 10),
+                "deleted": False,
+            }
+        )
+        for c in rand.sample(CATEGORIES, 2):
+            categories.append({"recipe_id": rid, "category": c})
+        for pos in range(ingredients_per_recipe):
+            item = sentence(rand, 2)
+            ingredients.append(
+                {
+                    "recipe_id": rid,
+                    "amount": rand.randint(1, 8) / 2,
+                    "unit": rand.choice(UNITS),
+                    "item": item,
+                    "ingkey": item.split()[-1],
+                    "position": pos,
+                    "deleted": False,
+                }
+            )
+    # Child rows first, so each recipe's row in the full-text index is
+    # written once, when the recipe itself is inserted.
+    rd.db.execute(rd.ingredients_table.insert(), ingredients)
+    rd.db.execute(rd.categories_table.insert(), categories)
+    rd.db.execute(rd.recipe_table.insert(), recipes)
+    return ids
+
+
+def best_time(func, repeat=5):
+    """Return the best wall-clock time of repeat calls to func, in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
@@ -0,0 +1,96 @@
+"""Compare ways of finding every duplicate recipe in a database.
+
+We generate recipes, then plant copies of some of them: exact copies,
+and near copies with another word in the title and another amount for
+one ingredient.
+
+"per recipe" looks up the recipes sharing each recipe's hashes, one
+query per recipe, as callers had to while find_all_duplicates was not
+implemented. "group by" is find_all_duplicates, and "near" is
+find_all_duplicates(near=True). Precision and recall count pairs of
+recipes: exact copies are what "per recipe" and "group by" should find,
+and "near" should find both kinds of copy.
+"""
+
+import argparse
+import copy
+import itertools
+import random
+import time
+
+from sqlalchemy import select
+
+from benchmarks.bulk_import import make_recs
+from benchmarks.common import WORDS, temporary_database
+
+
+def plant_duplicates(recs, share, rand):
+    """Append exact and near copies of a share of recs each.
+
+    Return the pairs of indexes into recs of exact and of near copies.
+    """
+    exact, near = set(), set()
+    originals = rand.sample(range(len(recs)), 2 * int(len(recs) * share))
+    for n, original in enumerate(originals):
+        dup = copy.deepcopy(recs[original])
+        if n % 2:
+            dup["title"] += " " + rand.choice(WORDS).title()
+            ing = rand.choice(dup["ingredients"])
+            ing["amount"] += 1
+            near.add((original, len(recs)))
+        else:
+            exact.add((original, len(recs)))
+        recs.append(dup)
+    return exact, near
+
+
+def per_recipe(rd):
+    r = rd.recipe_table.c
+    seen, groups = set(), []
+    for rec in select([r.id, r.recipe_hash, r.ingredient_hash]).execute().fetchall():
+        if rec.id in seen:
+            continue
+        ids = [row.id for row in select([r.id]).where(r.recipe_hash == rec.recipe_hash, r.ingredient_hash == rec.ingredient_hash).execute()]
+        seen.update(ids)
+        if len(ids) > 1:
+            groups.append(ids)
+    return groups
+
+
+def pairs(groups):
+    return set(pair for group in groups for pair in itertools.combinations(sorted(group), 2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipes", type=int, default=100000)
+    parser.add_argument("--share", type=float, default=0.05, help="share of recipes to copy exactly, and again to copy nearly")
+    args = parser.parse_args()
+
+    rand = random.Random(0)
+    recs = make_recs(args.recipes)
+    exact, near = plant_duplicates(recs, args.share, rand)
+    rd = temporary_database()
+    ids = []
+    for start in range(0, len(recs), 1000):
+        ids.extend(rd.add_recs_bulk(recs[start : start + 1000]))
+    exact = set(tuple(sorted((ids[a], ids[b]))) for a, b in exact)
+    near = set(tuple(sorted((ids[a], ids[b]))) for a, b in near)
+    print("%d recipes, %d exact and %d near copies planted" % (len(ids), len(exact), len(near)))
+
+    for name, find, expected in [
+        ("per recipe", lambda: per_recipe(rd), exact),
+        ("group by", lambda: rd.find_all_duplicates(), exact),
+        ("near", lambda: rd.find_all_duplicates(near=True), exact | near),
+    ]:
+        start = time.perf_counter()
+        groups = find()
+        elapsed = time.perf_counter() - start
+        found = pairs(groups)
+        precision = len(found & expected) / len(found) if found else 1
+        recall = len(found & expected) / len(expected)
+        print("%-10s %8.2f s %8d groups   precision %.3f   recall %.3f" % (name, elapsed, len(groups), precision, recall))
+
+
+if __name__ == "__main__":
+    main()
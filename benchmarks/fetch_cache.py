@@ -0,0 +1,49 @@
+"""Time the point lookups fetch_one and friends make, with and without
+the cache of compiled statements.
+
+"uncached" sets query_cache_size to 0, so that each call builds and
+compiles its statement, as every call did before the cache.
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.common import WORDS, temporary_database
+
+LOOKUPS = [
+    ("fetch_one(keylookup, item=x)", lambda rd, x: rd.fetch_one(rd.keylookup_table, item=x)),
+    ("fetch_one(keylookup, word=, item=)", lambda rd, x: rd.fetch_one(rd.keylookup_table, word=x.split()[0], item=x)),
+    ("fetch_len(keylookup, item=x)", lambda rd, x: rd.fetch_len(rd.keylookup_table, item=x)),
+    ("fetch_all(keylookup, item=x)", lambda rd, x: rd.fetch_all(rd.keylookup_table, item=x, sort_by=[("count", -1)])),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--keys", type=int, default=1000)
+    args = parser.parse_args()
+
+    rand = random.Random(0)
+    rd = temporary_database()
+    items = sorted(set("%s %s" % (rand.choice(WORDS), rand.choice(WORDS)) for _ in range(args.keys)))
+    rd.db.execute(rd.keylookup_table.insert(), [{"word": i.split()[0], "item": i, "ingkey": i.split()[-1], "count": 1} for i in items])
+    queries = [rand.choice(items) for _ in range(args.calls)]
+
+    print("%d calls over %d keys" % (args.calls, len(items)))
+    print("%-36s %14s %12s" % ("lookup", "uncached (s)", "cached (s)"))
+    for name, lookup in LOOKUPS:
+        times = []
+        for size in [0, type(rd).query_cache_size]:
+            rd.query_cache_size = size
+            start = time.perf_counter()
+            for x in queries:
+                lookup(rd, x)
+            times.append(time.perf_counter() - start)
+        print("%-36s %14.3f %12.3f" % (name, times[0], times[1]))
+    print(rd.query_cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Compare "anywhere" searches through recipe_fts with plain LIKE searches."""
+
+import argparse
+
+from benchmarks.common import best_time, populate, temporary_database
+
+QUERIES = ["garlic", "quick bake", "zucc", "golden honey", "no such thing"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipes", type=int, default=50000)
+    args = parser.parse_args()
+
+    rd = temporary_database()
+    populate(rd, args.recipes)
+    print("%d recipes, full text index available: %s" % (args.recipes, rd.has_full_text_index))
+    print("%-16s %10s %10s %10s" % ("query", "matches", "LIKE (s)", "FTS5 (s)"))
+    for query in QUERIES:
+        searches = [{"column": "deleted", "operator": "=", "search": False}, {"column": "anywhere", "operator": "LIKE", "search": "%" + query + "%"}]
+        rd.has_full_text_index = False
+        like_time = best_time(lambda: rd.search_recipes(searches), repeat=3)
+        rd.has_full_text_index = True
+        fts_time = best_time(lambda: rd.search_recipes(searches), repeat=3)
+        print("%-16s %10d %10.3f %10.3f" % (query, len(rd.search_recipes(searches)), like_time, fts_time))
+
+
+if __name__ == "__main__":
+    main()
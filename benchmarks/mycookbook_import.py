@@ -0,0 +1,124 @@
+"""Compare importing a MyCookbook archive with and without unzipping it first.
+
+"unzipped" is how the MCB plugin used to import: it unzipped the archive
+to a temporary directory, parsed the XML with lxml to fix it, wrote it
+out again and then parsed that with SAX, loading images from the
+directory. "streamed" is the current plugin, which parses the XML
+straight from the archive and reads images from it as recipes refer to
+them.
+
+Each runs in a new process, into a new database, and reports the
+process's peak resident memory, the libxml2 tree included, and what it
+wrote to disk besides the database. With images in the archive, the
+importer's own recipes and the database outweigh the XML tree, so the
+disk is where most of the difference lies.
+"""
+
+import argparse
+import io
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from benchmarks.common import UNITS, sentence
+
+RECIPE = """<recipe>
+<title>%(title)s</title>
+<preptime>P0DT0H25M</preptime>
+<cooktime>P0DT0H35M</cooktime>
+<ingredient>%(ingredients)s</ingredient>
+<recipetext>%(instructions)s</recipetext>
+<url>https://example.com/recipes/%(n)s</url>
+%(image)s</recipe>
+"""
+
+
+def make_archive(filename, n_recipes, n_images, seed=0):
+    from PIL import Image
+
+    rand = random.Random(seed)
+    image_every = max(1, n_recipes // n_images) if n_images else 0
+    with zipfile.ZipFile(filename, "w", zipfile.ZIP_DEFLATED) as zf:
+        recipes = []
+        for n in range(n_recipes):
+            image = ""
+            if image_every and n % image_every == 0 and n // image_every < n_images:
+                name = "recipe%05d.jpg" % n
+                out = io.BytesIO()
+                Image.effect_noise((160, 120), 64).convert("RGB").save(out, "jpeg")
+                zf.writestr("images/" + name, out.getvalue())
+                image = "<imagepath>/storage/emulated/0/MyCookbook/images/%s</imagepath>\n" % name
+            ingredients = "\n".join("<li>%s %s %s</li>" % (rand.randint(1, 4), rand.choice(UNITS), sentence(rand, 2)) for _ in range(8))
+            instructions = "\n".join("<li>%s</li>" % escape(sentence(rand, 20)) for _ in range(4))
+            recipes.append(RECIPE % {"title": sentence(rand, 4).title(), "ingredients": ingredients, "instructions": instructions, "n": n, "image": image})
+        zf.writestr("My_cookbook.xml", '<?xml version="1.0" encoding="utf-8"?>\n<cookbook version="66">\n%s</cookbook>\n' % "".join(recipes))
+
+
+def unzipped_importer(filename):
+    from lxml import etree
+
+    from gourmand.importers import xml_importer
+    from gourmand.plugins.import_export.mycookbook_plugin import mycookbook_importer
+
+    class UnzippedConverter(mycookbook_importer.Converter):
+        def do_run(self):
+            xml_importer.Converter.do_run(self)
+
+        def open_image(self, imagepath):
+            path = os.path.join(os.path.dirname(self.fn), "images", os.path.basename(imagepath))
+            return open(path, "rb") if os.path.isfile(path) else None
+
+    tempdir = tempfile.mkdtemp("mcb_zip")
+    with zipfile.ZipFile(filename) as zf:
+        zf.extractall(tempdir)
+        xmlfilename = os.path.join(tempdir, [name for name in zf.namelist() if name.endswith(".xml")][0])
+    tree = etree.parse(xmlfilename, etree.XMLParser(recover=True))
+    with open(xmlfilename + "fixed", "wb") as fout:
+        tree.write(fout, xml_declaration=True, encoding="utf-8", pretty_print=True)
+    converter = UnzippedConverter(xmlfilename + "fixed")
+    converter.tempdir = tempdir
+    return converter
+
+
+def run(name, filename, directory):
+    # A database of our own, set up before gourmand is imported.
+    os.environ["XDG_DATA_HOME"] = directory
+    os.makedirs(os.path.join(directory, "gourmand"))
+    from gourmand.plugins.import_export.mycookbook_plugin.mycookbook_importer_plugin import MCBPlugin
+
+    start = time.perf_counter()
+    importer = unzipped_importer(filename) if name == "unzipped" else MCBPlugin().get_importer(filename)
+    importer.do_run()
+    elapsed = time.perf_counter() - start
+    written = 0
+    if hasattr(importer, "tempdir"):
+        written = sum(path.stat().st_size for path in Path(importer.tempdir).rglob("*") if path.is_file())
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, written / 2**20, importer.rh.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipes", type=int, default=10000)
+    parser.add_argument("--images", type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = Path(tempfile.mkdtemp(prefix="gourmand-benchmark-"))
+    filename = str(directory / "cookbook.mcb")
+    make_archive(filename, args.recipes, args.images)
+    print("%d recipes, %d images, %.1f MB archive" % (args.recipes, args.images, os.path.getsize(filename) / 2**20))
+    context = multiprocessing.get_context("spawn")
+    for name in ["unzipped", "streamed"]:
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            elapsed, peak, written, count = executor.submit(run, name, filename, str(directory / name)).result()
+        print("%-10s %8.2f s %8.0f MB peak RSS %8.1f MB on disk %8d recipes" % (name, elapsed, peak, written, count))
+
+
+if __name__ == "__main__":
+    main()
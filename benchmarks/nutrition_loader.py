@@ -0,0 +1,58 @@
+"""Compare the ways of filling the nutrition tables from the USDA data.
+
+"line by line" is how DatabaseGrabber used to load the USDA files: one
+parse_line and one INSERT per line. "bulk" is load_usda_data, which parses
+the files with csv and writes them with one executemany per table.
+"prebuilt" copies the tables from the database that
+build_nutrition_database makes when Gourmand is built; building that
+database is not timed.
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import temporary_database
+
+
+def nutrition_database():
+    from gourmand.plugins.nutritional_information.data_plugin import NutritionDataPlugin
+
+    rd = temporary_database()
+    plugin = NutritionDataPlugin()
+    plugin.db = rd
+    plugin.create_tables()
+    rd.metadata.create_all()
+    return rd
+
+
+def load_bulk(rd):
+    from gourmand.plugins.nutritional_information import databaseGrabber
+
+    with rd.db.connect() as connection:
+        databaseGrabber.load_usda_data(connection, rd.nutrition_table, rd.usda_weights_table)
+
+
+def main():
+    from gourmand.plugins.nutritional_information import databaseGrabber
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.parse_args()
+
+    prebuilt = Path(tempfile.mkdtemp(prefix="gourmand-benchmark-")) / "nutrition.sqlite"
+    databaseGrabber.build_nutrition_database(prebuilt)
+    for name, load in [
+        ("line by line", lambda rd: databaseGrabber.DatabaseGrabber(rd).grab_data_line_by_line()),
+        ("bulk", load_bulk),
+        ("prebuilt", lambda rd: rd.load_nutrition_database(prebuilt)),
+    ]:
+        rd = nutrition_database()
+        start = time.perf_counter()
+        load(rd)
+        elapsed = time.perf_counter() - start
+        print("%-14s %8.2f s %8d foods" % (name, elapsed, rd.fetch_len(rd.nutrition_table)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Compare summing nutrients field by field with NutritionInfoList's vectors.
+
+"recursive" is how NutritionInfoList used to answer each attribute: by
+asking every ingredient for it and summing. "vectors" is the current
+NutritionInfoList, which sums all fields at once the first time one is
+asked for.
+
+"label" asks a new list for every summable field, as the nutrition label
+does when it is drawn; "bulk" asks many recipes for the fields that the
+nutrition export plugin writes out for each of them.
+"""
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+
+from gourmand.plugins.nutritional_information.nutrition import NutritionInfo, NutritionInfoList, nutrient_vector
+from gourmand.plugins.nutritional_information.parser_data import SUMMABLE_FIELDS
+
+# What export_plugin reads from MAIN_NUT_LAYOUT.
+EXPORT_FIELDS = ["kcal", "fasat", "famono", "fapoly", "cholestrl", "sodium", "carb", "fiber", "sugar", "protein"]
+
+
+def recursive_getattr(nutinfo, attr):
+    if isinstance(nutinfo, NutritionInfoList):
+        return sum(recursive_getattr(ni, attr) for ni in nutinfo)
+    return getattr(nutinfo, attr)
+
+
+def make_rows(n_rows, seed=0):
+    rand = random.Random(seed)
+    return [SimpleNamespace(desc="ROW %s" % n, **{field: rand.uniform(0, 100) for field in SUMMABLE_FIELDS}) for n in range(n_rows)]
+
+
+def make_recipe(rand, rows, vectors, n_ingredients):
+    # Like NutritionData, share one vector between every use of a row.
+    ingredients = []
+    for n in rand.choices(range(len(rows)), k=n_ingredients):
+        ingredients.append(NutritionInfo(rows[n], mult=rand.uniform(0.1, 5), vector=vectors[n]))
+    return NutritionInfoList(ingredients)
+
+
+def read_fields(nutinfo, get, fields):
+    return [get(nutinfo, field) for field in fields]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ingredients", type=int, default=25)
+    parser.add_argument("--labels", type=int, default=2000)
+    parser.add_argument("--recipes", type=int, default=20000)
+    args = parser.parse_args()
+
+    rows = make_rows(500)
+    vectors = [nutrient_vector(row) for row in rows]
+    rand = random.Random(1)
+    recipes = [make_recipe(rand, rows, vectors, args.ingredients) for _ in range(max(args.labels, args.recipes))]
+    print("%d ingredients per recipe" % args.ingredients)
+    print("%-10s %12s %12s" % ("", "recursive", "vectors"))
+    for name, n, func in [
+        ("label", args.labels, lambda recs, get: [read_fields(r, get, SUMMABLE_FIELDS) for r in recs]),
+        ("bulk", args.recipes, lambda recs, get: [read_fields(r, get, EXPORT_FIELDS) for r in recs]),
+    ]:
+        times = []
+        for get in [recursive_getattr, getattr]:
+            # New lists, so nothing has been summed yet.
+            recs = [NutritionInfoList(list(r)) for r in recipes[:n]]
+            start = time.perf_counter()
+            func(recs, get)
+            times.append(time.perf_counter() - start)
+        print("%-10s %10.3f s %10.3f s" % (name, *times))
+
+
+if __name__ == "__main__":
+    main()
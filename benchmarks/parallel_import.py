@@ -0,0 +1,88 @@
+"""Compare importing many MealMaster files one after another with ParallelImporter.
+
+"one by one" runs each file's importer in turn, as import_filenames does
+with a single worker. The other rows run ParallelImporter with that many
+worker processes, starting the workers included. Each row imports the
+same generated files into a new, empty database.
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.common import CATEGORIES, UNITS, sentence
+
+MEALMASTER_UNITS = {"c.": "c ", "tbs.": "tb", "tsp.": "ts", "lb.": "lb", "oz.": "oz", "g.": "g ", "": "  ", "pinch": "pn"}
+
+
+def make_mealmaster(rand, n_recipes):
+    lines = []
+    for _ in range(n_recipes):
+        lines += [
+            "MMMMM----- Recipe via Meal-Master (tm) v8.05",
+            "",
+            "      Title: %s" % sentence(rand, 4).title(),
+            " Categories: %s" % ", ".join(rand.sample(CATEGORIES, 2)),
+            "      Yield: %s servings" % rand.randint(1, 12),
+            "",
+        ]
+        for _ in range(rand.randint(4, 16)):
+            lines.append("%7s %s %s" % (rand.choice(["1", "2", "1/2", "1 1/2", "3"]), MEALMASTER_UNITS[rand.choice(UNITS)], sentence(rand, 3)))
+        lines += [""] + [sentence(rand, 12) for _ in range(rand.randint(3, 10))] + ["", "MMMMM", ""]
+    return "\r\n".join(lines)
+
+
+def make_corpus(directory, n_files, recipes_per_file, seed=0):
+    rand = random.Random(seed)
+    filenames = []
+    for n in range(n_files):
+        filename = directory / ("recipes%03d.mmf" % n)
+        filename.write_text(make_mealmaster(rand, recipes_per_file), encoding="ascii")
+        filenames.append(str(filename))
+    return filenames
+
+
+def import_one_by_one(plugin, filenames):
+    for fn in filenames:
+        importer = plugin.get_importer(fn)
+        importer.pre_run()
+        importer.do_run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--recipes-per-file", type=int, default=25)
+    parser.add_argument("--workers", type=int, nargs="*", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    directory = Path(tempfile.mkdtemp(prefix="gourmand-benchmark-"))
+    # Our importers use the default database; workers have none.
+    os.environ["XDG_DATA_HOME"] = str(directory)
+    (directory / "gourmand").mkdir()
+    from gourmand.importers.parallel_importer import ParallelImporter
+    from gourmand.plugins.import_export.mealmaster_plugin.mealmaster_importer_plugin import MealmasterImporterPlugin
+    from gourmand.recipeManager import get_recipe_manager
+
+    rd = get_recipe_manager()
+    plugin = MealmasterImporterPlugin()
+    filenames = make_corpus(directory, args.files, args.recipes_per_file)
+    print("%d files of %d recipes each, %d CPUs" % (args.files, args.recipes_per_file, os.cpu_count()))
+    runs = [("one by one", lambda: import_one_by_one(plugin, filenames))]
+    for workers in args.workers:
+        files = [(fn, plugin) for fn in filenames]
+        runs.append(("%d workers" % workers, lambda files=files, workers=workers: ParallelImporter(files, workers, None).do_run()))
+    for name, run in runs:
+        before = rd.fetch_len(rd.recipe_table)
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        count = rd.fetch_len(rd.recipe_table) - before
+        print("%-14s %8.2f s %10.0f recipes/s" % (name, elapsed, count / elapsed))
+
+
+if __name__ == "__main__":
+    main()
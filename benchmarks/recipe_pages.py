@@ -0,0 +1,63 @@
+"""Compare loading a full search result with lazily paging through it.
+
+Reports the time until the first page of the index view can be shown and
+the peak memory allocated on the way, for the eager search_recipes() list
+and for the keyset-paginated RecipeResults.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import populate, temporary_database
+from gourmand.recindex import RecipeModel
+
+SEARCHES = [{"column": "deleted", "operator": "=", "search": False}]
+SORTS = [[("title", 1)], [("rating", -1)], [("category", 1)]]
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipes", type=int, default=100000)
+    parser.add_argument("--per-page", type=int, default=12)
+    parser.add_argument("--image-size", type=int, default=8192, help="bytes of fake image data stored with each recipe")
+    args = parser.parse_args()
+
+    rd = temporary_database()
+    populate(rd, args.recipes)
+    if args.image_size:
+        # The recipe IDs double as (fake) image hashes.
+        rd.db.execute(
+            "INSERT INTO recipe_images (id, image, thumb) SELECT id, randomblob(?), randomblob(?) FROM recipe",
+            (args.image_size, args.image_size // 8),
+        )
+        rd.db.execute("UPDATE recipe SET image_id = id")
+
+    def eager(sort_by):
+        recs = rd.search_recipes(SEARCHES, sort_by=sort_by)
+        return len(recs), recs[: args.per_page]
+
+    def lazy(sort_by):
+        recs = rd.lazy_search_recipes(SEARCHES, sort_by=sort_by, columns=RecipeModel.columns)
+        return len(recs), recs[: args.per_page]
+
+    print("%d recipes, first page of %d" % (args.recipes, args.per_page))
+    print("%-14s %12s %12s %12s %12s" % ("sort", "eager (s)", "eager (MiB)", "lazy (s)", "lazy (MiB)"))
+    for sort_by in SORTS:
+        eager_time, eager_peak = measure(lambda: eager(sort_by))
+        lazy_time, lazy_peak = measure(lambda: lazy(sort_by))
+        print("%-14s %12.3f %12.1f %12.3f %12.1f" % ("%s %+d" % sort_by[0], eager_time, eager_peak, lazy_time, lazy_peak))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Time REGEXP searches from search_recipes, with and without compiled patterns cached.
+
+"per row" registers the REGEXP function we used to have, which handed
+the pattern to re.search for every value SQLite gave it, and "cached"
+is the function RecData registers now, which keeps the patterns it has
+compiled.
+"""
+
+import argparse
+import re
+
+from sqlalchemy import event
+
+from benchmarks.common import best_time, populate, temporary_database
+from gourmand.backends.db import compile_regexp
+
+QUERIES = ["garlic", "^quick", "(honey|jam) (bake|roast)", r"\bzucc\w+", "no such thing"]
+
+
+def per_row_regexp(expr, item):
+    if item:
+        return re.search(expr, item, re.IGNORECASE) is not None
+    else:
+        return False
+
+
+def register_per_row(dbapi_con, con_record):
+    dbapi_con.create_function("REGEXP_I", 2, per_row_regexp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--recipes", type=int, default=50000)
+    args = parser.parse_args()
+
+    rd = temporary_database()
+    populate(rd, args.recipes)
+    print("%d recipes" % args.recipes)
+    print("%-26s %10s %14s %12s" % ("query", "matches", "per row (s)", "cached (s)"))
+    for query in QUERIES:
+        searches = [{"column": "deleted", "operator": "=", "search": False}, {"column": "anywhere", "operator": "REGEXP", "search": query}]
+        # Our engine connects afresh for each statement, and listeners
+        # run in the order they were added, so this one wins.
+        event.listen(rd.db, "connect", register_per_row)
+        per_row_time = best_time(lambda: rd.search_recipes(searches), repeat=3)
+        event.remove(rd.db, "connect", register_per_row)
+        cached_time = best_time(lambda: rd.search_recipes(searches), repeat=3)
+        print("%-26s %10d %14.3f %12.3f" % (query, len(rd.search_recipes(searches)), per_row_time, cached_time))
+    print(compile_regexp.cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Count the commits of an editor save and a batch edit, and time them.
+
+The editor save changes every ingredient of a 40-ingredient recipe, as
+IngredientController.commit_ingredients does, and then the recipe. The
+batch edit sets the cuisine of 5000 recipes, as main.batch_edit_recs
+does.
+
+"separately" makes each RecData call commit on its own, and
+"transaction" makes all of them in one rd.transaction(), as the recipe
+editor and batch editor do.
+"""
+
+import argparse
+import contextlib
+import time
+
+from sqlalchemy import event
+
+from benchmarks.common import CUISINES, populate, temporary_database
+
+
+def editor_save(rd, rid, n):
+    rec = rd.get_rec(rid)
+    for ing in rd.get_ings(rid):
+        rd.modify_ing_and_update_keydic(ing, {"item": "%s %s" % (ing.item.rsplit(" ", 1)[0], n), "amount": n})
+    rec = rd.modify_rec(rec, {"title": "Edited %s" % n})
+    rd.update_hashes(rec)
+
+
+def batch_edit(rd, ids, n):
+    for rec in rd.fetch_all(rd.recipe_table, id=("in", ids)):
+        rd.modify_rec(rec, {"cuisine": CUISINES[n % len(CUISINES)]})
+
+
+def measure(rd, func, in_transaction):
+    commits = []
+
+    def commit(conn):
+        commits.append(conn)
+
+    event.listen(rd.db, "commit", commit)
+    start = time.perf_counter()
+    with rd.transaction() if in_transaction else contextlib.nullcontext():
+        func()
+    elapsed = time.perf_counter() - start
+    event.remove(rd.db, "commit", commit)
+    return elapsed, len(commits)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ingredients", type=int, default=40)
+    parser.add_argument("--recipes", type=int, default=5000)
+    args = parser.parse_args()
+
+    rd = temporary_database()
+    ids = populate(rd, args.recipes)
+    rid = populate(rd, 1, ingredients_per_recipe=args.ingredients, seed=1)[0]
+    # So that the keylookup rows exist and saves change their counts.
+    for ing in rd.get_ings(rid):
+        rd.add_ing_to_keydic(ing.item, ing.ingkey)
+
+    n = 0
+    for name, func in [
+        ("editor save, %d ingredients" % args.ingredients, lambda: editor_save(rd, rid, n)),
+        ("batch edit, %d recipes" % args.recipes, lambda: batch_edit(rd, ids, n)),
+    ]:
+        for mode in ["separately", "transaction"]:
+            n += 1
+            elapsed, commits = measure(rd, func, mode == "transaction")
+            print("%-30s %-12s %8.3f s %8d commits" % (name, mode, elapsed, commits))
+
+
+if __name__ == "__main__":
+    main()
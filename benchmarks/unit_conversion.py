@@ -0,0 +1,46 @@
+"""Time building a Converter and converting between units with it.
+
+The unit pairs cover plain conversions within a dimension, conversions
+through several units of the conversion table, spelling variants that
+go through the unit dictionary, and volume to mass with a density.
+"""
+
+import argparse
+import time
+
+from gourmand.convert import Converter
+
+PAIRS = [
+    ("tsp", "c", None),
+    ("gallon", "drop", None),
+    ("lb", "mg", None),
+    ("Tbs.", "cups", None),
+    ("hours", "seconds", None),
+    ("c", "g", "water"),
+    ("ml", "oz", "water"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=1000000)
+    parser.add_argument("--builds", type=int, default=20)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    for _ in range(args.builds):
+        conv = Converter()
+    elapsed = time.perf_counter() - start
+    print("Converter()    %10.2f ms" % (elapsed / args.builds * 1000))
+
+    pairs = (PAIRS * (args.calls // len(PAIRS) + 1))[: args.calls]
+    converter = conv.converter
+    start = time.perf_counter()
+    for u1, u2, item in pairs:
+        converter(u1, u2, item=item)
+    elapsed = time.perf_counter() - start
+    print("%d converter() calls %8.2f s %10.0f calls/s" % (args.calls, elapsed, args.calls / elapsed))
+
+
+if __name__ == "__main__":
+    main()
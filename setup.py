@@ -2,6 +2,7 @@ import ast
 import os
 import shutil
 import subprocess
+import sys
 from pathlib import Path
 from typing import Union
 
@@ -17,6 +18,7 @@ DATADIR = Path("data")
 PODIR = Path("po")
 LANGS = sorted(f.stem for f in PODIR.glob("*.po"))
 LOCALEDIR = PACKAGEDIR / "data" / "locale"
+NUTRITION_DATABASE = PACKAGEDIR / "data" / "nutrition.sqlite"
 
 
 def get_info(prop: str) -> str:
@@ -122,6 +124,27 @@ class BuildI18n(Command):
         rmfile(f"{cachefile}.lock")
 
 
+class BuildNutrition(Command):
+    description = "Build the ready-made USDA nutrition database"
+    user_options = []
+
+    def initialize_options(self):
+        # Command subclasses must implement this "abstract" method
+        pass
+
+    def finalize_options(self):
+        # Command subclasses must implement this "abstract" method
+        pass
+
+    def run(self):
+        # Without it, Gourmand parses the USDA files on first use instead
+        cmd = [sys.executable, "-m", "gourmand.plugins.nutritional_information.databaseGrabber", NUTRITION_DATABASE]
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, ["src", os.environ.get("PYTHONPATH")])))
+        if subprocess.run(cmd, env=env).returncode:
+            self.warn(f"{cmd!r} failed, skipping the nutrition database ...")
+            rmfile(NUTRITION_DATABASE)
+
+
 class BuildSource(sdist):
 
     def run(self):
@@ -131,6 +154,7 @@ class BuildSource(sdist):
         for lang in LANGS:
             mofile = LOCALEDIR / lang / "LC_MESSAGES" / f"{PACKAGE}.mo"
             rmfile(mofile)
+        rmfile(NUTRITION_DATABASE)
 
         for infile in DATADIR.rglob("*.in"):
             # trim '.in' extension
@@ -159,6 +183,7 @@ class BuildWheel(bdist_wheel):
 
     def run(self):
         self.run_command("build_i18n")
+        self.run_command("build_nutrition")
         refresh_metadata(self)
         super().run()
 
@@ -167,6 +192,7 @@ class Develop(develop):
 
     def run(self):
         self.run_command("build_i18n")
+        self.run_command("build_nutrition")
         super().run()
 
 
@@ -174,6 +200,7 @@ class BuildPy(build_py):
 
     def run(self):
         self.run_command("build_i18n")
+        self.run_command("build_nutrition")
         super().run()
 
 
@@ -215,6 +242,7 @@ setup(
     cmdclass={
         "bdist_wheel": BuildWheel,
         "build_i18n": BuildI18n,
+        "build_nutrition": BuildNutrition,
         "build_py": BuildPy,
         "develop": Develop,  # TODO: Drop later.
         "sdist": BuildSource,
@@ -1,13 +1,19 @@
+import contextlib
+import functools
+import hashlib
+import itertools
 import re
-import shutil
+import sqlite3
+import threading
 import time
 from pathlib import Path
+from types import SimpleNamespace
 from typing import Any, Dict, List, Optional, Tuple
 
 import sqlalchemy
 import sqlalchemy.orm
 from gi.repository import Gtk
-from sqlalchemy import Boolean, Column, Float, ForeignKey, Integer, LargeBinary, Numeric, String, Table, Text, event, func, select
+from sqlalchemy import Boolean, Column, Float, ForeignKey, Index, Integer, LargeBinary, Numeric, String, Table, Text, event, func, select
 from sqlalchemy.sql import and_, case, or_
 
 import gourmand.__version__
@@ -21,10 +27,32 @@ from gourmand.i18n import _
 from gourmand.keymanager import KeyManager
 from gourmand.plugin import DatabasePlugin
 from gourmand.plugin_loader import Pluggable, pluggable_method
+from gourmand.prefs import Prefs
 
 Session = sqlalchemy.orm.sessionmaker()
 
 
+class TransactionMetaData(sqlalchemy.MetaData):
+    """MetaData bound to our engine, or to the connection of the calling
+    thread's transaction while it has one.
+
+    Our statements are run by implicit execution, which is what puts
+    them inside RecData.transaction().
+    """
+
+    def __init__(self, bind, local: threading.local):
+        self.local = local
+        sqlalchemy.MetaData.__init__(self, bind)
+
+    @property
+    def bind(self):
+        return getattr(self.local, "connection", None) or self._bind
+
+    @bind.setter
+    def bind(self, bind):
+        self._bind_to(bind)
+
+
 def map_type_to_sqlalchemy(typ):
     """A convenience method -- take a string type and map it into a
     sqlalchemy type.
@@ -43,6 +71,37 @@ def map_type_to_sqlalchemy(typ):
         return LargeBinary()
 
 
+@functools.lru_cache(maxsize=256)
+def compile_regexp(expr: str, flags: int = 0) -> "re.Pattern":
+    """Return expr compiled, remembering the patterns we were asked for last."""
+    return re.compile(expr, flags)
+
+
+def sqlite_regexp(expr, item):
+    """SQLite's REGEXP: whether item matches regular expression expr."""
+    if item:
+        return compile_regexp(expr).search(item) is not None
+    else:
+        return False
+
+
+def sqlite_regexp_i(expr, item):
+    """REGEXP ignoring case, called as REGEXP_I(expr, item)."""
+    if item:
+        return compile_regexp(expr, re.IGNORECASE).search(item) is not None
+    else:
+        return False
+
+
+def regexp_match(col, expr):
+    """Return a criterion for col matching expr, ignoring case, as our
+    REGEXP searches do.
+
+    NULLs are ruled out before SQLite calls REGEXP_I for them.
+    """
+    return and_(col.isnot(None), func.REGEXP_I(expr, col))
+
+
 def fix_colnames(dict, *tables):
     """Map column names to sqlalchemy columns."""
     # This is a convenience method -- throughout Gourmet, the column
@@ -74,6 +133,8 @@ def make_simple_select_arg(criteria, *tables):
                 value = str(value)
             if operator == "in":
                 args.append(k.in_(value))
+            elif operator == "REGEXP":
+                args.append(regexp_match(k, value))
             elif hasattr(k, operator):
                 args.append(getattr(k, operator)(value))
             elif hasattr(k, operator + "_"):  # for keywords like 'in'
@@ -90,7 +151,39 @@ def make_simple_select_arg(criteria, *tables):
         return []
 
 
-def make_order_by(sort_by, table, count_by=None, join_tables=None):
+def bind_criteria(criteria):
+    """Split criteria for make_simple_select_arg into their shape and
+    their values.
+
+    Return a key naming the shape, criteria with bind parameters in
+    place of their values, and the values by parameter name, or None if
+    there's a value we can't bind. Comparisons with None stay in the
+    criteria, as SQL writes them IS NULL rather than binding them.
+    """
+    key, shape, params = [], {}, {}
+    for name, v in sorted(criteria.items()):
+        operator, value = v if isinstance(v, tuple) else (None, v)
+        if isinstance(value, sqlalchemy.sql.ClauseElement):
+            return None
+        if value is None:
+            shape[name] = v
+        else:
+            param = sqlalchemy.bindparam("criteria_%s" % name, expanding=operator == "in")
+            shape[name] = param if operator is None else (operator, param)
+            if isinstance(value, str):
+                value = str(value)
+            elif operator == "in":
+                value = list(value)
+            params[param.key] = value
+        key.append((name, operator, value is None))
+    return tuple(key), shape, params
+
+
+def make_sort_keys(sort_by, table, count_by=None, join_tables=None):
+    """Return a list of (expression, direction) tuples for sort_by.
+
+    direction is 1 for ascending and -1 for descending.
+    """
     if join_tables is None:
         join_tables = []
 
@@ -119,6 +212,13 @@ def make_order_by(sort_by, table, count_by=None, join_tables=None):
                 ],
                 else_=func.lower(col),
             )
+        ret.append((col, direction == 1 and 1 or -1))
+    return ret
+
+
+def make_order_by(sort_by, table, count_by=None, join_tables=None):
+    ret = []
+    for col, direction in make_sort_keys(sort_by, table, count_by=count_by, join_tables=join_tables):
         if direction == 1:  # Ascending
             ret.append(sqlalchemy.asc(col))
         else:
@@ -130,6 +230,91 @@ class DBObject:
     pass
 
 
+# Columns mirrored into the recipe_fts full-text index. The last three
+# hold the recipe's categories and ingredients, one per line.
+FTS_RECIPE_COLUMNS = ["title", "instructions", "modifications", "cuisine", "source", "link"]
+FTS_COLUMNS = FTS_RECIPE_COLUMNS + ["category", "item", "ingkey"]
+
+FTS_ROW_SELECT = (
+    "SELECT recipe.id, %s, "
+    "(SELECT group_concat(category, char(10)) FROM categories WHERE recipe_id = recipe.id), "
+    "(SELECT group_concat(item, char(10)) FROM ingredients WHERE recipe_id = recipe.id), "
+    "(SELECT group_concat(ingkey, char(10)) FROM ingredients WHERE recipe_id = recipe.id) "
+    "FROM recipe"
+) % ", ".join("recipe.%s" % c for c in FTS_RECIPE_COLUMNS)
+FTS_INSERT = "INSERT INTO recipe_fts (rowid, %s) " % ", ".join(FTS_COLUMNS) + FTS_ROW_SELECT
+
+
+def fts_refresh_sql(recipe_id):
+    """Return SQL re-indexing the recipe with ID recipe_id (for use in triggers)."""
+    return "DELETE FROM recipe_fts WHERE rowid = %(id)s; %(insert)s WHERE recipe.id = %(id)s;" % {"id": recipe_id, "insert": FTS_INSERT}
+
+
+# (name, event, table, SQL) for the triggers keeping recipe_fts in sync
+FTS_TRIGGERS = [
+    ("recipe_fts_recipe_insert", "INSERT", "recipe", fts_refresh_sql("new.id")),
+    (
+        "recipe_fts_recipe_update",
+        "UPDATE OF %s" % ", ".join(["id"] + FTS_RECIPE_COLUMNS),
+        "recipe",
+        "DELETE FROM recipe_fts WHERE rowid = old.id; " + fts_refresh_sql("new.id"),
+    ),
+    ("recipe_fts_recipe_delete", "DELETE", "recipe", "DELETE FROM recipe_fts WHERE rowid = old.id;"),
+    ("recipe_fts_categories_insert", "INSERT", "categories", fts_refresh_sql("new.recipe_id")),
+    (
+        "recipe_fts_categories_update",
+        "UPDATE OF recipe_id, category",
+        "categories",
+        fts_refresh_sql("old.recipe_id") + " " + fts_refresh_sql("new.recipe_id"),
+    ),
+    ("recipe_fts_categories_delete", "DELETE", "categories", fts_refresh_sql("old.recipe_id")),
+    ("recipe_fts_ingredients_insert", "INSERT", "ingredients", fts_refresh_sql("new.recipe_id")),
+    (
+        "recipe_fts_ingredients_update",
+        "UPDATE OF recipe_id, item, ingkey",
+        "ingredients",
+        fts_refresh_sql("old.recipe_id") + " " + fts_refresh_sql("new.recipe_id"),
+    ),
+    ("recipe_fts_ingredients_delete", "DELETE", "ingredients", fts_refresh_sql("old.recipe_id")),
+]
+# The triggers do nothing while recipe_fts_paused holds a row, which
+# add_recs_bulk puts there for the length of its transaction, so that
+# each recipe it writes is indexed once rather than once per row.
+FTS_TRIGGER_SQL = "CREATE TRIGGER %s AFTER %s ON %s WHEN NOT EXISTS (SELECT 1 FROM recipe_fts_paused) BEGIN %s END"
+
+# SQLite pragmas by profile, chosen with the "sqlite_profile"
+# preference. "safe" is SQLite's default. "balanced" keeps a write-ahead
+# log, so that reads go on while another thread writes and commits need
+# not wait for the disk, with 64 MB of cache and memory-mapped reads.
+# "bulk" is for imports: more cache and fewer, larger checkpoints.
+SQLITE_PROFILES = {
+    "safe": {"journal_mode": "DELETE", "synchronous": "FULL"},
+    "balanced": {"journal_mode": "WAL", "synchronous": "NORMAL", "cache_size": -64 * 1024, "mmap_size": 256 * 2**20},
+    "bulk": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "cache_size": -256 * 1024,
+        "mmap_size": 256 * 2**20,
+        "temp_store": "MEMORY",
+        "wal_autocheckpoint": 10000,
+    },
+}
+# What SQLite has for the pragmas above, for a connection that moves to
+# a profile which leaves some of them out.
+SQLITE_DEFAULT_PRAGMAS = {"synchronous": "FULL", "cache_size": -2000, "mmap_size": 0, "temp_store": "DEFAULT", "wal_autocheckpoint": 1000}
+
+# How many IDs we put in one "IN (...)", well below the 999 parameters
+# older SQLite allows a statement.
+IN_CHUNK_SIZE = 500
+
+
+def chunked(ids, size=IN_CHUNK_SIZE):
+    """Yield lists of at most size of ids."""
+    ids = list(ids)
+    for start in range(0, len(ids), size):
+        yield ids[start : start + size]
+
+
 # CHANGES SINCE PREVIOUS VERSIONS...
 # categories_table: id -> recipe_id, category_entry_id -> id
 # ingredients_table: ingredient_id -> id, id -> recipe_id
@@ -155,6 +340,9 @@ class RecData(Pluggable):
     AMT_MODE_HIGH = 2
 
     _instance_by_db_url = {}
+    # How many shapes of fetch_* statement we keep compiled. 0 builds
+    # and compiles every statement afresh.
+    query_cache_size = 256
 
     @classmethod
     def instance_for(cls, file: Optional[str] = None, custom_url: Optional[str] = None) -> "RecData":
@@ -169,9 +357,11 @@ class RecData(Pluggable):
         # hooks run after adding, modifying or deleting a recipe.
         # Each hook is handed the recipe, except for delete_hooks,
         # which is handed the ID (since the recipe has been deleted)
+        # add_hooks and modify_hooks are handed the ID too, once the
+        # change has been committed.
         # We keep track of IDs we've handed out with new_id() in order
         # to prevent collisions
-        self.new_ids = []
+        self.new_ids = set()
         self._created = False
         self.filename = file
         self.url = url
@@ -179,6 +369,25 @@ class RecData(Pluggable):
         self.modify_hooks = []
         self.delete_hooks = []
         self.add_ing_hooks = []
+        # delete_ing_hooks and modify_ing_hooks are run without
+        # arguments once ingredients have been deleted, or their keys
+        # may have changed.
+        self.delete_ing_hooks = []
+        self.modify_ing_hooks = []
+        # keydic_hooks are handed the item and key whose count in the
+        # keylookup table went up (1) or down (-1), and are run without
+        # arguments when keylookup rows were changed wholesale.
+        self.keydic_hooks = []
+        # Each thread's transaction: its connection, and the hooks and
+        # changed recipes waiting for it to commit.
+        self._local = threading.local()
+        # Compiled fetch_* statements by their shape, for
+        # execute_cached.
+        self._query_cache = {}
+        self.query_cache_hits = 0
+        self.query_cache_misses = 0
+        # Set up by setup_full_text_index once our tables are current
+        self.has_full_text_index = False
         timer = TimeAction("initialize_connection + setup_tables", 2)
         self.initialize_connection()
         Pluggable.__init__(self, [DatabasePlugin])
@@ -199,33 +408,78 @@ class RecData(Pluggable):
 
         if self.url.startswith("mysql"):
             self.db = sqlalchemy.create_engine(self.url, connect_args={"charset": "utf8"})
+        elif self.url.startswith("sqlite") and sqlalchemy.engine.make_url(self.url).database not in (None, "", ":memory:"):
+            # Left to itself, SQLAlchemy opens a new connection for each
+            # statement on a database file, which throws away the page
+            # cache and has the pragmas set again every time. We keep our
+            # connections in a pool; one may serve several threads, but
+            # only one at a time.
+            self.db = sqlalchemy.create_engine(
+                self.url, poolclass=sqlalchemy.pool.QueuePool, max_overflow=-1, connect_args={"check_same_thread": False}
+            )
         else:
             self.db = sqlalchemy.create_engine(self.url)
 
+        self.sqlite_profile = Prefs.instance().get("sqlite_profile", "balanced")
+        if self.sqlite_profile not in SQLITE_PROFILES:
+            print("Unknown sqlite_profile %s, using balanced" % self.sqlite_profile)
+            self.sqlite_profile = "balanced"
         if self.url.startswith("sqlite"):
             # Workaround to create REGEXP function in sqlite
             # New way of adding custom function ensures we create a custom
             # function for every connection created and fixes problems
             # using regexp. Based on code found here:
             # http://stackoverflow.com/questions/8076126/have-an-sqlalchemy-sqlite-create-function-issue-with-datetime-representation
-            def regexp(expr, item):
-                if item:
-                    return re.search(expr, item, re.IGNORECASE) is not None
-                else:
-                    return False
-
             @event.listens_for(self.db, "connect")
             def on_connect(dbapi_con, con_record):
-                dbapi_con.create_function("REGEXP", 2, regexp)
+                dbapi_con.create_function("REGEXP", 2, sqlite_regexp, deterministic=True)
+                dbapi_con.create_function("REGEXP_I", 2, sqlite_regexp_i, deterministic=True)
+
+            @event.listens_for(self.db, "checkout")
+            def on_checkout(dbapi_con, con_record, con_proxy):
+                # Connections keep their pragmas, so we only set them when
+                # this thread's profile isn't the one the connection has.
+                # The journal mode belongs to the database file, so it is
+                # set once, below.
+                profile = self.get_sqlite_profile()
+                if con_record.info.get("sqlite_profile") != profile:
+                    for pragma, value in dict(SQLITE_DEFAULT_PRAGMAS, **SQLITE_PROFILES[profile]).items():
+                        if pragma != "journal_mode":
+                            dbapi_con.execute("PRAGMA %s = %s" % (pragma, value))
+                    con_record.info["sqlite_profile"] = profile
+
+            self.db.execute("PRAGMA journal_mode = %s" % SQLITE_PROFILES[self.sqlite_profile]["journal_mode"])
 
         self.base_connection = self.db.connect()
         self.base_connection.begin()
-        self.metadata = sqlalchemy.MetaData(self.db)
+        self.metadata = TransactionMetaData(self.db, self._local)
         # Be noisy... (uncomment for debugging/fiddling)
         # self.metadata.bind.echo = True
         Session.configure(bind=self.db)
         debug("Done initializing DB connection", 1)
 
+    def get_sqlite_profile(self) -> str:
+        """Return the SQLite profile for this thread's connections."""
+        return getattr(self._local, "sqlite_profile", None) or self.sqlite_profile
+
+    @contextlib.contextmanager
+    def use_sqlite_profile(self, profile: str):
+        """Give connections this thread uses within the with block the
+        pragmas of another profile, e.g. "bulk" while importing.
+
+        The journal mode stays as it is, and if the user chose the
+        "safe" profile, so does everything else.
+        """
+        if self.sqlite_profile == "safe":
+            yield
+            return
+        previous = getattr(self._local, "sqlite_profile", None)
+        self._local.sqlite_profile = profile
+        try:
+            yield
+        finally:
+            self._local.sqlite_profile = previous
+
     def save(self):
         """Save our database (if there is a separate 'save')"""
         row = self.fetch_one(self.info_table)
@@ -233,6 +487,20 @@ class RecData(Pluggable):
             self.do_modify(self.info_table, row, {"last_access": time.time()}, id_col=None)
         else:
             self.do_add(self.info_table, {"last_access": time.time()})
+        if self.url.startswith("sqlite"):
+            # Copy what it can from the write-ahead log to the database,
+            # without waiting for readers or writers.
+            self.db.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def close(self):
+        """Write the write-ahead log back to the database and empty it.
+
+        We stay usable: our connections are opened as they are needed.
+        """
+        if self.url.startswith("sqlite"):
+            self.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.base_connection.close()
+        self.db.dispose()
 
     def _setup_object_for_table(self, table, klass):
         self.__table_to_object__[table] = klass
@@ -255,6 +523,7 @@ class RecData(Pluggable):
 
     def setup_base_tables(self):
         self.setup_info_table()
+        self.setup_recipe_images_table()
         self.setup_recipe_table()
         self.setup_category_table()
         self.setup_ingredient_table()
@@ -319,29 +588,55 @@ class RecData(Pluggable):
             Column("servings", Float(), **{}),
             Column("yields", Float(), **{}),
             Column("yield_unit", String(length=32), **{}),
-            Column("image", LargeBinary(), **{}),
-            Column("thumb", LargeBinary(), **{}),
+            # Images are kept in recipe_images, so that reading a recipe
+            # row doesn't mean reading its image.
+            Column("image_id", String(length=64), ForeignKey("recipe_images.id"), index=True),
             Column("deleted", Boolean(), **{}),
             # A hash for uniquely identifying a recipe (based on title etc)
-            Column("recipe_hash", String(length=32), **{}),
+            Column("recipe_hash", String(length=32), index=True),
             # A hash for uniquely identifying a recipe (based on ingredients)
-            Column("ingredient_hash", String(length=32), **{}),
+            Column("ingredient_hash", String(length=32), index=True),
             Column("link", Text(), **{}),  # A field for a URL -- we ought to know about URLs
             Column("last_modified", Integer(), **{}),
         )  # RECIPE_TABLE_DESC
+        # The recipe index always filters out deleted recipes.
+        Index("ix_recipe_deleted_title", self.recipe_table.c.deleted, self.recipe_table.c.title)
+        # Covers find_all_duplicates, which groups recipes by both hashes.
+        Index(
+            "ix_recipe_recipe_hash_ingredient_hash_deleted",
+            self.recipe_table.c.recipe_hash,
+            self.recipe_table.c.ingredient_hash,
+            self.recipe_table.c.deleted,
+        )
 
         class Recipe(object):
             pass
 
         self._setup_object_for_table(self.recipe_table, Recipe)
 
+    def setup_recipe_images_table(self):
+        self.recipe_images_table = Table(
+            "recipe_images",
+            self.metadata,
+            # The SHA-256 of the image, so each image is only stored once
+            Column("id", String(length=64), primary_key=True),
+            Column("image", LargeBinary()),
+            Column("thumb", LargeBinary()),  # 40x40, for the recipe index
+            Column("preview", LargeBinary()),  # made when first needed
+        )
+
+        class RecipeImage(object):
+            pass
+
+        self._setup_object_for_table(self.recipe_images_table, RecipeImage)
+
     def setup_category_table(self):
         self.categories_table = Table(
             "categories",
             self.metadata,
             Column("id", Integer(), primary_key=True),
-            Column("recipe_id", Integer, ForeignKey("recipe.id"), **{}),  # recipe ID
-            Column("category", Text(), **{}),  # Category ID
+            Column("recipe_id", Integer, ForeignKey("recipe.id"), index=True),  # recipe ID
+            Column("category", Text(), index=True),  # Category ID
         )  # CATEGORY_TABLE_DESC
 
         class Category(object):
@@ -360,7 +655,7 @@ class RecData(Pluggable):
             Column("amount", Float(), **{}),
             Column("rangeamount", Float(), **{}),
             Column("item", Text(), **{}),
-            Column("ingkey", Text(), **{}),
+            Column("ingkey", Text(), index=True),
             Column("optional", Boolean(), **{}),
             # Integer so we can distinguish unset from False
             Column("shopoptional", Integer(), **{}),
@@ -368,6 +663,13 @@ class RecData(Pluggable):
             Column("position", Integer(), **{}),
             Column("deleted", Boolean(), **{}),
         )
+        # Covers get_ings, which fetches a recipe's live ingredients in order.
+        Index(
+            "ix_ingredients_recipe_id_deleted_position",
+            self.ingredients_table.c.recipe_id,
+            self.ingredients_table.c.deleted,
+            self.ingredients_table.c.position,
+        )
 
         class Ingredient(object):
             pass
@@ -380,8 +682,8 @@ class RecData(Pluggable):
             "keylookup",
             self.metadata,
             Column("id", Integer(), primary_key=True),
-            Column("word", Text(), **{}),
-            Column("item", Text(), **{}),
+            Column("word", Text(), index=True),
+            Column("item", Text(), index=True),
             Column("ingkey", Text(), **{}),
             Column("count", Integer(), **{}),
         )  # INGKEY_LOOKUP_TABLE_DESC
@@ -525,6 +827,10 @@ class RecData(Pluggable):
         # Code for updates between versions...
         if not self.new_db:
             sv_text = f"{stored_info.version_super}.{stored_info.version_major}.{stored_info.version_minor}"
+            # Images moved from the recipe table to recipe_images after
+            # 1.2.0. This comes first, as the updates below read recipes
+            # through the current table definition.
+            self.move_images_to_image_table()
             # Change from servings to yields! ( we use the plural to avoid a headache with keywords)
             if stored_info.version_super == 0 and stored_info.version_major < 16:
                 print("Database older than 0.16.0 -- updating", sv_text)
@@ -663,14 +969,116 @@ class RecData(Pluggable):
                 for ingredient in self.fetch_all(self.ingredients_table, deleted=False):
                     self.add_ing_to_keydic(ingredient.item, ingredient.ingkey)
 
+            # Secondary indexes were added after 1.2.0. They do not
+            # depend on any data, so rather than keying this on the
+            # stored version we simply create whichever ones are
+            # missing -- this is cheap when they all exist already.
+            self.create_missing_indexes()
+
             for plugin in self.plugins:
                 self.update_plugin_version(plugin, (current_super, current_major, current_minor))
 
+        self.setup_full_text_index()
+
         # Finally, update version stored in database
         self.do_modify(
             self.info_table, stored_info, {"version_super": current_super, "version_major": current_major, "version_minor": current_minor}, id_col=None
         )
 
+    def move_images_to_image_table(self):
+        """Move images stored on recipe rows into recipe_images.
+
+        Recipes sharing an image end up referring to a single row of
+        recipe_images. The old image and thumb columns are dropped
+        afterwards where the database allows it (SQLite >= 3.35);
+        otherwise they are left behind, empty.
+        """
+        columns = [c["name"] for c in sqlalchemy.inspect(self.db).get_columns("recipe")]
+        if "image" not in columns:
+            return
+        old_recipe_table = sqlalchemy.table("recipe", *[sqlalchemy.column(c) for c in ["id", "image", "thumb", "image_id"]])
+        has_image = and_(old_recipe_table.c.image.isnot(None), func.length(old_recipe_table.c.image) > 0)
+        ids = [row.id for row in self.db.execute(select([old_recipe_table.c.id], has_image))]
+        if "image_id" in columns and not ids:
+            # Already moved, we just couldn't drop the old columns.
+            return
+        print("Moving recipe images to their own table")
+        backup_database(self.filename)
+        if "image_id" not in columns:
+            self.add_column_to_table(self.recipe_table, ("image_id", String(length=64), {}))
+        for rid in ids:
+            # One at a time, so we never hold more than one image in memory.
+            image, thumb = self.db.execute(select([old_recipe_table.c.image, old_recipe_table.c.thumb], old_recipe_table.c.id == rid)).fetchone()
+            try:
+                image_id = self.store_image(image, thumb or None)
+            except Exception:
+                # We couldn't make a thumbnail, but the image is still the user's.
+                image_id = self.store_image(image, b"")
+            self.db.execute(old_recipe_table.update(old_recipe_table.c.id == rid).values(image_id=image_id, image=None, thumb=None))
+        for column in ["image", "thumb"]:
+            try:
+                self.db.execute("ALTER TABLE recipe DROP COLUMN %s" % column)
+            except sqlalchemy.exc.DatabaseError as e:
+                debug("Could not drop recipe.%s, leaving it empty: %s" % (column, e), 0)
+
+    def create_missing_indexes(self):
+        """Create any index defined on our tables that the database lacks."""
+        for table in self.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(bind=self.db, checkfirst=True)
+
+    def setup_full_text_index(self):
+        """Set up the recipe_fts index used for substring searches.
+
+        recipe_fts is an FTS5 table using the trigram tokenizer, so
+        that matching a phrase behaves like LIKE '%phrase%'. Triggers
+        keep it in sync with the recipe, categories and ingredients
+        tables; it is built from scratch the first time it is
+        created. If SQLite lacks FTS5 or the trigram tokenizer (added
+        in SQLite 3.34), searches fall back to LIKE.
+        """
+        self.has_full_text_index = False
+        self.recipe_fts_table = Table(
+            "recipe_fts",
+            # Kept out of self.metadata, which can't create virtual tables.
+            sqlalchemy.MetaData(),
+            Column("rowid", Integer(), primary_key=True),
+            # FTS5's hidden column named after the table, used for MATCH
+            Column("recipe_fts", Text()),
+        )
+        if self.db.dialect.name != "sqlite":
+            return
+        exists = self.db.execute("SELECT name FROM sqlite_master WHERE name = 'recipe_fts'").fetchone()
+        if not exists:
+            try:
+                self.db.execute("CREATE VIRTUAL TABLE recipe_fts USING fts5(%s, tokenize='trigram')" % ", ".join(FTS_COLUMNS))
+            except sqlalchemy.exc.OperationalError as e:
+                debug("Full text search unavailable, using LIKE searches: %s" % e, 0)
+                return
+        self.db.execute("CREATE TABLE IF NOT EXISTS recipe_fts_paused (paused INTEGER)")
+        triggers = dict(self.db.execute("SELECT name, sql FROM sqlite_master WHERE type = 'trigger'").fetchall())
+        for name, when, table, sql in FTS_TRIGGERS:
+            trigger_sql = FTS_TRIGGER_SQL % (name, when, table, sql)
+            if triggers.get(name) != trigger_sql:
+                # Missing, or as an older version of ours defined it
+                self.db.execute("DROP TRIGGER IF EXISTS %s" % name)
+                self.db.execute(trigger_sql)
+        if not exists:
+            self.rebuild_full_text_index()
+        self.has_full_text_index = True
+
+    def rebuild_full_text_index(self):
+        """Re-index every recipe in recipe_fts."""
+        self.db.execute("DELETE FROM recipe_fts")
+        self.db.execute(FTS_INSERT)
+
+    def refresh_full_text_index(self, connection, recipe_ids: List[int]):
+        """Re-index the recipes with IDs recipe_ids in recipe_fts."""
+        for chunk in chunked(recipe_ids):
+            ids = ", ".join("%d" % rid for rid in chunk)
+            connection.exec_driver_sql("DELETE FROM recipe_fts WHERE rowid IN (%s)" % ids)
+            connection.exec_driver_sql("%s WHERE recipe.id IN (%s)" % (FTS_INSERT, ids))
+
     def update_plugin_version(self, plugin, current_version=None):
         if current_version:
             current_super, current_major, current_minor = current_version
@@ -714,53 +1122,144 @@ class RecData(Pluggable):
 
     def run_hooks(self, hooks, *args):
         """A basic hook-running function. We use hooks to allow parts of the application
-        to tag onto data-modifying events and e.g. update the display"""
+        to tag onto data-modifying events and e.g. update the display
+
+        Within a transaction, the hooks run once it commits.
+        """
+        if getattr(self._local, "connection", None) is not None:
+            self._local.hooks.append((hooks, args))
+            return
         for h in hooks:
             t = TimeAction("running hook %s with args %s" % (h, args), 3)
             h(*args)
             t.end()
 
+    def recipe_changed(self, hooks_name: str, rid: int):
+        """Run the hooks named hooks_name, e.g. "modify_hooks", for recipe rid.
+
+        Within a transaction they run once it commits, and only once
+        per recipe however often it changed.
+        """
+        if getattr(self._local, "connection", None) is not None:
+            self._local.changed.append((hooks_name, rid))
+        else:
+            self.run_hooks(getattr(self, hooks_name), rid)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Write everything done in the with block in one transaction.
+
+        Statements run by this thread within the block share one
+        connection and are committed together when the outermost block
+        ends, or rolled back if it raises. Inner blocks are savepoints,
+        so an exception caught around one undoes only its own writes.
+        Hooks wait for the commit, and are dropped with the writes
+        that were rolled back.
+
+        Yields the connection.
+        """
+        local = self._local
+        connection = getattr(local, "connection", None)
+        if connection is not None:
+            hooks, changed = len(local.hooks), len(local.changed)
+            try:
+                with connection.begin_nested():
+                    yield connection
+            except BaseException:
+                del local.hooks[hooks:]
+                del local.changed[changed:]
+                raise
+            return
+        local.hooks, local.changed = [], []
+        try:
+            with self.db.connect() as connection, connection.begin():
+                if self.url.startswith("sqlite"):
+                    # pysqlite only begins a transaction before the first
+                    # write, and a savepoint before that would commit on
+                    # release.
+                    connection.exec_driver_sql("BEGIN")
+                local.connection = connection
+                try:
+                    yield connection
+                finally:
+                    local.connection = None
+            hooks, changed = local.hooks, local.changed
+        finally:
+            del local.hooks, local.changed
+        for hooks_name, rid in dict.fromkeys(changed):
+            self.run_hooks(getattr(self, hooks_name), rid)
+        for hooks, args in hooks:
+            self.run_hooks(hooks, *args)
+
+    def execute_cached(self, key, criteria, make_statement):
+        """Execute the statement make_statement returns for criteria.
+
+        The statement is compiled once for each shape of criteria: the
+        columns they name, with their operators, and whether they
+        compare with None. After that, it is run with the values of
+        criteria bound. key tells apart the statements of different
+        callers.
+        """
+        bound = bind_criteria(criteria) if self.query_cache_size else None
+        if bound is None:
+            return make_statement(criteria).execute()
+        shape_key, shape, params = bound
+        key = (key, shape_key)
+        compiled = self._query_cache.get(key)
+        if compiled is None:
+            self.query_cache_misses += 1
+            if len(self._query_cache) >= self.query_cache_size:
+                self._query_cache.clear()
+            compiled = self._query_cache[key] = make_statement(shape).compile(dialect=self.db.dialect)
+        else:
+            self.query_cache_hits += 1
+        return self.metadata.bind.execute(compiled, params)
+
+    def query_cache_info(self) -> SimpleNamespace:
+        """Return the hits, misses, maxsize and currsize of the cache of
+        compiled fetch_* statements, as functools' cache_info does."""
+        return SimpleNamespace(
+            hits=self.query_cache_hits, misses=self.query_cache_misses, maxsize=self.query_cache_size, currsize=len(self._query_cache)
+        )
+
     # basic DB access functions
     def fetch_all(self, table, sort_by=None, **criteria):
         if sort_by is None:
             sort_by = []
-        return table.select(*make_simple_select_arg(criteria, table), **{"order_by": make_order_by(sort_by, table)}).execute().fetchall()
+        return self.execute_cached(
+            ("fetch_all", table, tuple(map(tuple, sort_by))),
+            criteria,
+            lambda criteria: table.select(*make_simple_select_arg(criteria, table), **{"order_by": make_order_by(sort_by, table)}),
+        ).fetchall()
 
     def fetch_one(self, table, **criteria):
         """Fetch one item from table and arguments"""
-        return table.select(*make_simple_select_arg(criteria, table)).execute().fetchone()
+        return self.execute_cached(("fetch_one", table), criteria, lambda criteria: table.select(*make_simple_select_arg(criteria, table))).fetchone()
 
     def fetch_count(self, table, column, sort_by=None, **criteria):
         """Return a counted view of the table, with the count stored in the property 'count'"""
         if sort_by is None:
             sort_by = []
-        result = (
-            sqlalchemy.select(
+        return self.execute_cached(
+            ("fetch_count", table, column, tuple(map(tuple, sort_by))),
+            criteria,
+            lambda criteria: sqlalchemy.select(
                 [sqlalchemy.func.count(getattr(table.c, column)).label("count"), getattr(table.c, column)],
                 *make_simple_select_arg(criteria, table),
                 **{
                     "group_by": column,
                     "order_by": make_order_by(sort_by, table, count_by=column),
                 },
-            )
-            .execute()
-            .fetchall()
-        )
-        return result
+            ),
+        ).fetchall()
 
     def fetch_len(self, table, **criteria):
         """Return the number of rows in table that match criteria"""
-        if criteria:
-            return select(
-                [func.count(list(table.primary_key.columns)[0])])\
-                    .where(*make_simple_select_arg(criteria,table))\
-                    .execute()\
-                    .fetchone()[0]
-
-        return select(
-            [func.count(list(table.primary_key.columns)[0])])\
-                .execute()\
-                .fetchone()[0]
+        return self.execute_cached(
+            ("fetch_len", table),
+            criteria,
+            lambda criteria: select([func.count(list(table.primary_key.columns)[0])]).where(*make_simple_select_arg(criteria, table)),
+        ).scalar()
 
     def fetch_join(self, table1, table2, col1, col2, column_names=None, sort_by=None, **criteria):
         # TODO: this function might be unused
@@ -799,6 +1298,34 @@ class RecData(Pluggable):
                         joins.append(self.ingredients_table)
         return joins
 
+    def get_full_text_criteria(self, crit):
+        """Return criteria answering crit from recipe_fts, or None.
+
+        Only "contains" searches -- LIKE '%text%' with no other
+        wildcards in text -- on indexed columns can be answered from
+        the index. The trigram tokenizer also needs at least three
+        characters to match on.
+        """
+        if not self.has_full_text_index or crit.get("operator", "LIKE") != "LIKE":
+            return None
+        search = crit["search"]
+        if not isinstance(search, str) or not (search.startswith("%") and search.endswith("%")):
+            return None
+        text = search[1:-1]
+        if len(text) < 3 or "%" in text or "_" in text:
+            return None
+        if crit["column"] == "anywhere":
+            columns = FTS_COLUMNS
+        elif crit["column"] == "ingredient":
+            columns = ["item", "ingkey"]
+        elif crit["column"] in FTS_COLUMNS:
+            columns = [crit["column"]]
+        else:
+            return None
+        query = '{%s} : "%s"' % (" ".join(columns), text.replace('"', '""'))
+        fts = self.recipe_fts_table
+        return self.recipe_table.c.id.in_(sqlalchemy.select([fts.c.rowid], fts.c.recipe_fts.op("MATCH")(query)))
+
     def get_criteria(self, crit):
         if isinstance(crit, tuple):
             criteria, logic = crit
@@ -809,6 +1336,9 @@ class RecData(Pluggable):
         elif not isinstance(crit, dict):
             raise TypeError
         else:
+            full_text_criteria = self.get_full_text_criteria(crit)
+            if full_text_criteria is not None:
+                return full_text_criteria
             # join_crit = None # if we need to add an extra arg for a join
             if crit["column"] == "category":
                 subtable = self.categories_table
@@ -835,7 +1365,7 @@ class RecData(Pluggable):
             if crit.get("operator", "LIKE") == "LIKE":
                 retval = col.like(crit["search"])
             elif crit["operator"] == "REGEXP":
-                retval = col.op("REGEXP")(crit["search"])
+                retval = regexp_match(col, crit["search"])
             else:
                 retval = col == crit["search"]
             if subtable is not None:
@@ -843,6 +1373,17 @@ class RecData(Pluggable):
 
             return retval
 
+    @staticmethod
+    def fix_rating_sort(sort_by: Optional[List[Tuple]]) -> List[Tuple]:
+        """Return sort_by with the direction of any rating sort reversed.
+
+        Sorting by rating "ascending" means best first.
+        """
+        if sort_by is None:
+            return []
+        # Convert ascending flag to boolean
+        return [(col, direction == 1 and -1 or 1) if col == "rating" else (col, direction) for col, direction in sort_by]
+
     def search_recipes(self, searches, sort_by: Optional[List[Tuple]] = None):
         """Search recipes for columns of values.
 
@@ -853,17 +1394,9 @@ class RecData(Pluggable):
         # The reason it's not a dict is that sqlalchemy takes a list of key value pairs
         # The rest of the application treats it like a dictionary, though.
 
-        if sort_by is None:
-            sort_by = []
-
+        sort_by = self.fix_rating_sort(sort_by)
         sort_keys = [param[0] for param in sort_by]
 
-        if "rating" in sort_keys:
-            sort_by_rating = sort_keys.index("rating")
-            # Convert ascending flag to boolean
-            d = sort_by[sort_by_rating][1] == 1 and -1 or 1
-            sort_by[sort_by_rating] = ("rating", d)
-
         criteria = self.get_criteria((searches, "and"))
         debug("backends.db.search_recipes - search criteria are %s" % searches, 2)
 
@@ -894,6 +1427,16 @@ class RecData(Pluggable):
                 .fetchall()
             )
 
+    def lazy_search_recipes(self, searches, sort_by: Optional[List[Tuple]] = None, columns: Optional[List[str]] = None, read_ahead: bool = True):
+        """Search recipes like search_recipes, but fetch results lazily.
+
+        Return a RecipeResults, which runs the search a page at a time
+        as it is sliced. If columns is given, only those recipe
+        columns (plus id and deleted) are selected.
+        """
+        debug("backends.db.lazy_search_recipes - search criteria are %s" % searches, 2)
+        return RecipeResults(self, self.get_criteria((searches, "and")), self.fix_rating_sort(sort_by), columns=columns, read_ahead=read_ahead)
+
     def get_unique_values(self, colname, table=None, **criteria):
         """Get list of unique values for column in table."""
         if table is None:
@@ -920,7 +1463,7 @@ class RecData(Pluggable):
             if operator == "LIKE":
                 criteria = col.like(search["search"])
             elif operator == "REGEXP":
-                criteria = col.op("REGEXP")(search["search"])
+                criteria = regexp_match(col, search["search"])
             elif operator == "CONTAINS":
                 criteria = col.contains(search["search"])
             else:
@@ -963,6 +1506,8 @@ class RecData(Pluggable):
         if len(delete_args) > 1:
             delete_args = [and_(*delete_args)]
         table.delete(*delete_args).execute()
+        if table is self.ingredients_table:
+            self.run_hooks(self.delete_ing_hooks)
 
     def update_by_criteria(self, table, update_criteria, new_values_dic):
         try:
@@ -985,6 +1530,8 @@ class RecData(Pluggable):
             for k, v in list(new_values_dic.items()):
                 print("", "KEY:", k, type(k), "VAL:", v)
             raise
+        if table is self.ingredients_table and "ingkey" in new_values_dic:
+            self.run_hooks(self.modify_ing_hooks)
 
     def add_column_to_table(self, table, column_spec):
         """table is a table, column_spec is a tuple defining the
@@ -1038,6 +1585,11 @@ class RecData(Pluggable):
                 self.db.execute("ALTER TABLE %(t)s RENAME TO %(t)s_temp" % {"t": table_name})
             if do_raise:
                 raise
+        if self.db.dialect.name == "sqlite" and table_name in self.metadata.tables:
+            # SQLite index names are global and survive a table rename, so
+            # drop them before the recreated table tries to claim them.
+            for index in self.metadata.tables[table_name].indexes:
+                self.db.execute("DROP INDEX IF EXISTS %s" % index.name)
         # SQLAlchemy >= 0.7 doesn't allow: del self.metadata.tables[table_name]
         self.metadata._remove_table(table_name, self.metadata.schema)
         setup_function()
@@ -1087,62 +1639,59 @@ class RecData(Pluggable):
             col = self.recipe_table.c.ingredient_hash
         args = []
         if not include_deleted:
-            args.append(not self.recipe_table.c.deleted)
-        kwargs = dict(having=sqlalchemy.func.count(col) > 1, group_by=col)
-        duped_hashes = sqlalchemy.select([col], *args, **kwargs)
-        query = sqlalchemy.select(
-            [self.recipe_table.c.id, col],
-            include_deleted and col.in_(duped_hashes) or and_(col.in_(duped_hashes), not self.recipe_table.c.deleted),
-            order_by=col,
-        ).execute()
-        recs_by_hash = {}
-        for result in query.fetchall():
-            rec_id = result[0]
-            hsh = result[1]
-            if hsh not in recs_by_hash:
-                recs_by_hash[hsh] = []
-            recs_by_hash[hsh].append(rec_id)
-        results = list(recs_by_hash.values())
-        if recipes:
-            rec_ids = [r.id for r in recipes]
-            results = [reclist for reclist in results if True in [(rid in rec_ids) for rid in reclist]]
-        return results
+            args.append(self.recipe_table.c.deleted == sqlalchemy.false())
+        duped_hashes = sqlalchemy.select([col]).where(*args).group_by(col).having(sqlalchemy.func.count(col) > 1)
+        query = sqlalchemy.select([self.recipe_table.c.id, col]).where(col.in_(duped_hashes), *args).order_by(col, self.recipe_table.c.id)
+        results = [[row.id for row in rows] for hsh, rows in itertools.groupby(query.execute(), lambda row: row[1])]
+        return self._filter_duplicates(results, recipes)
 
     def find_complete_duplicates(self, recipes=None, include_deleted=True):
         """Find all duplicate recipes (by recipe_hash and ingredient_hash)."""
-        args = []
-        if not include_deleted:
-            args.append(not self.recipe_table.c.deleted)
+        return self.find_all_duplicates(recipes=recipes, include_deleted=include_deleted)
+
+    def find_all_duplicates(self, recipes=None, include_deleted=True, near=False, threshold=recipeIdentifier.NEAR_DUPLICATE_THRESHOLD):
+        """Return a list of lists of IDs of duplicate recipes.
 
-        ing_hashes, rec_hashes = [
-            sqlalchemy.select([col], *args, **dict(having=sqlalchemy.func.count(col) > 1, group_by=col))
-            for col in [self.recipe_table.c.ingredient_hash, self.recipe_table.c.recipe_hash]
-        ]
+        Duplicates share both their recipe_hash and their
+        ingredient_hash, and are found with a single GROUP BY over the
+        two. With near=True, recipes are duplicates when the words of
+        their titles and their ingredients are at least threshold alike,
+        as recipeIdentifier.NearDuplicateFinder works out.
+
+        If recipes is given, only the lists with one of them in are
+        returned.
+        """
+        r = self.recipe_table.c
+        args = []
         if not include_deleted:
-            select_statements = [not self.recipe_table.c.deleted]
-        else:
-            select_statements = []
-        select_statements.append(self.recipe_table.c.ingredient_hash.in_(ing_hashes))
-        select_statements.append(self.recipe_table.c.recipe_hash.in_(rec_hashes))
-
-        query = sqlalchemy.select(
-            [self.recipe_table.c.id, self.recipe_table.c.recipe_hash, self.recipe_table.c.ingredient_hash],
-            and_(*select_statements),
-            order_by=[self.recipe_table.c.recipe_hash, self.recipe_table.c.ingredient_hash],
-        ).execute()
-        recs_by_hash = {}
-        for result in query.fetchall():
-            rec_id = result[0]
-            rhsh = result[1]
-            ihsh = result[2]
-            if (rhsh, ihsh) not in recs_by_hash:
-                recs_by_hash[(rhsh, ihsh)] = []
-            recs_by_hash[(rhsh, ihsh)].append(rec_id)
-        results = list(recs_by_hash.values())
-        if recipes:
-            rec_ids = [r.id for r in recipes]
-            results = [reclist for reclist in results if True in [(rid in rec_ids) for rid in reclist]]
-        return results
+            args.append(r.deleted == sqlalchemy.false())
+        if near:
+            return self._filter_duplicates(self._find_near_duplicates(args, threshold), recipes)
+        hashes = [r.recipe_hash, r.ingredient_hash]
+        duped = select(hashes).where(*args).group_by(*hashes).having(func.count() > 1).alias("duped")
+        query = select([r.id] + hashes).where(r.recipe_hash == duped.c.recipe_hash, r.ingredient_hash == duped.c.ingredient_hash, *args).order_by(*hashes, r.id)
+        results = [[row.id for row in rows] for key, rows in itertools.groupby(query.execute(), lambda row: (row.recipe_hash, row.ingredient_hash))]
+        return self._filter_duplicates(results, recipes)
+
+    def _find_near_duplicates(self, args, threshold):
+        # Each recipe's title and ingredients, a recipe at a time.
+        r, i = self.recipe_table.c, self.ingredients_table.c
+        joined = self.recipe_table.outerjoin(self.ingredients_table, and_(i.recipe_id == r.id, i.deleted == sqlalchemy.false()))
+        query = select([r.id, r.title, i.item, i.ingkey, i.unit, i.amount]).select_from(joined).where(*args).order_by(r.id, i.position)
+        finder = recipeIdentifier.NearDuplicateFinder(threshold)
+        conv = convert.get_converter()
+        for id, rows in itertools.groupby(query.execute(), lambda row: row.id):
+            rows = list(rows)
+            ings = [row for row in rows if row.item or row.ingkey]
+            finder.add(id, recipeIdentifier.get_recipe_tokens(rows[0].title, ings, conv))
+        return finder.get_groups()
+
+    def _filter_duplicates(self, results, recipes):
+        """Return the lists of duplicate IDs in results with one of recipes in."""
+        if not recipes:
+            return results
+        rec_ids = set(r.id for r in recipes)
+        return [reclist for reclist in results if not rec_ids.isdisjoint(reclist)]
 
     # convenience DB access functions for working with ingredients,
     # recipes, etc.
@@ -1158,34 +1707,37 @@ class RecData(Pluggable):
         """
         self.validate_recdic(dic)
         debug("validating dictionary", 3)
-        if "category" in dic:
-            newcats = dic["category"].split(", ")
-            newcats = [x for x in newcats if x]  # Make sure our categories are not blank
-            curcats = self.get_cats(rec)
-            for c in curcats:
-                if c not in newcats:
-                    self.delete_by_criteria(self.categories_table, {"recipe_id": rec.id, "category": c})
-            for c in newcats:
-                if c not in curcats:
-                    self.do_add_cat({"recipe_id": rec.id, "category": c})
-            del dic["category"]
-        debug("do modify rec", 3)
-        retval = self.do_modify_rec(rec, dic)
-        self.update_hashes(rec)
+        with self.transaction():
+            if "category" in dic:
+                newcats = dic["category"].split(", ")
+                newcats = [x for x in newcats if x]  # Make sure our categories are not blank
+                curcats = self.get_cats(rec)
+                for c in curcats:
+                    if c not in newcats:
+                        self.delete_by_criteria(self.categories_table, {"recipe_id": rec.id, "category": c})
+                for c in newcats:
+                    if c not in curcats:
+                        self.do_add_cat({"recipe_id": rec.id, "category": c})
+                del dic["category"]
+            debug("do modify rec", 3)
+            retval = self.do_modify_rec(rec, dic)
+            self.update_hashes(rec)
+            if "image_id" in dic:
+                self.delete_unused_images()
+            self.recipe_changed("modify_hooks", rec.id)
         return retval
 
     def validate_recdic(self, recdic):
         if "last_modified" not in recdic:
             recdic["last_modified"] = time.time()
-        if "image" in recdic and "thumb" not in recdic:
-            # if we have an image but no thumbnail, we want to create the thumbnail.
+        # Recipes only refer to their image, which lives in recipe_images
+        # along with its thumbnail.
+        thumb = recdic.pop("thumb", None)
+        if "image" in recdic:
+            image = recdic.pop("image")
             try:
-                img = image_utils.bytes_to_image(recdic["image"])
-                thumb = img.copy()
-                thumb.thumbnail((40, 40))
-                recdic["thumb"] = image_utils.image_to_bytes(thumb)
+                recdic["image_id"] = image and self.store_image(image, thumb) or None
             except Exception:
-                del recdic["image"]
                 print(
                     """Warning: Gourmand couldn't recognize the image.
 
@@ -1240,19 +1792,15 @@ class RecData(Pluggable):
                     matches.append(r)
             return matches
 
-    def find_all_duplicates(self):
-        """Return a list of sets of duplicate recipes."""
-        raise NotImplementedError
-
     def merge_mergeable_duplicates(self):
         """Merge all duplicates for which a simple merge is possible.
         For those recipes which can't be merged, return:
         [recipe-id-list,to-merge-dic,diff-dic]
         """
-        dups = self.find_all_duplicates()
+        dups = self.find_all_duplicates(include_deleted=False)
         unmerged = []
         for recs in dups:
-            rec_objs = [self.fetch_one(self.recipe_table, id=r) for r in recs]
+            rec_objs = self.fetch_all(self.recipe_table, id=("in", recs), sort_by=[("id", 1)])
             merge_dic, diffs = recipeIdentifier.merge_recipes(self, rec_objs)
             if not diffs:
                 if merge_dic:
@@ -1264,7 +1812,10 @@ class RecData(Pluggable):
         return unmerged
 
     def modify_ing(self, ing, ingdict):
-        return self.do_modify_ing(ing, ingdict)
+        ret = self.do_modify_ing(ing, ingdict)
+        if "ingkey" in ingdict:
+            self.run_hooks(self.modify_ing_hooks)
+        return ret
 
     def add_rec(self, dic: Dict[str, Any]):  # Returns "RowProxy"
         """Add a recipe to the database.
@@ -1272,10 +1823,36 @@ class RecData(Pluggable):
         The function expect a dictionary of column values for the recipe,
         and returns the entry in the database as a RowProxy.
         """
+        cats = self.prepare_recdic(dic)
+        with self.transaction():
+            try:
+                ret = self.do_add_rec(dic)
+            except:
+                print("Problem adding recipe with dictionary...")
+                for k, v in list(dic.items()):
+                    print("KEY:", k, "of type", type(k), "VALUE:", v, "of type", type(v))
+                raise
+            if isinstance(ret, int):
+                ID = ret
+                ret = self.get_rec(ID)
+            else:
+                ID = ret.id
+            for c in cats:
+                if c:
+                    self.do_add_cat({"recipe_id": ID, "category": c.strip()})
+            self.update_hashes(ret)
+            self.recipe_changed("add_hooks", ID)
+        return ret
+
+    def prepare_recdic(self, dic: Dict[str, Any]) -> List[str]:
+        """Get recipe dictionary dic ready for the recipe table.
+
+        Categories are taken out of dic and returned as a list.
+        """
         cats = []
-        if dic.get('category'):
+        if dic.get("category"):
             cats = [v.strip() for v in dic["category"].split(",") if v]
-            del dic["category"]
+        dic.pop("category", None)
         if "servings" in dic:
             if "yields" in dic:
                 del dic["yields"]
@@ -1290,24 +1867,104 @@ class RecData(Pluggable):
         if "deleted" not in dic:
             dic["deleted"] = False
         self.validate_recdic(dic)
+        return cats
+
+    def add_recs_bulk(self, recs: List[Dict[str, Any]]) -> List[int]:
+        """Add several recipes at once and return their IDs.
+
+        Each dictionary in recs is a recipe as handed to add_rec, which
+        may also hold its ingredients, as a list of dictionaries, under
+        "ingredients". Recipes, categories and ingredients are each
+        written with a single executemany within one transaction, and
+        recipe hashes are computed from recs rather than read back from
+        the database. The full text index is brought up to date once
+        they are all written.
+        """
+        if not recs:
+            return []
+        self.changed = True
+        conv = convert.get_converter()
+        rec_cats, rec_ings = [], []
+        for dic in recs:
+            rec_ings.append(dic.pop("ingredients", []))
+            rec_cats.append(self.prepare_recdic(dic))
+            if "id" in dic and dic["id"] not in self.new_ids:
+                raise ValueError("New recipe created with preset id %s, but ID is not in our list of new_ids" % dic["id"])
+        reserved = [dic["id"] for dic in recs if "id" in dic]
+        cats, ings = [], []
+        with self.transaction() as connection:
+            if self.has_full_text_index:
+                connection.exec_driver_sql("INSERT INTO recipe_fts_paused VALUES (1)")
+            next_id = (connection.execute(select([func.max(self.recipe_table.c.id)])).scalar() or 0) + 1
+            for dic, rcats, rings in zip(recs, rec_cats, rec_ings):
+                if "id" not in dic:
+                    dic["id"] = next_id
+                    next_id += 1
+                cats.extend({"recipe_id": dic["id"], "category": c} for c in rcats if c)
+                for i in rings:
+                    i.pop("id", None)
+                    i["recipe_id"] = dic["id"]
+                    i.setdefault("deleted", False)
+                ings.extend(rings)
+                dic["recipe_hash"] = recipeIdentifier.get_recipe_hash(SimpleNamespace(title=dic.get("title"), instructions=dic.get("instructions")))
+                dic["ingredient_hash"] = recipeIdentifier.get_ingredient_hash([self._ing_as_stored(i) for i in rings if not i["deleted"]], conv)
+            # Recipes with reserved IDs take the place of the rows
+            # new_id() left for them.
+            for chunk in chunked(reserved):
+                connection.execute(self.recipe_table.delete().where(self.recipe_table.c.id.in_(chunk)))
+            self._insert_many(connection, self.recipe_table, self._with_same_keys(recs))
+            self._insert_many(connection, self.categories_table, cats)
+            self._insert_many(connection, self.ingredients_table, self._with_same_keys(ings))
+            if self.has_full_text_index:
+                connection.exec_driver_sql("DELETE FROM recipe_fts_paused")
+                self.refresh_full_text_index(connection, [dic["id"] for dic in recs])
+            for dic in recs:
+                self.recipe_changed("add_hooks", dic["id"])
+        self.new_ids.difference_update(reserved)
+        return [dic["id"] for dic in recs]
+
+    def _insert_many(self, connection, table: Table, dics: List[Dict[str, Any]]):
+        """Insert dics into table with one executemany.
+
+        If some of their values won't go into table's columns as they
+        are, every dictionary is put through coerce_types and we try
+        again, as do_add does for a single row.
+        """
+        if not dics:
+            return
         try:
-            ret = self.do_add_rec(dic)
-        except:
-            print("Problem adding recipe with dictionary...")
-            for k, v in list(dic.items()):
-                print("KEY:", k, "of type", type(k), "VALUE:", v, "of type", type(v))
+            connection.execute(table.insert(), dics)
+        except sqlalchemy.exc.DBAPIError:
             raise
-        else:
-            if isinstance(ret, int):
-                ID = ret
-                ret = self.get_rec(ID)
-            else:
-                ID = ret.id
-            for c in cats:
-                if c:
-                    self.do_add_cat({"recipe_id": ID, "category": c.strip()})
-            self.update_hashes(ret)
-            return ret
+        except sqlalchemy.exc.StatementError as e:
+            # Our column types reject a value before it reaches the database
+            if not isinstance(e.orig, (TypeError, ValueError)):
+                raise
+            print("Had to coerce types", table)
+            for dic in dics:
+                self.coerce_types(table, dic)
+            connection.execute(table.insert(), dics)
+
+    @staticmethod
+    def _with_same_keys(dics: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Fill in None for missing keys, since executemany needs identical dictionaries."""
+        keys = set().union(*dics)
+        for d in dics:
+            for key in keys:
+                d.setdefault(key, None)
+        return dics
+
+    @staticmethod
+    def _ing_as_stored(dic: Dict[str, Any]) -> SimpleNamespace:
+        """Return ingredient dictionary dic as get_ings would, for hashing."""
+        ing = SimpleNamespace(item=dic.get("item"), ingkey=dic.get("ingkey"), unit=dic.get("unit"), amount=dic.get("amount"))
+        if ing.amount is not None:
+            try:
+                ing.amount = float(ing.amount)
+            except (TypeError, ValueError):
+                # What coerce_types makes of it (see _insert_many)
+                ing.amount = None
+        return ing
 
     def add_ing_and_update_keydic(self, dic):
         if "item" in dic and "ingkey" in dic and dic["item"] and dic["ingkey"]:
@@ -1467,6 +2124,71 @@ class RecData(Pluggable):
             cats.remove("")
         return cats
 
+    def get_ings_many(self, rec_ids) -> Dict[int, list]:
+        """Return the ingredients of each of rec_ids, as get_ings
+        would, in order of position, by recipe ID.
+
+        This takes a query per IN_CHUNK_SIZE recipes rather than one
+        per recipe.
+        """
+        ings = self.ingredients_table
+        ret = {id: [] for id in rec_ids}
+        for ids in chunked(ret):
+            query = ings.select(and_(ings.c.recipe_id.in_(ids), ings.c.deleted == sqlalchemy.false()))
+            for i in query.order_by(ings.c.recipe_id, ings.c.position, ings.c.id).execute():
+                ret[i.recipe_id].append(i)
+        return ret
+
+    def get_cats_many(self, rec_ids) -> Dict[int, List[str]]:
+        """Return the categories of each of rec_ids, as get_cats
+        would, by recipe ID."""
+        cats = self.categories_table
+        ret = {id: [] for id in rec_ids}
+        for ids in chunked(ret):
+            query = select([cats.c.recipe_id, cats.c.category], and_(cats.c.recipe_id.in_(ids), cats.c.category != ""))
+            for c in query.order_by(cats.c.recipe_id, cats.c.id).execute():
+                ret[c.recipe_id].append(c.category)
+        return ret
+
+    def store_image(self, image: bytes, thumb: Optional[bytes] = None) -> str:
+        """Add image to recipe_images, unless it's there already, and return its ID.
+
+        If no thumbnail is given, one is made from image.
+        """
+        image_id = hashlib.sha256(image).hexdigest()
+        if select([self.recipe_images_table.c.id], self.recipe_images_table.c.id == image_id).execute().fetchone() is None:
+            if thumb is None:
+                thumb = image_utils.thumbnail_from_bytes(image, (40, 40))
+            self.recipe_images_table.insert().execute(id=image_id, image=image, thumb=thumb)
+        return image_id
+
+    def _get_image_column(self, rec, column):
+        image_id = getattr(rec, "image_id", None)
+        if image_id:
+            return select([column], self.recipe_images_table.c.id == image_id).execute().scalar()
+
+    def get_image(self, rec) -> Optional[bytes]:
+        """Return the image of rec, or None if it has none."""
+        return self._get_image_column(rec, self.recipe_images_table.c.image)
+
+    def get_thumb(self, rec) -> Optional[bytes]:
+        """Return the 40x40 thumbnail of rec's image, or None."""
+        return self._get_image_column(rec, self.recipe_images_table.c.thumb)
+
+    def get_preview(self, rec) -> Optional[bytes]:
+        """Return rec's image scaled to fit ThumbnailSize.LARGE, or None.
+
+        Previews are made the first time they are asked for, and stored.
+        """
+        preview = self._get_image_column(rec, self.recipe_images_table.c.preview)
+        if preview is None:
+            image = self.get_image(rec)
+            if not image:
+                return None
+            preview = image_utils.thumbnail_from_bytes(image, image_utils.ThumbnailSize.LARGE.value)
+            self.update_by_criteria(self.recipe_images_table, {"id": rec.image_id}, {"preview": preview})
+        return preview
+
     def get_referenced_rec(self, ing):
         """Get recipe referenced by ingredient object."""
         if hasattr(ing, "refid") and ing.refid:
@@ -1488,15 +2210,110 @@ class RecData(Pluggable):
 
     def include_linked_recipes(self, recs):
         """Handed a list of recipes, append any recipes that are
-        linked as ingredients in those recipes to the list.
+        linked as ingredients in those recipes, however indirectly,
+        to the list.
 
         Modifies the list in place.
         """
-        ids = [r.id for r in recs]
-        extra_ings = self.ingredients_table.select(and_(self.ingredients_table.c.refid, self.ingredients_table.c.recipe_id.in_(ids))).execute().fetchall()
-        for i in extra_ings:
-            if i.refid not in ids:
-                recs.append(self.get_referenced_rec(i))
+        ings = self.ingredients_table
+        ids = set(r.id for r in recs)
+        # Only the recipes with references need following, which keeps
+        # the query small when we're handed every recipe we have.
+        referring = select([ings.c.recipe_id], and_(ings.c.refid.isnot(None), ings.c.deleted == sqlalchemy.false())).distinct().execute()
+        recipes, ingredients = self.fetch_reference_closure(ids.intersection(row.recipe_id for row in referring))
+        recs.extend(rec for id, rec in recipes.items() if id not in ids)
+
+    def fetch_reference_closure(self, ids):
+        """Fetch recipes ids, every recipe they refer to however
+        indirectly, and all of their ingredients, in two queries.
+
+        Return a dictionary of recipes by ID and one of lists of their
+        ingredients by recipe ID, in order. A reference whose recipe is
+        gone is mended by title, as get_referenced_rec does.
+        """
+        ings = self.ingredients_table
+        ids = list(ids)
+        tried = set()
+        while True:
+            closure = select([self.recipe_table.c.id], self.recipe_table.c.id.in_(ids)).cte("closure", recursive=True)
+            # UNION rather than UNION ALL, so that cycles end.
+            closure = closure.union(
+                select([ings.c.refid], and_(ings.c.recipe_id == closure.c.id, ings.c.refid.isnot(None), ings.c.deleted == sqlalchemy.false()))
+            )
+            reachable = select([closure.c.id])
+            recipes = {rec.id: rec for rec in self.recipe_table.select(self.recipe_table.c.id.in_(reachable)).execute()}
+            ingredients = {id: [] for id in recipes}
+            live = ings.select(and_(ings.c.recipe_id.in_(reachable), ings.c.deleted == sqlalchemy.false()))
+            for i in live.order_by(ings.c.recipe_id, ings.c.position).execute():
+                ingredients[i.recipe_id].append(i)
+            broken = [i for lst in ingredients.values() for i in lst if i.refid and i.refid not in recipes and i.id not in tried]
+            tried.update(i.id for i in broken)
+            # Mending a reference brings more recipes in, so we look again.
+            if not [i for i in broken if self.get_referenced_rec(i)]:
+                return recipes, ingredients
+
+    def expand_references(self, ids, mult=1, includes=None, on_cycle=None):
+        """Return the ingredients of recipes ids with the recipes they
+        refer to expanded in place.
+
+        The result maps each ID to a list of [amount, unit, ingkey], as
+        ingview_to_lst makes, multiplied by mult. An ingredient that
+        refers to another recipe is replaced by that recipe's
+        ingredients, multiplied by its amount, however deep the
+        references go. A reference to a recipe we don't have stays an
+        ingredient, in the unit "recipe" unless it has one.
+
+        includes maps recipe IDs to the optional ingredients to keep:
+        True for all of them or a dictionary of ingredient keys and
+        booleans. Other optional ingredients are left out.
+
+        An ingredient that would make a recipe part of itself is left
+        out and handed, with the ID of its recipe, to on_cycle.
+        """
+        if includes is None:
+            includes = {}
+        recipes, ingredients = self.fetch_reference_closure(ids)
+        # recipe ID -> [(ingredient, multiplier)], for the recipes we
+        # expanded without cutting a cycle short.
+        expanded = {}
+
+        def expand(id, path):
+            if id in expanded:
+                return expanded[id], True
+            include = includes.get(id)
+            lst = []
+            complete = True
+            for i in ingredients.get(id, []):
+                if i.optional and (not include or (isinstance(include, dict) and not include.get(i.ingkey))):
+                    continue
+                if i.refid in recipes:
+                    if i.refid in path:
+                        debug("Recipe %s calls for itself through %s" % (id, i.item), 0)
+                        if on_cycle:
+                            on_cycle(id, i)
+                        complete = False
+                        continue
+                    # A reference without an amount means the recipe once.
+                    refmult = self.get_amount_as_float(i) or 1
+                    sublist, subcomplete = expand(i.refid, path | {i.refid})
+                    lst.extend((subi, m * refmult) for subi, m in sublist)
+                    complete = complete and subcomplete
+                else:
+                    lst.append((i, 1))
+            if complete:
+                expanded[id] = lst
+            return lst, complete
+
+        ret = {}
+        for id in ids:
+            ret[id] = []
+            for i, m in expand(id, {id})[0]:
+                amount = self.get_amount(i, mult=mult * m) if self.get_amount(i) else None
+                if i.refid:
+                    ret[id].append([amount, i.unit or "recipe", i.ingkey or i.item])
+                else:
+                    ret[id].append([amount, i.unit, i.ingkey])
+        return ret
 
     def get_rec(self, id, recipe_table=None):
         """Handed an ID, return a recipe object."""
@@ -1506,25 +2323,51 @@ class RecData(Pluggable):
         recipe_table = self.recipe_table
         return self.fetch_one(self.recipe_table, id=id)
 
+    def get_recs(self, ids) -> list:
+        """Return the recipes with IDs ids, in the same order, leaving
+        out any we don't have."""
+        recs = {}
+        for chunk in chunked(dict.fromkeys(ids)):
+            recs.update((rec.id, rec) for rec in self.fetch_all(self.recipe_table, id=("in", chunk)))
+        return [recs[id] for id in ids if id in recs]
+
     def delete_rec(self, rec):
         """Delete recipe object rec from our database."""
         if not isinstance(rec, int):
             rec = rec.id
         debug("deleting recipe ID %s" % rec, 0)
-        self.delete_by_criteria(self.recipe_table, {"id": rec})
-        self.delete_by_criteria(self.categories_table, {"recipe_id": rec})
-        self.delete_by_criteria(self.ingredients_table, {"recipe_id": rec})
+        with self.transaction():
+            self.delete_by_criteria(self.recipe_table, {"id": rec})
+            self.delete_by_criteria(self.categories_table, {"recipe_id": rec})
+            self.delete_by_criteria(self.ingredients_table, {"recipe_id": rec})
+            self.delete_unused_images()
         debug("deleted recipe ID %s" % rec, 0)
 
+    def delete_unused_images(self):
+        """Delete images no recipe refers to any longer."""
+        used = select([self.recipe_table.c.image_id], self.recipe_table.c.image_id.isnot(None))
+        self.recipe_images_table.delete(self.recipe_images_table.c.id.notin_(used)).execute()
+
     def new_rec(self):
         """Create and return a new, empty recipe"""
         return self.add_rec({"title": _("New Recipe")})
 
     def new_id(self) -> int:
         rec = self.do_add_rec({"deleted": 1})
-        self.new_ids.append(rec.id)
+        self.new_ids.add(rec.id)
         return rec.id
 
+    def reserve_ids(self, n: int) -> List[int]:
+        """Reserve n IDs at once, as new_id() does one at a time."""
+        if not n:
+            return []
+        with self.transaction() as connection:
+            next_id = (connection.execute(select([func.max(self.recipe_table.c.id)])).scalar() or 0) + 1
+            ids = list(range(next_id, next_id + n))
+            connection.execute(self.recipe_table.insert(), [{"id": rid, "deleted": True} for rid in ids])
+        self.new_ids.update(ids)
+        return ids
+
     # Convenience functions for dealing with ingredients
 
     def order_ings(self, ings):
@@ -1747,6 +2590,7 @@ class RecData(Pluggable):
                 self.do_modify(self.keylookup_table, row, {"count": row.count + 1})
             else:
                 self.do_add(self.keylookup_table, {"word": str(w), "ingkey": str(key), "count": 1})
+        self.run_hooks(self.keydic_hooks, item, key, 1)
 
     def remove_ing_from_keydic(self, item, key):
         # print 'remove ',item,key,'to keydic'
@@ -1758,14 +2602,20 @@ class RecData(Pluggable):
             else:
                 self.delete_by_criteria(self.keylookup_table, {"item": item, "ingkey": key})
         for word in item.split():
-            word = word.lower()
-            row = self.fetch_one(self.keylookup_table, item=item, ingkey=key)
+            word = word.casefold()
+            row = self.fetch_one(self.keylookup_table, word=word, ingkey=key)
             if row:
                 new_count = row.count - 1
                 if new_count:
                     self.do_modify(self.keylookup_table, row, {"count": new_count})
                 else:
                     self.delete_by_criteria(self.keylookup_table, {"word": word, "ingkey": key})
+        self.run_hooks(self.keydic_hooks, item, key, -1)
+
+    def delete_key_from_keydic(self, key):
+        """Forget everything the keylookup table knows about key."""
+        self.delete_by_criteria(self.keylookup_table, {"ingkey": key})
+        self.run_hooks(self.keydic_hooks)
 
     def ing_shopper(self, view):
         from gourmand.recipeManager import DatabaseShopper
@@ -1779,6 +2629,10 @@ class RecData(Pluggable):
         for k in keys:
             if k == "category":
                 v = ", ".join(self.get_cats(obj))
+            elif k == "image":
+                v = self.get_image(obj)
+            elif k == "thumb":
+                v = self.get_thumb(obj)
             else:
                 v = getattr(obj, k)
             orig_dic[k] = v
@@ -1943,6 +2797,10 @@ class RecipeManager:
         else:
             return None
 
+    def unit_was_used(self, unit: str) -> bool:
+        """Return whether any ingredient has unit for its unit."""
+        return bool(self.rd.fetch_all(self.rd.ingredients_table, unit=unit))
+
     def parse_ingredient(self, s, conv=None, get_key=True):
         """Handed a string, we hand back a dictionary representing a parsed ingredient (sans recipe ID)"""
         # if conv:
@@ -1976,8 +2834,7 @@ class RecipeManager:
                     d["unit"] = u.strip()
                 else:
                     # has this unit been used
-                    prev_uses = self.rd.fetch_all(self.rd.ingredients_table, unit=u.strip())
-                    if prev_uses:
+                    if self.unit_was_used(u.strip()):
                         d["unit"] = u
                     else:
                         # otherwise, unit is not a unit
@@ -2077,6 +2934,149 @@ class DatabaseConverter(convert.Converter):
                 self.unit_dict[v] = key
 
 
+class RecipeResults:
+    """A sorted set of recipes matching some criteria, fetched lazily.
+
+    RecipeResults behaves like a read-only list of recipe rows, but
+    only runs the queries needed for the slices actually asked for,
+    which is what PageableViewStore does to show a page. Pages are
+    found by keyset pagination -- we remember the sort key of the last
+    row of each slice we fetch, so the next page starts right after it
+    rather than making SQLite count through an OFFSET. If read_ahead
+    is set, each fetch also grabs the following page.
+    """
+
+    # How many fetched slices to keep around.
+    cache_size = 4
+
+    def __init__(self, rd, criteria, sort_by, columns=None, read_ahead=True):
+        self.rd = rd
+        self.criteria = criteria
+        self.read_ahead = read_ahead
+        table = rd.recipe_table
+        if columns:
+            columns = ["id", "deleted"] + [c for c in columns if c not in ("id", "deleted") and hasattr(table.c, c)]
+            self.columns = [getattr(table.c, c) for c in columns]
+        else:
+            self.columns = list(table.c)
+        if "category" in [col for col, direction in sort_by]:
+            # Rows are repeated for each of a recipe's categories, so
+            # there's no sort key to page by.
+            self.from_obj = sqlalchemy.outerjoin(table, rd.categories_table)
+            self.sort_keys = make_sort_keys(sort_by, table, join_tables=[rd.categories_table])
+            self.use_keyset = False
+        else:
+            self.from_obj = table
+            # NULLs can't be compared, so coalesce them to values which
+            # sort the same way (first when ascending).
+            self.sort_keys = [
+                (func.coalesce(col, -(2**62) if isinstance(col.type, (Integer, Float, Boolean)) else ""), direction)
+                for col, direction in make_sort_keys(sort_by, table)
+            ]
+            self.use_keyset = True
+        # Break ties by ID so that the order is total.
+        self.sort_keys.append((table.c.id, 1))
+        self.order_by = [sqlalchemy.asc(col) if direction == 1 else sqlalchemy.desc(col) for col, direction in self.sort_keys]
+        self._length = None
+        # index of a row -> values of its sort keys
+        self._keys = {}
+        # (bottom, top) -> rows
+        self._cache = {}
+
+    def count(self) -> int:
+        """Return the number of matching recipes."""
+        if self._length is None:
+            self._length = (
+                sqlalchemy.select([func.count(sqlalchemy.distinct(self.rd.recipe_table.c.id))], self.criteria, from_obj=[self.from_obj]).execute().scalar()
+            )
+        return self._length
+
+    def page(self, n: int, per_page: int):
+        """Return the rows on page n (counting from 0)."""
+        return self[n * per_page : (n + 1) * per_page]
+
+    def fetch_row(self, id):
+        """Return the row for recipe id, with only our columns."""
+        return sqlalchemy.select(self.columns, self.rd.recipe_table.c.id == id).execute().fetchone()
+
+    def invalidate(self):
+        """Forget what we have fetched, e.g. after recipes changed."""
+        self._length = None
+        self._keys = {}
+        self._cache = {}
+
+    def _fetch(self, bottom, limit):
+        if self.use_keyset:
+            key_cols = [col.label("sort_key_%s" % n) for n, (col, direction) in enumerate(self.sort_keys)]
+            query = sqlalchemy.select(self.columns + key_cols, self.criteria, from_obj=[self.from_obj], order_by=self.order_by, limit=limit)
+            if bottom in self._keys:
+                query = query.where(self._after(self._keys[bottom]))
+            elif bottom:
+                query = query.offset(bottom)
+            rows = query.execute().fetchall()
+            for n, row in enumerate(rows):
+                # Remember where the slice after this one starts.
+                if n == len(rows) - 1 or n == limit // 2 - 1:
+                    self._keys[bottom + n + 1] = row[-len(key_cols) :]
+            return rows
+        return (
+            sqlalchemy.select(self.columns, self.criteria, distinct=True, from_obj=[self.from_obj], order_by=self.order_by, limit=limit, offset=bottom)
+            .execute()
+            .fetchall()
+        )
+
+    def _after(self, values):
+        """Return criteria for rows which sort after a row with sort key values."""
+        clauses = []
+        for n, (col, direction) in enumerate(self.sort_keys):
+            ties = [c == v for (c, d), v in zip(self.sort_keys[:n], values)]
+            clauses.append(and_(*ties, col > values[n] if direction == 1 else col < values[n]))
+        return or_(*clauses)
+
+    def _get_rows(self, bottom, top):
+        for (cached_bottom, cached_top), rows in self._cache.items():
+            if cached_bottom <= bottom and top <= cached_top:
+                return rows[bottom - cached_bottom : top - cached_bottom]
+        size = top - bottom
+        rows = self._fetch(bottom, self.read_ahead and 2 * size or size)
+        if len(self._cache) >= self.cache_size:
+            self._cache.clear()
+        self._cache[(bottom, top)] = rows[:size]
+        if self.read_ahead:
+            self._cache[(top, top + size)] = rows[size:]
+        return rows[:size]
+
+    def __len__(self):
+        return self.count()
+
+    def __bool__(self):
+        return self.count() > 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            bottom, top, step = index.indices(len(self))
+            if top <= bottom:
+                return []
+            return self._get_rows(bottom, top)[::step]
+        if index < 0:
+            index += len(self)
+        rows = self._get_rows(index, index + 1) if 0 <= index else []
+        if not rows:
+            raise IndexError("RecipeResults index out of range")
+        return rows[0]
+
+    def __setitem__(self, index, row):
+        """Replace a row we have fetched, e.g. after it was modified."""
+        for (bottom, top), rows in self._cache.items():
+            if bottom <= index < top and index - bottom < len(rows):
+                rows[index - bottom] = row
+
+    def __iter__(self):
+        chunk = 500
+        for bottom in range(0, len(self), chunk):
+            yield from self._get_rows(bottom, bottom + chunk)
+
+
 class dbDic:
     def __init__(self, keyprop, valprop, view, db):
         """Create a dictionary interface to a database table."""
@@ -2097,6 +3097,8 @@ class dbDic:
             except Exception:
                 return False
 
+    __contains__ = has_key
+
     def __setitem__(self, k, v):
         store_v = v
         row = self.db.fetch_one(self.vw, **{self.kp: k})
@@ -2201,7 +3203,9 @@ def backup_database(filename: Path) -> Path:
         message_type=Gtk.MessageType.INFO,
     )
 
-    shutil.copy(filename, backup_name)
+    # Through SQLite, which copies what is still in the write-ahead log too.
+    with contextlib.closing(sqlite3.connect(filename)) as source, contextlib.closing(sqlite3.connect(backup_name)) as backup:
+        source.backup(backup)
 
     assert backup_name.is_file()
     return backup_name
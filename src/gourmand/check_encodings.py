@@ -1,4 +1,6 @@
-from typing import Dict
+import codecs
+import os
+from typing import Dict, Iterator, List, Optional
 
 from gi.repository import Gtk
 
@@ -8,6 +10,28 @@ from .gdebug import debug
 from .gtk_extras import dialog_extras as de
 from .prefs import Prefs
 
+# Whether GetFile may ask the user which encoding a file is in. Processes
+# with no one to ask (such as import workers) turn this off, and get an
+# EncodingUndecided error instead.
+ask_user = True
+
+# We choose between encodings by decoding the first SAMPLE_SIZE bytes of
+# a file, and OFFSET_SAMPLES samples of OFFSET_SAMPLE_SIZE bytes spread
+# over the rest of it.
+SAMPLE_SIZE = 256 * 1024
+OFFSET_SAMPLES = 4
+OFFSET_SAMPLE_SIZE = 16 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+BOMS = [(codecs.BOM_UTF8, "utf_8_sig"), (codecs.BOM_UTF16_LE, "utf_16"), (codecs.BOM_UTF16_BE, "utf_16")]
+
+
+class EncodingUndecided(Exception):
+    """Raised instead of asking the user to choose an encoding when ask_user is off."""
+
+    def __init__(self, filename):
+        self.filename = filename
+
 
 class CheckEncoding:
     """A class to read a file and guess the correct text encoding."""
@@ -76,72 +100,146 @@ class CheckEncoding:
 
     def __init__(self, filename, encodings=None):
         if Prefs.instance().get("utf-16", False):
-            self.encodings.extend(["utf_16", "utf_16_le", "utf_16_be"])
+            self.encodings = self.encodings + ["utf_16", "utf_16_le", "utf_16_be"]
         if encodings is not None:
             self.encodings = encodings
-
-        with open(filename, "rb") as fin:
-            self.txt = fin.read()
-
-    def test_encodings(self):
-        """Move through self.encodings one at a time and return the first
-        encoding that decodes our text cleanly. We return a tuple
-        (encoding, decoded_text)"""
-        for e in self.encodings:
+        self.filename = filename
+        self.size = os.path.getsize(filename)
+
+    def guess_encoding(self) -> Optional[str]:
+        """Return the encoding our file is in, if we can tell without
+        comparing candidates: it starts with a byte order mark, or it
+        is all valid UTF-8."""
+        with open(self.filename, "rb") as fin:
+            start = fin.read(4)
+            for bom, encoding in BOMS:
+                if start.startswith(bom):
+                    return encoding
+            fin.seek(0)
+            # Decode as we read, keeping no more than a chunk in memory.
+            decoder = codecs.getincrementaldecoder("utf-8")()
             try:
-                t = self.txt.decode(e)
-                return (e, t)
+                for chunk in iter(lambda: fin.read(CHUNK_SIZE), b""):
+                    decoder.decode(chunk)
+                decoder.decode(b"", final=True)
             except UnicodeDecodeError:
-                pass
+                return None
+        return "utf-8"
+
+    def read_samples(self) -> List[bytes]:
+        """Return the parts of our file that get_encodings decodes."""
+        with open(self.filename, "rb") as fin:
+            if self.size <= SAMPLE_SIZE + OFFSET_SAMPLES * OFFSET_SAMPLE_SIZE:
+                return [fin.read()]
+            samples = [fin.read(SAMPLE_SIZE)]
+            for n in range(1, OFFSET_SAMPLES + 1):
+                offset = SAMPLE_SIZE + (self.size - SAMPLE_SIZE - OFFSET_SAMPLE_SIZE) * n // OFFSET_SAMPLES
+                # Keep two and four byte encodings in step, and read the
+                # last sample to the end of the file.
+                fin.seek(offset - offset % 4)
+                samples.append(fin.read(OFFSET_SAMPLE_SIZE if n < OFFSET_SAMPLES else -1))
+            return samples
+
+    def decode_samples(self, encoding: str, samples: List[bytes]) -> Optional[str]:
+        """Return samples decoded as encoding, or None if they are not in it.
+
+        A character cut in two where a sample starts or ends is not held
+        against the encoding.
+        """
+        texts = []
+        for n, sample in enumerate(samples):
+            for skip in range(1 if n == 0 else 4):
+                try:
+                    texts.append(codecs.getincrementaldecoder(encoding)().decode(sample[skip:], final=n == len(samples) - 1))
+                    break
+                except UnicodeDecodeError:
+                    pass
+            else:
+                return None
+        return "\n...\n".join(texts)
 
-    def get_encodings(self):
-        encs = self.test_all_encodings(self.encodings)
-        if encs:
-            return encs
-        else:
-            return self.test_all_encodings(self.all_encodings)
+    def get_encodings(self) -> Dict[str, str]:
+        """Return a dictionary of the encodings our file might be in,
+        with a sample of it decoded in each.
+
+        Of the encodings that decode our samples differently, we only
+        keep those that give the fewest unprintable characters."""
+        samples = self.read_samples()
+        encs = self.test_all_encodings(self.encodings, samples) or self.test_all_encodings(self.all_encodings, samples)
+        scores = {e: sum(1 for ch in t if not ch.isprintable() and not ch.isspace()) for e, t in encs.items()}
+        return {e: t for e, t in encs.items() if scores[e] == min(scores.values())}
 
-    def test_all_encodings(self, encodings=None):
+    def test_all_encodings(self, encodings=None, samples=None) -> Dict[str, str]:
         """Test all encodings and return a dictionary of possible encodings."""
         if encodings is None:
             encodings = self.all_encodings
+        if samples is None:
+            samples = self.read_samples()
 
         possible_encodings = {}
 
         for e in encodings:
-            try:
-                d = self.txt.decode(e)
-                if d and (d not in possible_encodings.values()):
-                    # if we don't already have this possibility, add
-                    possible_encodings[e] = d
-            except UnicodeDecodeError:
-                pass
+            d = self.decode_samples(e, samples)
+            if d and (d not in possible_encodings.values()):
+                # if we don't already have this possibility, add
+                possible_encodings[e] = d
         return possible_encodings
 
 
 class GetFile(CheckEncoding):
-    """Handed a filename, return a list of lines."""
+    """Handed a filename, choose its encoding and read its lines.
+
+    lines is an iterator over the file's lines, decoded as they are read,
+    or None if the user cancelled. Only the chosen encoding decodes the
+    whole file: any bytes outside our samples that it cannot decode are
+    read as U+FFFD rather than ending the import partway through.
+    """
 
     def __init__(self, filename: str, encodings=None):
         super().__init__(filename, encodings)
-        encs: Dict[str, str] = self.get_encodings()
-        self.lines = None
-
-        if encs:
-            if len(list(encs.keys())) > 1:
+        self.lines: Optional[Iterator[str]] = None
+        self.fin = None
+
+        encoding = self.guess_encoding()
+        if encoding is None:
+            encs = self.get_encodings()
+            if not encs:
+                raise Exception(f"Cannot decode file {filename}")
+            if len(encs) > 1:
+                if not ask_user:
+                    raise EncodingUndecided(filename)
                 encoding = getEncoding(encodings=encs)
             else:
                 encoding = list(encs.keys())[0]
-            if encoding is None:
-                return
-            self.enc = encoding
-            self.lines = encs[self.enc].splitlines()
-            debug(f"reading file {filename} as encoding {self.enc}")
-        else:
-            raise Exception(f"Cannot decode file {filename}")
-
-
-def get_file(filename: str, encodings=None):
+        if encoding is None:
+            return
+        self.enc = encoding
+        self.lines = self.read_lines()
+        debug(f"reading file {filename} as encoding {self.enc}")
+
+    def read_lines(self) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder(self.enc)(errors="replace")
+        rest = ""
+        with open(self.filename, "rb") as self.fin:
+            for chunk in iter(lambda: self.fin.read(CHUNK_SIZE), b""):
+                text = rest + decoder.decode(chunk)
+                # The last line may go on in the next chunk (even if it
+                # only lacks the \n of a \r\n), so we keep it until then.
+                lines = text.splitlines(keepends=True)
+                rest = lines[-1] if lines else ""
+                yield from text[: len(text) - len(rest)].splitlines()
+            yield from (rest + decoder.decode(b"", final=True)).splitlines()
+
+    def tell(self) -> int:
+        """Return how many bytes of our file have been read."""
+        if self.fin is None:
+            return 0
+        if self.fin.closed:
+            return self.size
+        return self.fin.tell()
+
+
+def get_file(filename: str, encodings=None) -> Optional[Iterator[str]]:
     return GetFile(filename, encodings).lines
 
 
@@ -130,8 +130,7 @@ class Converter:
         ## This allows for varied spellings of units to be entered.
         self.create_unit_dict()
         self.add_time_table()
-        self.build_converter_dictionary()
-        self.build_converter_dictionary(self.v2m_table, density=True)
+        self.build_unit_graph()
 
     def add_time_table(self):
         for u, conv in list(self.unit_to_seconds.items()):
@@ -173,58 +172,65 @@ class Converter:
             for v in variations:
                 self.unit_dict[v] = key
 
-    def build_converter_dictionary(self, table=None, density=False):
-        # first, make a list of all units in our dictionaries
-        if not density:
-            convert = self.convert_simple
-        else:
+    def build_unit_graph(self):
+        """Work out how every unit relates to the others.
+
+        Units connected through conv_table form a dimension (mass,
+        volume, time...). We walk each dimension once from its first
+        unit, its base, and store how many base units make up each
+        unit, so that any two units of a dimension convert with a
+        single division. For each pair of a volume and a mass
+        dimension linked by v2m_table, we store how many mass base
+        units one volume base unit weighs at a density of 1.
+        """
+        neighbours = {}
+        for (u1, u2), conv in self.conv_table.items():
+            # 1 u1 == conv u2
+            neighbours.setdefault(u1, []).append((u2, float(conv)))
+            neighbours.setdefault(u2, []).append((u1, 1 / float(conv)))
+        # unit -> (dimension, number of base units in one unit)
+        self.unit_factors = {}
+        # dimension -> units, in the order we reached them
+        self.dimensions = []
+        for base in neighbours:
+            if base in self.unit_factors:
+                continue
+            dimension = len(self.dimensions)
+            self.unit_factors[base] = (dimension, 1.0)
+            units = [base]
+            for u in units:
+                factor = self.unit_factors[u][1]
+                for u2, conv in neighbours[u]:
+                    if u2 not in self.unit_factors:
+                        self.unit_factors[u2] = (dimension, factor / conv)
+                        units.append(u2)
+            self.dimensions.append(units)
+        self.mass_per_volume = {}
+        for (vol, mass), conv in self.v2m_table.items():
+            if vol in self.unit_factors and mass in self.unit_factors:
+                vol_dimension, vol_factor = self.unit_factors[vol]
+                mass_dimension, mass_factor = self.unit_factors[mass]
+                self.mass_per_volume.setdefault((vol_dimension, mass_dimension), conv * mass_factor / vol_factor)
+
+    def convert_by_factors(self, u1, u2):
+        """Return how many u2 there are in a u1, or 0 if they don't convert."""
+        try:
+            dimension1, factor1 = self.unit_factors[u1]
+            dimension2, factor2 = self.unit_factors[u2]
+        except KeyError:
+            return 0
+        if dimension1 == dimension2:
+            return factor1 / factor2
+        return 0
 
-            def convert(u1, u2):
-                # Ignore anything that doesn't need density
-                if self.convert_simple(u1, u2):
-                    return None
-                return self.convert_w_density(u1, u2, density=1)
-
-        units = []
-        if not table:
-            table = self.conv_table
-        # else:
-        # print "We were handed a table: ",table
-        for u1, u2 in [x for x in list(table.keys()) if len(x) == 2]:
-            if u1 not in units:
-                units.append(u1)
-            if u2 not in units:
-                units.append(u2)
-        # print 'done looping through list'
-        for u in units:
-            # print 'grabbing possible conversions for ',u
-            debug("unit=%s" % u)
-            d = self.possible_conversions(u, dict=table)
-            to_expand = list(d.keys())
-            # keep a list of what we've expanded
-            expanded = []
-            while len(to_expand) >= 1:
-                itm = to_expand.pop()
-                if itm not in expanded:
-                    # debug('Expanding %s'%itm)
-                    factor = convert(itm, u)
-                    # debug('There are %s %s in a %s'%(factor,u,itm))
-                    d2 = self.possible_conversions(itm)
-                    if factor:
-                        for k, v in list(d2.items()):
-                            if not convert(u, k):
-                                # debug('and there are %s %s in a %s'%(v,itm,k))
-                                conversion = float(v) * float(factor)
-                                # If we're doing density, we want to
-                                # make sure we always have our tuples
-                                # (volume,density)
-                                if density and itm not in [key[0] for key in list(table.keys())]:
-                                    table[(u, k)] = float(1) / conversion
-                                else:
-                                    table[(k, u)] = conversion
-                            if k not in expanded and k not in to_expand and k != itm and k != u:
-                                to_expand.append(k)
-                    expanded.append(itm)
+    def volume_to_mass(self, u1, u2):
+        """Return how many u2 a u1 of water weighs, or None for other units."""
+        try:
+            dimension1, factor1 = self.unit_factors[u1]
+            dimension2, factor2 = self.unit_factors[u2]
+            return factor1 * self.mass_per_volume[(dimension1, dimension2)] / factor2
+        except KeyError:
+            return None
 
     def convert_simple(self, u1, u2, item=None):
         if u1 == u2:
@@ -236,7 +242,7 @@ class Converter:
             elif (u2, u1) in dict:
                 return float(1) / float(dict[(u2, u1)])
             else:
-                return 0
+                return self.convert_by_factors(u1, u2)
 
     def convert_w_density(self, u1, u2, density=None, item=None):
         if u1 == u2:
@@ -252,8 +258,13 @@ class Converter:
         elif (u2, u1) in self.v2m_table:
             conv = float(1) / float(self.v2m_table[(u2, u1)])
             return conv / density
-        else:
-            return None
+        conv = self.volume_to_mass(u1, u2)
+        if conv:
+            return conv * density
+        conv = self.volume_to_mass(u2, u1)
+        if conv:
+            return 1 / conv / density
+        return None
 
     def list_of_cu_tables(self, dictcu=None):
         if not dictcu:
@@ -285,14 +296,8 @@ class Converter:
 
     def converter(self, u1, u2, item=None, density=None):
         ## Just a front end to convert_fancy that looks up units
-        if u1 in self.unit_dict:
-            unit1 = self.unit_dict[u1]
-        else:
-            unit1 = u1
-        if u2 in self.unit_dict:
-            unit2 = self.unit_dict[u2]
-        else:
-            unit2 = u2
+        unit1 = self.unit_dict.get(u1, u1)
+        unit2 = self.unit_dict.get(u2, u2)
         ## provide some kind of item lookup?
         return self.convert_fancy(unit1, unit2, item=item, density=density)
 
@@ -305,14 +310,13 @@ class Converter:
         return self.convert_w_density(u1, u2, item=item, density=density)
 
     def get_conversions(self, u, item=None, density=None):
-        dct = None
+        ret = self.possible_conversions(u)
         if item or density:
-            dct = self.conv_table.copy()
             if item:
-                dct.update(self.conv_dict_for_item(item))
+                ret.update(self.possible_conversions(u, self.conv_dict_for_item(item)))
             elif density:
-                dct.update(self.conv_dict_for_item(mult=density))
-        return self.possible_conversions(u, dct)
+                ret.update(self.possible_conversions(u, self.conv_dict_for_item(mult=density)))
+        return ret
 
     def get_all_conversions(self, u, item=None, density=None):
         dict = self.get_conversions(u, item, density)
@@ -333,8 +337,11 @@ class Converter:
         """Return a dictionary of everything that unit u can convert to
         The keys are what it can convert to and the values are the conversion
         factor."""
-        if not dict:
-            dict = self.conv_table
+        if not dict or dict is self.conv_table:
+            if u not in self.unit_factors:
+                return {}
+            dimension, factor = self.unit_factors[u]
+            return {u2: self.unit_factors[u2][1] / factor for u2 in self.dimensions[dimension] if u2 != u or (u, u) in self.conv_table}
         ret = {}
         entries = list(dict.items())
         for item in entries:
@@ -28,6 +28,10 @@ class exporter(SuspendableThread, Pluggable):
 
     name = "exporter"
     ALLOW_PLUGINS_TO_WRITE_NEW_FIELDS = True
+    # Ingredients and categories by recipe ID, when ExporterMultirec
+    # has fetched them for a batch of recipes at once.
+    batch_ings = {}
+    batch_cats = {}
 
     def __init__(
         self,
@@ -83,8 +87,9 @@ class exporter(SuspendableThread, Pluggable):
         self.write_head()
         for task in self.order:
             if task == "image":
-                if self._grab_attr_(self.r, "image"):
-                    self.write_image(self.r.image)
+                image = self.rd.get_image(self.r)
+                if image:
+                    self.write_image(image)
             if task == "attr":
                 self._write_attrs_()
 
@@ -173,7 +178,10 @@ class exporter(SuspendableThread, Pluggable):
     @pluggable_method
     def _write_ings_(self):
         """Write all of our ingredients."""
-        ingredients = self.rd.get_ings(self.r)
+        if self.r.id in self.batch_ings:
+            ingredients = self.batch_ings[self.r.id]
+        else:
+            ingredients = self.rd.get_ings(self.r)
         if not ingredients:
             return
         self.write_inghead()
@@ -199,6 +207,8 @@ class exporter(SuspendableThread, Pluggable):
         # they were a single attribute even though we in fact allow
         # multiple categories.
         if attr == "category":
+            if obj.id in self.batch_cats:
+                return ", ".join(self.batch_cats[obj.id])
             return ", ".join(self.rd.get_cats(obj))
         try:
             ret = getattr(obj, attr)
@@ -485,6 +495,11 @@ class exporter_mult(exporter):
 class ExporterMultirec(SuspendableThread, Pluggable):
 
     name = "Exporter"
+    # How many recipes' ingredients and categories we fetch at once, and
+    # those of the batch we're exporting, by recipe ID.
+    batch_size = 100
+    batch_ings = {}
+    batch_cats = {}
 
     def __init__(
         self, rd, recipes, out, one_file=True, create_file=True, ext="txt", conv=None, imgcount=1, exporter=exporter, exporter_kwargs={}, padding=None
@@ -523,6 +538,8 @@ class ExporterMultirec(SuspendableThread, Pluggable):
 
     def _grab_attr_(self, obj, attr):
         if attr == "category":
+            if obj.id in self.batch_cats:
+                return ", ".join(self.batch_cats[obj.id])
             return ", ".join(self.rd.get_cats(obj))
         try:
             ret = getattr(obj, attr)
@@ -544,12 +561,7 @@ class ExporterMultirec(SuspendableThread, Pluggable):
             return ret
 
     def append_referenced_recipes(self):
-        for r in self.recipes[:]:
-            reffed = self.rd.db.execute("select * from ingredients where recipe_id=%s and refid is not null" % r.id)
-            for ref in reffed:
-                rec = self.rd.get_rec(ref.refid)
-                if rec is not None and rec not in self.recipes:
-                    self.recipes.append(rec)
+        self.rd.include_linked_recipes(self.recipes)
 
     @pluggable_method
     def do_run(self):
@@ -574,7 +586,11 @@ class ExporterMultirec(SuspendableThread, Pluggable):
         self.terminated = False
         first = True
         self.append_referenced_recipes()
-        for r in self.recipes:
+        for n, r in enumerate(self.recipes):
+            if n % self.batch_size == 0:
+                batch = [rec.id for rec in self.recipes[n : n + self.batch_size]]
+                self.batch_ings = self.rd.get_ings_many(batch)
+                self.batch_cats = self.rd.get_cats_many(batch)
             self.check_for_sleep()
             msg = _("Exported %(number)s of %(total)s recipes") % {"number": self.rcount, "total": self.rlen}
             self.emit("progress", float(self.rcount) / float(self.rlen), msg)
@@ -585,6 +601,7 @@ class ExporterMultirec(SuspendableThread, Pluggable):
             if self.padding and not first:
                 self.ofi.write(self.padding)
             e = self.exporter(out=self.ofi, r=r, rd=self.rd, **self.exporter_kwargs)
+            e.batch_ings, e.batch_cats = self.batch_ings, self.batch_cats
             self.connect_subthread(e)
             e.do_run()
             self.recipe_hook(r, fn, e)
@@ -1,5 +1,6 @@
 import xml.dom
-from typing import List, Optional
+from typing import Iterable, List, Optional
+from xml.sax.saxutils import XMLGenerator, escape
 
 from .exporter import exporter_mult
 
@@ -60,3 +61,95 @@ class XmlExporter(exporter_mult):
         for k, v in list(attdic.items()):
             self.set_attribute(element, k, str(v))
         return element
+
+
+class XmlWriter:
+    """Write an XML document one element at a time.
+
+    Elements go straight to out as they are written, laid out the way
+    minidom's writexml(addindent="\t", newl="\n") lays out a
+    document, so nothing but the currently open elements is kept in
+    memory.
+    """
+
+    def __init__(self, out, encoding="UTF-8", indent="\t", newl="\n"):
+        self.generator = XMLGenerator(out, encoding)
+        self.indent = indent
+        self.newl = newl
+        self.open_elements = []
+
+    def start_document(self, doc_element, attrs={}):
+        self.generator.startDocument()
+        self.write_raw("<!DOCTYPE %s>%s" % (doc_element, self.newl))
+        self.start_element(doc_element, attrs)
+
+    def end_document(self):
+        while self.open_elements:
+            self.end_element()
+        self.generator.endDocument()
+
+    def write_raw(self, data):
+        # ignorableWhitespace writes its argument unescaped.
+        self.generator.ignorableWhitespace(data)
+
+    def _start(self, element_name, attrs):
+        self.write_raw(self.indent * len(self.open_elements))
+        self.generator.startElement(element_name, {k: str(v) for k, v in attrs.items()})
+
+    def start_element(self, element_name, attrs={}):
+        self._start(element_name, attrs)
+        self.write_raw(self.newl)
+        self.open_elements.append(element_name)
+
+    def end_element(self):
+        element_name = self.open_elements.pop()
+        self.write_raw(self.indent * len(self.open_elements))
+        self.generator.endElement(element_name)
+        self.write_raw(self.newl)
+
+    def text_element(self, element_name, text, attrs={}):
+        if not isinstance(text, str):
+            raise TypeError("%r is not a StringType" % text)
+        self._start(element_name, attrs)
+        # Quote quotes too, as minidom does.
+        self.write_raw(escape(text, {'"': "&quot;"}))
+        self.generator.endElement(element_name)
+        self.write_raw(self.newl)
+
+    def cdata_element(self, element_name, chunks: Iterable[str], attrs={}):
+        """Write an element whose content is the CDATA section made of chunks."""
+        self._start(element_name, attrs)
+        self.write_raw("<![CDATA[")
+        for chunk in chunks:
+            self.write_raw(chunk)
+        self.write_raw("]]>")
+        self.generator.endElement(element_name)
+        self.write_raw(self.newl)
+
+
+class XmlStreamExporter(exporter_mult):
+    """Base class for XML exporters that write through an XmlWriter.
+
+    Exporters handed an xml_writer add their elements to the document
+    it is writing; otherwise they write a document of their own to out.
+    """
+
+    # doc_element = 'rec'
+
+    def __init__(self, rd, r, out, order: Optional[List[str]] = None, xml_writer=None, **kwargs):
+        order = order or ["attr", "image", "ings", "text"]
+        if xml_writer:
+            self.writer = xml_writer
+            self.i_created_this_document = False
+        else:
+            self.writer = XmlWriter(out)
+            self.i_created_this_document = True
+        exporter_mult.__init__(self, rd, r, out, use_ml=True, convert_attnames=False, do_markup=True, order=order, **kwargs)
+
+    def write_head(self):
+        if self.i_created_this_document:
+            self.writer.start_document(self.doc_element)
+
+    def write_foot(self):
+        if self.i_created_this_document:
+            self.writer.end_document()
@@ -314,6 +314,16 @@ class ColumnSortSetterUpper:
 
 
 class PageableViewStore(PageableListStore):
+    """A PageableListStore showing rows from a view of the database.
+
+    The view can be a list of rows, or a lazy sequence such as
+    backends.db.RecipeResults which only queries the database for the
+    slices we ask for -- one page at a time.
+
+    Sorting doesn't touch the view: we emit "view-sort" with our sort
+    terms, and whoever handed us the view is expected to re-query it
+    in that order and hand us the result via change_view.
+    """
 
     __gsignals__ = {
         "view-changed": (GObject.SignalFlags.RUN_LAST, None, ()),
@@ -1,10 +1,12 @@
+import hashlib
 import io
-from collections import defaultdict
+import os
+from collections import OrderedDict
 from enum import Enum
 from pathlib import Path
 from pkgutil import get_data
-from threading import Event, Thread
-from typing import Dict, List, Optional
+from threading import Event, Lock, Thread
+from typing import Dict, Hashable, List, Optional, Tuple, Union
 from urllib.parse import unquote, urlparse
 
 import requests
@@ -15,6 +17,8 @@ from requests.exceptions import ConnectionError
 
 MAX_THUMBSIZE = 10000000  # The maximum size, in bytes, of thumbnails we allow
 HEADERS = {"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:86.0) Gecko/20100101 Firefox/86.0"}
+IMAGE_CACHE_SIZE = 64 * 2**20  # The memory, in bytes, decoded images may take up in image_cache
+THUMBNAIL_CACHE_SIZE = 64 * 2**20  # The disk space, in bytes, thumbnails may take up in image_cache.directory
 
 
 class ThumbnailSize(Enum):
@@ -22,27 +26,139 @@ class ThumbnailSize(Enum):
     LARGE = (256, 256)
 
 
-def cached(func):
-    """A decorator to keep previously created thumbnails.
+class ImageCache:
+    """A least recently used cache of decoded images, bounded by memory.
 
-    This may be memory intensive. If it impedes usability, due to increased
-    memory usage, it should be removed.
-    """
-    thumbnails: Dict[str, Dict[ThumbnailSize, Image.Image]] = defaultdict(dict)
+    Entries are keyed by the hash of the image data they were decoded
+    from, so when a recipe's image changes, the new image simply misses
+    the cache and the old one is eventually evicted.
 
-    def wrapper(path, size=ThumbnailSize.LARGE):
-        if path in thumbnails and size in thumbnails[path]:
-            return thumbnails[path][size]
+    If directory is set, thumbnails are also kept there as PNG files,
+    named after the same hash, so they survive between sessions. The
+    least recently used files are removed once they take up more than
+    max_disk_bytes.
 
-        image = func(path, size)
+    The cache is shared by the main loop and the ImageBrowser thread, so
+    its entries are only touched with lock held.
+    """
 
-        thumbnails[path][size] = image
+    def __init__(self, max_bytes: int = IMAGE_CACHE_SIZE, directory: Optional[Path] = None, max_disk_bytes: int = THUMBNAIL_CACHE_SIZE):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.lock = Lock()
+        self.entries: "OrderedDict[Hashable, Tuple[object, int]]" = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+
+    def get(self, key: Hashable):
+        """Return the value cached for key, or None."""
+        with self.lock:
+            try:
+                value, _ = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value, nbytes: int):
+        """Cache value, which takes up nbytes, evicting the least recently used entries to make room."""
+        with self.lock:
+            if key in self.entries:
+                self.nbytes -= self.entries.pop(key)[1]
+            if nbytes > self.max_bytes:
+                return
+            self.entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_bytes) = self.entries.popitem(last=False)
+                self.nbytes -= evicted_bytes
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_hits": self.disk_hits,
+            "entries": len(self.entries),
+            "bytes": self.nbytes,
+        }
+
+    def _thumbnail_path(self, digest: str, size: Tuple[int, int]) -> Path:
+        return self.directory / ("%s-%sx%s.png" % (digest, *size))
+
+    def load_thumbnail(self, digest: str, size: Tuple[int, int]) -> Optional[Image.Image]:
+        """Return the thumbnail kept on disk for digest and size, if any."""
+        if self.directory is None:
+            return None
+        path = self._thumbnail_path(digest, size)
+        try:
+            image = Image.open(path)
+            image.load()
+            # Mark the file as recently used, so prune_thumbnails keeps it.
+            os.utime(path)
+        except (OSError, UnidentifiedImageError, ValueError):
+            return None
+        self.disk_hits += 1
         return image
 
-    return wrapper
+    def save_thumbnail(self, digest: str, size: Tuple[int, int], image: Image.Image):
+        if self.directory is None:
+            return
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            image.save(self._thumbnail_path(digest, size), "png")
+            self.prune_thumbnails()
+        except (OSError, ValueError):
+            # The disk cache is only an optimization.
+            pass
+
+    def prune_thumbnails(self):
+        """Remove the least recently used thumbnails until they fit in max_disk_bytes."""
+        files = []
+        for path in self.directory.glob("*.png"):
+            try:
+                stat = path.stat()
+            except OSError:
+                # Removed by another thread or session meanwhile.
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        nbytes = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files, key=lambda f: f[0]):
+            if nbytes <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            nbytes -= size
+
+
+image_cache = ImageCache()
+
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()
+
+
+def image_nbytes(image: Union[Image.Image, Pixbuf]) -> int:
+    """Return roughly how much memory the pixels of image take up."""
+    if isinstance(image, Image.Image):
+        return image.width * image.height * len(image.getbands())
+    return image.get_byte_length()
 
 
-@cached
 def make_thumbnail(path: str, size=ThumbnailSize.LARGE) -> Optional[Image.Image]:
     """Create an in-memory thumbnail from the given uri path.
 
@@ -52,38 +168,76 @@ def make_thumbnail(path: str, size=ThumbnailSize.LARGE) -> Optional[Image.Image]
 
     The provided `path` is a str, provided by a Gtk.FileChooserDialog. As such,
     it is first converted to a Path object.
+
+    Thumbnails are kept in image_cache: the image returned may be shared,
+    and should not be modified. Those of local files are keyed by their
+    content, those of web images by their URL, so that they are only
+    downloaded once.
     """
 
     if path.startswith("http"):
-        try:
-            response = requests.get(path, headers=HEADERS)
-        except ConnectionError:
-            return
-        path = io.BytesIO(response.content)
+        raw = None
+        digest = content_hash(path.encode())
 
     else:
         path = Path(urlparse(unquote(path)).path)
         if not path.is_file():
             return
-    try:
-        image = Image.open(path)
-    except (UnidentifiedImageError, ValueError):
-        return
-
-    image.thumbnail(size.value)
+        raw = path.read_bytes()
+        digest = content_hash(raw)
+
+    key = ("thumbnail", digest, size.value)
+    image = image_cache.get(key)
+    if image is None:
+        image = image_cache.load_thumbnail(digest, size.value)
+        if image is None:
+            if raw is None:
+                try:
+                    response = requests.get(path, headers=HEADERS)
+                except ConnectionError:
+                    return
+                raw = response.content
+            try:
+                image = Image.open(io.BytesIO(raw))
+                image.thumbnail(size.value)
+            except (UnidentifiedImageError, ValueError):
+                return
+            image_cache.save_thumbnail(digest, size.value, image)
+        image_cache.put(key, image, image_nbytes(image))
     return image
 
 
 def bytes_to_pixbuf(raw: bytes) -> Pixbuf:
-    glib_bytes = GLib.Bytes.new(raw)
-    stream = Gio.MemoryInputStream.new_from_bytes(glib_bytes)
-    return Pixbuf.new_from_stream(stream)
+    """Return raw decoded as a Pixbuf.
+
+    Pixbufs are kept in image_cache, so the same image is only decoded
+    once: the pixbuf returned may be shared, and should not be modified.
+    """
+    key = ("pixbuf", content_hash(raw))
+    pixbuf = image_cache.get(key)
+    if pixbuf is None:
+        glib_bytes = GLib.Bytes.new(raw)
+        stream = Gio.MemoryInputStream.new_from_bytes(glib_bytes)
+        pixbuf = Pixbuf.new_from_stream(stream)
+        image_cache.put(key, pixbuf, image_nbytes(pixbuf))
+    return pixbuf
 
 
 def bytes_to_image(raw: bytes) -> Image.Image:
-    sfi = io.BytesIO(raw)
-    sfi.seek(0)
-    return Image.open(sfi)
+    """Return raw decoded as a PIL image.
+
+    Decoded images are kept in image_cache; callers get a copy of their
+    own, which they may modify.
+    """
+    key = ("image", content_hash(raw))
+    image = image_cache.get(key)
+    if image is None:
+        sfi = io.BytesIO(raw)
+        sfi.seek(0)
+        image = Image.open(sfi)
+        image.load()
+        image_cache.put(key, image, image_nbytes(image))
+    return image.copy()
 
 
 def image_to_bytes(image: Image.Image) -> bytes:
@@ -93,6 +247,13 @@ def image_to_bytes(image: Image.Image) -> bytes:
     return ofi.getvalue()
 
 
+def thumbnail_from_bytes(raw: bytes, size: Tuple[int, int]) -> bytes:
+    """Return the image in raw scaled down to fit within size, as jpeg data."""
+    image = bytes_to_image(raw)
+    image.thumbnail(size)
+    return image_to_bytes(image)
+
+
 def load_pixbuf_from_resource(resource_name: str) -> Pixbuf:
     data = get_data("gourmand", f"data/images/{resource_name}")
     assert data
@@ -1,3 +1,4 @@
+import os
 from fnmatch import fnmatch
 from typing import Any, List, Optional, Tuple
 from urllib.parse import urlparse
@@ -8,8 +9,10 @@ import gourmand.gtk_extras.dialog_extras as de
 import gourmand.plugin_loader as plugin_loader
 from gourmand.i18n import _
 from gourmand.importers.interactive_importer import import_interactivally
+from gourmand.importers.parallel_importer import ParallelImporter
 from gourmand.importers.web_importer import import_urls, supported_sites
 from gourmand.plugin import ImporterPlugin, ImportManagerPlugin
+from gourmand.prefs import Prefs
 from gourmand.threadManager import NotThreadSafe, get_thread_manager, get_thread_manager_gui
 
 
@@ -76,16 +79,31 @@ class ImportManager(plugin_loader.Pluggable):
             if unsupported:
                 import_interactivally(unsupported)
         else:
-            self.import_filenames(uris)
+            self.import_filenames(uris, workers=Prefs.instance().get("import_workers", os.cpu_count() or 1))
 
         self.app.redo_search()  # Trigger a refresh of the recipe tree
 
-    def import_filenames(self, filenames: List[str]) -> List[Any]:
+    def import_filenames(self, filenames: List[str], workers: int = 1) -> List[Any]:
         """Import list of filenames, filenames, based on our currently
         registered plugins.
 
+        With more than one worker and more than one file, the files are
+        parsed in that many processes at once by a ParallelImporter.
+
         Return a list of importers (mostly useful for testing purposes)
         """
+        importers = self.get_plugins_for_filenames(filenames)
+        if workers > 1 and len(importers) > 1:
+            return [self.import_in_parallel(importers, workers)]
+        ret_importers = []  # a list of importer instances to return
+        for fn, importer_plugin in importers:
+            print("Doing import for ", fn, importer_plugin)
+            ret_importers.append(self.do_import(importer_plugin, "get_importer", fn))
+        print("import_filenames returns", ret_importers)
+        return ret_importers
+
+    def get_plugins_for_filenames(self, filenames: List[str]) -> List[Tuple[str, Any]]:
+        """Return a list of (filename, importer plugin) for those of filenames we can import."""
         importers = []
         while filenames:
             fn = filenames.pop()
@@ -110,12 +128,15 @@ class ImportManager(plugin_loader.Pluggable):
                     importers.append((fn, fallback))
                 else:
                     print("Warning, no plugin found for file ", fn)
-        ret_importers = []  # a list of importer instances to return
-        for fn, importer_plugin in importers:
-            print("Doing import for ", fn, importer_plugin)
-            ret_importers.append(self.do_import(importer_plugin, "get_importer", fn))
-        print("import_filenames returns", ret_importers)
-        return ret_importers
+        return importers
+
+    def import_in_parallel(self, importers: List[Tuple[str, Any]], workers: int) -> ParallelImporter:
+        importer = ParallelImporter(importers, workers, self.get_plugins_for_filenames)
+        self.setup_notification_message(importer)
+        self.setup_thread(importer, _("Import") + " (" + _("%s files") % len(importers) + ")")
+        # Then whatever needs the user, the usual way.
+        importer.connect("completed", lambda *args: self.import_filenames(importer.files_to_ask))
+        return importer
 
     def do_import(self, importer_plugin: Any, method: str, *method_args: Tuple[str]):
         try:
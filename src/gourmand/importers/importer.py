@@ -8,10 +8,13 @@ import gourmand.gtk_extras.dialog_extras as de
 from gourmand import convert, image_utils
 from gourmand.gdebug import TimeAction, debug, print_timer_info
 from gourmand.i18n import _
-from gourmand.keymanager import KeyManager
 from gourmand.recipeManager import get_recipe_manager
 from gourmand.threadManager import SuspendableThread, Terminated
 
+# In an import worker process, the recipe manager our importers use in
+# place of the database (see parallel_importer).
+worker_recipe_manager = None
+
 # Convenience functions
 
 
@@ -39,7 +42,18 @@ class Importer(SuspendableThread):
     """Base class for all importers. We provide an interface to the recipe database
     for importers to use. Basically, the importer builds up a dictionary of properties inside of
     self.rec and then commits that dictionary with commit_rec(). Similarly, ingredients are built
-    as self.ing and then committed with commit_ing()."""
+    as self.ing and then committed with commit_ing().
+
+    Committed recipes are written to the database batch_size at a time
+    (see flush_recs), and only then show up in added_recs.
+
+    parse() instead runs the importer without writing anything, so that
+    it can be run in another process (see parallel_importer)."""
+
+    batch_size = 500
+    # True while parse() runs: flush_recs then collects our recipes in
+    # parsed_recs rather than writing them.
+    parsing = False
 
     def __init__(self, rd=None, total=0, prog=None, do_markup=True, conv=None, rating_converter=None, name="importer"):  # OBSOLETE  # OBSOLETE
         """rd is our recipeData instance.
@@ -55,6 +69,10 @@ class Importer(SuspendableThread):
         if not conv:
             self.conv = convert.get_converter()
         self.id_converter = {}  # a dictionary for tracking named IDs
+        # new_id hands out local IDs, which flush_recs swaps for real
+        # ones, remembered here for recipes still to come.
+        self.last_local_id = 0
+        self.real_ids = {}
         self.total = total
         if prog or rd:
             import traceback
@@ -66,10 +84,16 @@ class Importer(SuspendableThread):
                 print("WARNING: ", self, "handed obsolete parameter rd=", rd)
         self.do_markup = do_markup
         self.count = 0
-        self.rd = get_recipe_manager()
+        if worker_recipe_manager is None:
+            self.rd = get_recipe_manager()
+        else:
+            self.rd = worker_recipe_manager
         self.rd_orig_ing_hooks = self.rd.add_ing_hooks
         self.added_recs = []
         self.added_ings = []
+        # Committed recipes not yet in the database, with their
+        # unconverted ratings.
+        self.pending_recs = []
         # self.rd_orig_hooks = self.rd.add_hooks
         self.rd.add_ing_hooks = []
         # self.rd.add_hooks = []
@@ -89,13 +113,25 @@ class Importer(SuspendableThread):
         else:
             self.rating_converter = RatingConverter()
             self.do_conversion = True
-        self.km = KeyManager.instance()
+        self.km = self.rd.km
         timeaction.end()
         SuspendableThread.__init__(self, name=name)
 
     # end __init__
 
+    def run(self):
+        # Only our own connections get the bulk profile, so the rest
+        # of the application is unaffected.
+        with self.rd.use_sqlite_profile("bulk"):
+            SuspendableThread.run(self)
+
+    def end_run(self):
+        # Recipes committed before we were terminated, or before an
+        # error, are imported all the same.
+        self.flush_recs()
+
     def do_run(self):
+        self.flush_recs()
         debug("Running ing hooks", 0)
         for i in self.added_ings:
             for h in self.rd_orig_ing_hooks:
@@ -108,7 +144,63 @@ class Importer(SuspendableThread):
         # self.rd.add_hooks = self.rd_orig_hooks
         # print_timer_info()
 
+    def start_parsing(self):
+        self.parsing = True
+        self.parsed_recs = []
+
+    def parse(self):
+        """Import our file without touching the database, yielding
+        (recdict, ingdicts) for each recipe.
+
+        Recipe IDs and ingredient refids are local IDs from our new_id,
+        for the caller to swap for ones from its own. Ratings we could
+        not convert are left as they were found.
+        """
+        self.start_parsing()
+        if hasattr(self, "pre_run"):
+            self.pre_run()
+        self.do_run()
+        self.flush_recs()
+        for rec, rating in self.parsed_recs:
+            if rating:
+                rec["rating"] = rating
+            yield rec, rec.pop("ingredients")
+
+    def new_id(self):
+        """Return a local ID for a recipe we are yet to write.
+
+        Local IDs are negative numbers, which flush_recs swaps for real
+        ones when the recipe, or the recipes referring to it, are
+        written.
+        """
+        self.last_local_id -= 1
+        return self.last_local_id
+
+    def swap_local_ids(self, recs):
+        """Swap the local IDs in recs, and in their ingredients' refids,
+        for real ones.
+
+        IDs that ingredients refer to are reserved all at once. Other
+        recipes are left without an ID, for add_recs_bulk to give them
+        one. Returns the local ID each recipe had, or None.
+        """
+        refids = [i["refid"] for rec in recs for i in rec["ingredients"] if i.get("refid")]
+        missing = [rid for rid in dict.fromkeys(refids) if rid not in self.real_ids]
+        if missing:
+            self.real_ids.update(zip(missing, self.rd.reserve_ids(len(missing))))
+        local_ids = []
+        for rec in recs:
+            local_id = rec.pop("id", None)
+            local_ids.append(local_id)
+            if local_id in self.real_ids:
+                rec["id"] = self.real_ids[local_id]
+            for i in rec["ingredients"]:
+                if i.get("refid"):
+                    i["refid"] = self.real_ids[i["refid"]]
+        return local_ids
+
     def _run_cleanup_(self):
+        self.flush_recs()
         if self.do_conversion:
             # if we have something to convert
             if self.rating_converter.to_convert:
@@ -226,41 +318,52 @@ class Importer(SuspendableThread):
                     print('Deleting "image"')
                     del self.rec["image"]
                     del self.rec["thumb"]
-        ## if we have an ID, we need to remember it for the converter
-        if "id" in self.rec:
-            id_to_convert = self.rec["id"]
-        else:
-            id_to_convert = None
-        if id_to_convert:
-            if self.rec["id"] in self.id_converter:
-                self.rec["id"] = self.id_converter[self.rec["id"]]
-                r = self.rd.add_rec(self.rec)  # See doc on add_rec
-            else:
-                del self.rec["id"]
-                r = self.rd.add_rec(self.rec)
-                self.id_converter[id_to_convert] = r.id
+        ## if we have an ID, we need to remember it for the converter.
+        ## The recipe isn't written until later: other recipes refer
+        ## to it by its local ID until then.
+        if self.rec.get("id"):
+            if self.rec["id"] not in self.id_converter:
+                self.id_converter[self.rec["id"]] = self.new_id()
+            self.rec["id"] = self.id_converter[self.rec["id"]]
         else:
-            r = self.rd.add_rec(self.rec)
-        # Add ingredients...
+            self.rec.pop("id", None)
         for i in self.added_ings:
             if "id" in i:
                 print("WARNING: Ingredient has ID set -- ignoring value")
                 del i["id"]
-            i["recipe_id"] = r.id
-        self.rd.add_ings(self.added_ings)
+        self.rec["ingredients"] = self.added_ings
         self.added_ings = []
-        # Update hash-keys...
-        self.rd.update_hashes(r)
+        self.pending_recs.append((self.rec, remembered_rating))
+        if len(self.pending_recs) >= self.batch_size:
+            self.flush_recs()
         tt.end()
-        self.added_recs.append(r)
-        if remembered_rating:
-            self.rating_converter.add(r.id, remembered_rating)
         self.check_for_sleep()
         timeaction.end()
         self.rec_timer.end()
         self.count += 1
         if self.total:
             self.emit("progress", float(self.count) / self.total, _("Imported %s of %s recipes.") % (self.count, self.total))
+
+    def flush_recs(self):
+        """Write the recipes committed since the last flush to the database."""
+        if not self.pending_recs:
+            return
+        if self.parsing:
+            self.parsed_recs.extend(self.pending_recs)
+            self.pending_recs = []
+            return
+        recs = [rec for rec, rating in self.pending_recs]
+        local_ids = self.swap_local_ids(recs)
+        ids = self.rd.add_recs_bulk(recs)
+        for rid, local_id, (rec, rating) in zip(ids, local_ids, self.pending_recs):
+            if local_id:
+                self.real_ids[local_id] = rid
+            if rating:
+                self.rating_converter.add(rid, rating)
+        self.pending_recs = []
+        recs = {r.id: r for r in self.rd.fetch_all(self.rd.recipe_table, id=("in", ids))}
+        self.added_recs.extend(recs[rid] for rid in ids)
+
     def parse_yields(self, str):
         """Parse number and field."""
         m = re.match(r"(?P<prefix>^\D*\s?)?(?P<num>[0-9/. ]+)(?P<unit>\s*\w+)?", str)
@@ -363,7 +466,7 @@ class Importer(SuspendableThread):
     def add_ref(self, id):
         timeaction = TimeAction("importer.add_ref", 10)
         if id not in self.id_converter:
-            self.id_converter[id] = self.rd.new_id()
+            self.id_converter[id] = self.new_id()
         self.ing["refid"] = self.id_converter[id]
         self.ing["unit"] = "recipe"
         timeaction.end()
@@ -519,11 +622,12 @@ class RatingConverter:
     def do_conversions(self, db):
         if not self.got_conversions:
             self.get_conversions()
-        for id, rating in list(self.to_convert.items()):
-            try:
-                if rating not in self.conversions and hasattr(rating, "lower") and rating.lower() in self.conversions:
-                    rating = rating.lower()
-                db.modify_rec(db.get_rec(id), {"rating": self.conversions[rating]})
-            except:
-                print("wtf... problem with rating ", rating, "for recipe", id)
-                raise
+        with db.transaction():
+            for id, rating in list(self.to_convert.items()):
+                try:
+                    if rating not in self.conversions and hasattr(rating, "lower") and rating.lower() in self.conversions:
+                        rating = rating.lower()
+                    db.modify_rec(db.get_rec(id), {"rating": self.conversions[rating]})
+                except:
+                    print("wtf... problem with rating ", rating, "for recipe", id)
+                    raise
@@ -52,6 +52,9 @@ UI_TAG_ORDER = [
 class ConvenientImporter(importer.Importer):
     """Add some convenience methods to our standard importer."""
 
+    # Recipes are imported one at a time, and used straight away.
+    batch_size = 1
+
     def add_attribute(self, attname, txt):
         txt = txt.strip()
         if attname in self.rec:
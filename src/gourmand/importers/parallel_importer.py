@@ -0,0 +1,158 @@
+import multiprocessing
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Callable, List, Tuple
+
+from gourmand import check_encodings
+from gourmand.backends.db import RecipeManager
+from gourmand.i18n import _
+from gourmand.keymanager import KeyManager
+from gourmand.threadManager import NotThreadSafe, Terminated
+
+from . import importer
+
+# What parse_file hands back, along with...
+RECIPES = 0  # [(recdict, ingdicts), ...]
+FILES = 1  # [filename, ...] found in an archive, to import in turn
+ASK = 2  # [filename] needing the user, to import the usual way
+
+
+class WorkerRecipeManager(RecipeManager):
+    """The recipe manager importers get in a worker process.
+
+    It parses ingredients as a RecipeManager does, but has no database:
+    ingredients are keyed from, and units checked against, what the
+    importing process handed us when the worker started.
+    """
+
+    def __init__(self, key_index: tuple, units: List[str]):
+        self.rd = None
+        self.km = KeyManager.from_index(key_index)
+        self.units = set(units)
+        self.add_ing_hooks = []
+
+    def unit_was_used(self, unit: str) -> bool:
+        return unit in self.units
+
+
+def start_worker(key_index: tuple, units: List[str]):
+    # There is no one in a worker process to ask anything.
+    check_encodings.ask_user = False
+    importer.worker_recipe_manager = WorkerRecipeManager(key_index, units)
+
+
+def parse_file(plugin_class: type, filename: str) -> Tuple[int, List[Any]]:
+    """Parse filename with a new plugin_class, in a worker process.
+
+    Return (kind, result), kind being one of RECIPES, FILES or ASK.
+    Importers get a WorkerRecipeManager, so nothing we do here touches
+    the database.
+    """
+    from .importManager import ImportFileList
+
+    try:
+        file_importer = plugin_class().get_importer(filename)
+    except ImportFileList as ifl:
+        return FILES, ifl.filelist
+    if isinstance(file_importer, NotThreadSafe):
+        return ASK, [filename]
+    try:
+        return RECIPES, list(file_importer.parse())
+    except check_encodings.EncodingUndecided:
+        return ASK, [filename]
+
+
+class ParallelImporter(importer.Importer):
+    """Import many files at once, parsing them in worker processes.
+
+    Each file is parsed in a worker by its importer's parse(), which
+    touches nothing but the file. Workers key ingredients from a copy
+    of our key index, taken as the import starts. We are the only
+    process with the database open: we take each file's recipes as its
+    worker finishes and write them batch_size at a time, when
+    flush_recs gives them real IDs.
+
+    Files whose import would mean asking the user something are left
+    in files_to_ask, for our caller to import once we are done. While
+    we are suspended, workers finish the files they are on and wait.
+    """
+
+    def __init__(self, files: List[Tuple[str, Any]], workers: int, find_plugins: Callable, name="Parallel Importer"):
+        """files is a list of (filename, importer plugin).
+
+        find_plugins is handed a list of filenames from an archive and
+        returns them as such a list.
+        """
+        self.files = files
+        self.workers = workers
+        self.find_plugins = find_plugins
+        self.files_to_ask = []
+        self.failed_files = []
+        importer.Importer.__init__(self, name=name)
+
+    def do_run(self):
+        # Forking would hand our database connections to the workers.
+        context = multiprocessing.get_context("spawn")
+        initargs = (self.km.get_index(), self.rd.get_unique_values("unit", self.rd.ingredients_table))
+        with ProcessPoolExecutor(min(self.workers, len(self.files)), mp_context=context, initializer=start_worker, initargs=initargs) as executor:
+            pending = {executor.submit(parse_file, type(plugin), fn): fn for fn, plugin in self.files}
+            total, done = len(pending), 0
+            try:
+                while pending:
+                    finished, unfinished = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+                    self.check_for_sleep()
+                    for future in finished:
+                        fn = pending.pop(future)
+                        try:
+                            kind, result = future.result()
+                        except Exception:
+                            print("Error importing", fn)
+                            traceback.print_exc()
+                            self.failed_files.append(fn)
+                            kind, result = None, None
+                        if kind == RECIPES:
+                            self.add_parsed_recs(result)
+                        elif kind == FILES:
+                            for archived_fn, plugin in self.find_plugins(result):
+                                pending[executor.submit(parse_file, type(plugin), archived_fn)] = archived_fn
+                                total += 1
+                        elif kind == ASK:
+                            self.files_to_ask.extend(result)
+                        done += 1
+                        self.emit("progress", float(done) / total, _("Imported %s recipes from %s of %s files.") % (self.count, done, total))
+            except Terminated:
+                # Rather than shutdown(cancel_futures=True), which
+                # Python 3.8 lacks.
+                for future in pending:
+                    future.cancel()
+                executor.shutdown(wait=False)
+                raise
+        importer.Importer.do_run(self)
+        self._run_cleanup_()
+
+    def add_parsed_recs(self, recs):
+        """Commit recipes from parse(), swapping their file's local IDs for ours."""
+        ids = {}
+
+        def local_id(file_id):
+            if file_id not in ids:
+                ids[file_id] = self.new_id()
+            return ids[file_id]
+
+        for rec, ings in recs:
+            self.check_for_sleep()
+            if rec.get("id"):
+                rec["id"] = local_id(rec["id"])
+            for i in ings:
+                if i.get("refid"):
+                    i["refid"] = local_id(i["refid"])
+            rating = rec.get("rating")
+            if isinstance(rating, (int, float)):
+                rating = None
+            else:
+                rec.pop("rating", None)
+            rec["ingredients"] = ings
+            self.pending_recs.append((rec, rating))
+            if len(self.pending_recs) >= self.batch_size:
+                self.flush_recs()
+            self.count += 1
@@ -25,23 +25,18 @@ class TextImporter(importer.Importer):
         importer.Importer.__init__(self, conv=conv)
 
     def pre_run(self):
-        self.lines = check_encodings.get_file(self.fn)
-
-        if self.lines is None:
-            return  # The operation has been cancelled
-
-        self.total_lines = len(self.lines)
-        print("we have ", self.total_lines, "lines in file", self.fn)
+        # Our lines are read from the file as we go through them.
+        self.file = check_encodings.GetFile(self.fn)
+        self.lines = self.file.lines
 
     def do_run(self):
         if self.lines is None:
-            return
+            return  # The operation has been cancelled
 
-        for n in range(self.total_lines):
-            line = self.lines[n]
+        for n, line in enumerate(self.lines):
             if n % 15 == 0:
-                prog = float(n) / float(self.total_lines)
-                msg = _("Imported %s recipes.") % (len(self.added_recs))
+                prog = float(self.file.tell()) / float(self.file.size)
+                msg = _("Imported %s recipes.") % self.count
                 self.emit("progress", prog, msg)
             self.handle_line(line)
         # commit the last rec if need be
@@ -1,18 +1,44 @@
+import base64
+import os
 import xml.sax
 import xml.sax.saxutils
 
-from gourmand.gdebug import TimeAction
+from gourmand.i18n import _
 
 from . import importer
 
+# How much of a file we hand the parser at a time.
+CHUNK_SIZE = 64 * 1024
+
 
 def unquoteattr(str):
     return xml.sax.saxutils.unescape(str).replace("_", " ")
 
 
+class Base64Decoder:
+    """Decode base64 text handed to us a piece at a time."""
+
+    def __init__(self):
+        self.rest = ""
+        self.decoded = []
+
+    def feed(self, text):
+        text = self.rest + "".join(text.split())
+        end = len(text) - len(text) % 4
+        self.decoded.append(base64.b64decode(text[:end]))
+        self.rest = text[end:]
+
+    def close(self) -> bytes:
+        return b"".join(self.decoded) + base64.b64decode(self.rest)
+
+
 class RecHandler(xml.sax.ContentHandler, importer.Importer):
+    """Our elements' character data is collected in elbuf, or decoded
+    as it comes between start_base64() and end_base64()."""
+
     def __init__(self, total=None, conv=None, parent_thread=None):
         self.elbuf = ""
+        self.base64 = None
         xml.sax.ContentHandler.__init__(self)
         importer.Importer.__init__(self, total=total, do_markup=True, conv=conv)
         self.parent_thread = parent_thread
@@ -22,8 +48,31 @@ class RecHandler(xml.sax.ContentHandler, importer.Importer):
         self.suspend = parent_thread.suspend
         self.emit = parent_thread.emit
 
+    # Character data may come in many pieces, which we join only when
+    # elbuf is read.
+    @property
+    def elbuf(self):
+        if len(self.chars) != 1:
+            self.chars = ["".join(self.chars)]
+        return self.chars[0]
+
+    @elbuf.setter
+    def elbuf(self, text):
+        self.chars = [text]
+
     def characters(self, ch):
-        self.elbuf += ch
+        if self.base64 is not None:
+            self.base64.feed(ch)
+        else:
+            self.chars.append(ch)
+
+    def start_base64(self):
+        self.base64 = Base64Decoder()
+
+    def end_base64(self) -> bytes:
+        data = self.base64.close()
+        self.base64 = None
+        return data
 
 
 class Converter(importer.Importer):
@@ -36,9 +85,8 @@ class Converter(importer.Importer):
 
         recHandler - our recHandler class.
 
-        recMarker - a string that identifies a recipe, so we can
-        quickly count total recipes and update users as to progress)
-        and our recHandler class.
+        recMarker - a string that identifies a recipe. We no longer
+        need it: we show progress by how much of the file we have read.
 
         We expect subclasses effectively to call as as we are with
         their own recHandlers.
@@ -55,25 +103,37 @@ class Converter(importer.Importer):
         importer.Importer.__init__(self, name=name)
 
     def do_run(self):
-        # count the recipes in the file
-        t = TimeAction("rxml_to_metakit.run counting lines", 0)
-        if isinstance(self.fn, str):
-            # Latin-1 can decode any bytes, letting us open ASCII-compatible
-            # text files and sniff their contents - e.g. for XML tags -
-            # without worrying about their real text encoding.
-            f = open(self.fn, "r", encoding="latin1")
-        else:
-            f = self.fn
-        recs = 0
-        for line in f.readlines():
-            if line.find(self.recMarker) >= 0:
-                recs += 1
-            if recs % 5 == 0:
+        # One pass through the file, reporting progress as we go.
+        parser = xml.sax.make_parser()
+        parser.setContentHandler(self.rh)
+        f = self.open_file() if isinstance(self.fn, str) else self.fn
+        try:
+            try:
+                size = os.fstat(f.fileno()).st_size
+            except (AttributeError, OSError):
+                size = None
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                parser.feed(chunk)
                 self.check_for_sleep()
-        f.close()
-        t.end()
-        self.rh.total = recs
-        self.parse = xml.sax.parse(self.fn, self.rh)
+                if size:
+                    self.emit("progress", float(f.tell()) / size, _("Imported %s recipes.") % self.rh.count)
+            parser.close()
+        finally:
+            if f is not self.fn:
+                f.close()
         self.added_ings = self.rh.added_ings
         self.added_recs = self.rh.added_recs
         importer.Importer._run_cleanup_(self.rh)
+
+    def open_file(self):
+        """Open our file for the parser, which reads it a chunk at a time."""
+        return open(self.fn, "rb")
+
+    def start_parsing(self):
+        # Our recHandler is the one committing recipes.
+        importer.Importer.start_parsing(self)
+        self.rh.parsing = True
+        self.rh.parsed_recs = self.parsed_recs
@@ -1,6 +1,8 @@
 import re
 from collections import defaultdict
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
 
 from .defaults.defaults import lang as defaults
 from .defaults.defaults import langProperties as langProperties
@@ -29,10 +31,26 @@ class KeyManager:
 
             recipe_manager = recipeManager.default_rec_manager()
         self.rm = recipe_manager
+        # In-memory copy of the keylookup table, read in on first use:
+        # items and words map to [ingkey, count] rows, kept in the
+        # table's order so that scores (and ties) come out exactly as
+        # they would from the database.
+        self.items: Optional[Dict[str, List[list]]] = None
+        self.words: Optional[Dict[str, List[list]]] = None
+        # Keys used by any ingredient, and the last ingredient ID seen.
+        # Once ingredients have been deleted or rekeyed, checked_ingkeys
+        # holds the keys we have looked up in the table since: the rest
+        # of ingkeys may be out of date.
+        self.ingkeys = set()
+        self.last_ingredient_id = 0
+        self.checked_ingkeys = None
 
         if self.rm.fetch_len(self.rm.keylookup_table) == 0:
             self.initialize_from_defaults()
         self.initialize_categories()
+        self.rm.keydic_hooks.append(self.update_index)
+        self.rm.delete_ing_hooks.append(self.forget_ingkeys)
+        self.rm.modify_ing_hooks.append(self.forget_ingkeys)
 
     @staticmethod
     def _snip_notes(s: str) -> str:
@@ -49,6 +67,113 @@ class KeyManager:
             for i in items:
                 dics.append({"ingkey": str(key), "item": str(i), "count": 1})
         self.rm.keylookup_table.insert().execute(dics)
+        self.reset_index()
+
+    def reset_index(self):
+        """Forget our in-memory index; it is read in again when next needed."""
+        self.items = None
+        self.words = None
+        self.ingkeys = set()
+        self.last_ingredient_id = 0
+        self.checked_ingkeys = None
+
+    def forget_ingkeys(self):
+        """Delete and modify hook: ingredients may no longer use keys we
+        know of, or use new ones. Rather than read them all again, we
+        look each key up in the table as it comes up (see ingkey_is_used).
+        """
+        self.checked_ingkeys = set()
+
+    def ingkey_is_used(self, ingkey: str) -> bool:
+        """Return whether any ingredient has ingkey for its key."""
+        if self.checked_ingkeys is not None and ingkey not in self.checked_ingkeys:
+            if self.rm.fetch_one(self.rm.ingredients_table, ingkey=ingkey) is None:
+                self.ingkeys.discard(ingkey)
+            else:
+                self.ingkeys.add(ingkey)
+            self.checked_ingkeys.add(ingkey)
+        return ingkey in self.ingkeys
+
+    def load_index(self):
+        """Make sure our index is loaded and knows every ingredient key.
+
+        The keylookup table is only read once; after that, the
+        keydic_hooks of our recipe manager keep us up to date. For
+        ingredient keys we only look at ingredients added since the
+        last call, which is a single cheap query; keys that deleted or
+        rekeyed ingredients may have changed are left to ingkey_is_used.
+        """
+        if self.items is None:
+            self.items = defaultdict(list)
+            self.words = defaultdict(list)
+            for row in self.rm.fetch_all(self.rm.keylookup_table, sort_by=[("id", 1)]):
+                if row.item is not None:
+                    self.items[row.item].append([row.ingkey, row.count])
+                if row.word is not None:
+                    self.words[row.word].append([row.ingkey, row.count])
+        if self.rm is None:
+            return
+        table = self.rm.ingredients_table
+        query = select([table.c.id, table.c.ingkey]).where(table.c.id > self.last_ingredient_id)
+        for ingredient_id, ingkey in self.rm.db.execute(query):
+            self.ingkeys.add(ingkey)
+            self.last_ingredient_id = max(self.last_ingredient_id, ingredient_id)
+
+    def get_index(self) -> tuple:
+        """Return our index as plain data, for from_index."""
+        if self.checked_ingkeys is not None:
+            # Ingredient keys can't be looked up from a copy.
+            self.ingkeys = set()
+            self.last_ingredient_id = 0
+            self.checked_ingkeys = None
+        self.load_index()
+        return dict(self.items), dict(self.words), set(self.ingkeys), list(self.cats)
+
+    @classmethod
+    def from_index(cls, index: tuple) -> "KeyManager":
+        """Return a KeyManager keying from index, as returned by
+        get_index(), which has no recipe manager and never looks at a
+        database. Import workers key with these (see parallel_importer).
+        """
+        km = cls.__new__(cls)
+        km.rm = None
+        items, words, km.ingkeys, km.cats = index
+        km.items = defaultdict(list, items)
+        km.words = defaultdict(list, words)
+        km.last_ingredient_id = 0
+        km.checked_ingkeys = None
+        return km
+
+    @staticmethod
+    def _change_count(rows: List[list], ingkey: str, change: int):
+        # Mirror what RecData does to the table: the first matching row
+        # is changed and all matching rows go once the count hits 0.
+        for row in rows:
+            if row[0] == ingkey:
+                if row[1] + change:
+                    row[1] += change
+                else:
+                    rows[:] = [r for r in rows if r[0] != ingkey]
+                return
+        if change > 0:
+            rows.append([ingkey, change])
+
+    def update_index(self, item: Optional[str] = None, key: Optional[str] = None, change: int = 0):
+        """Keydic hook: item was added (change=1) or removed (change=-1) for key.
+
+        Without arguments, the keylookup table was changed wholesale and
+        we start over.
+        """
+        if item is None:
+            self.reset_index()
+            return
+        if self.items is None:
+            return
+        self._change_count(self.items[item], key, change)
+        for w in item.split():
+            self._change_count(self.words[w.casefold()], key, change)
+        if change > 0:
+            self.ingkeys.add(key)
 
     def regexp_for_all_words(self, txt):
         """Return a regexp to match any of the words in string."""
@@ -97,9 +222,11 @@ class KeyManager:
         return nwlst
 
     def get_key_fast(self, s) -> str:
-        srch = self.rm.fetch_all(self.rm.keylookup_table, item=s, sort_by=[("count", 1)])
+        if self.items is None:
+            self.load_index()
+        srch = sorted(self.items.get(s, []), key=lambda row: row[1])
         if srch:
-            return srch[-1].ingkey
+            return srch[-1][0]
         else:
             s = self._snip_notes(s)
             return self.generate_key(s)
@@ -108,10 +235,23 @@ class KeyManager:
         """Grab a single key. This is simply a best guess at the
         right key for an item (we can't be sure -- if we could be,
         we wouldn't need a key system in the first place!"""
+        self.load_index()
+        return self._get_key(txt, certainty)
+
+    def get_keys(self, items: List[str], certainty: Optional[float] = 0.61) -> List[str]:
+        """Grab keys for a list of items, as get_key would one by one."""
+        self.load_index()
+        keys = {}
+        for txt in items:
+            if txt not in keys:
+                keys[txt] = self._get_key(txt, certainty)
+        return [keys[txt] for txt in items]
+
+    def _get_key(self, txt: str, certainty: Optional[float]) -> str:
         if not txt:
             return ""
         txt = self._snip_notes(txt)
-        result = self.look_for_key(txt)
+        result = self._look_for_key(txt)
         if result and result[0][0] and result[0][1] > certainty:
             k = result[0][0]
         else:
@@ -130,6 +270,10 @@ class KeyManager:
         appears in the database, and further refined by the word's occurrences
         relative to its other spellings.
         """
+        self.load_index()
+        return self._look_for_key(txt)
+
+    def _look_for_key(self, txt: str) -> Optional[List[Tuple[str, float]]]:
         txt = txt.casefold()
         retvals = defaultdict(float)
 
@@ -144,14 +288,12 @@ class KeyManager:
         # By doing so, it establishes a baseline for the accuracy of t
         # being a useful keyword.
         for t in main_txts:
-            entry = self.rm.fetch_one(self.rm.ingredients_table, ingkey=t)
-
-            if entry is not None:
+            if self.ingkey_is_used(t):
                 retvals[t] = 0.9
 
-            exact = self.rm.fetch_all(self.rm.keylookup_table, item=t)
-            for o in exact:
-                retvals[o.ingkey] += (float(o.count) / len(exact)) * 2
+            exact = self.items.get(t, [])
+            for ingkey, count in exact:
+                retvals[ingkey] += (float(count) / len(exact)) * 2
 
         # Part II -- look up individual words
         words = self.word_splitter.split(txt)
@@ -173,9 +315,9 @@ class KeyManager:
         for word in words:
             if not word:
                 return
-            srch = self.rm.fetch_all(self.rm.keylookup_table, word=word)
-            total_count = sum([m.count for m in srch])
-            for match in srch:
+            srch = self.words.get(word, [])
+            total_count = sum([count for ik, count in srch])
+            for ik, count in srch:
                 # We have a lovely ratio.
                 #
                 # count      1
@@ -186,10 +328,9 @@ class KeyManager:
                 # resulted in this key, matches is the number of keys
                 # that match this word in all, and words is the number
                 # of words we're dealing with.
-                ik = match.ingkey
                 words_in_key = len(ik.split())
                 wordcount = words_in_key if words_in_key > nwords else nwords
-                retvals[ik] += (match.count / total_count) * (1 / wordcount)
+                retvals[ik] += (count / total_count) * (1 / wordcount)
 
                 # Add some probability if our word shows up in the key
                 if word in ik:
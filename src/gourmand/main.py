@@ -18,7 +18,7 @@ from gourmand.gtk_extras import WidgetSaver, fix_action_group_importance, mnemon
 from gourmand.gtk_extras import dialog_extras as de
 from gourmand.gtk_extras import treeview_extras as te
 from gourmand.i18n import _
-from gourmand.image_utils import load_pixbuf_from_resource
+from gourmand.image_utils import image_cache, load_pixbuf_from_resource
 from gourmand.importers.clipboard_importer import import_from_clipboard
 from gourmand.importers.importManager import ImportManager
 from gourmand.prefs import copy_old_installation_or_initialize, update_preferences_file_format
@@ -94,6 +94,8 @@ class GourmandApplication:
         # Call our method once with the default prefs to apply saved
         # user settings
         toggleFractions(None, self.prefs.get("useFractions", defaults.LANG_PROPERTIES["useFractions"]))
+        if self.prefs.get("cache_thumbnails_on_disk", True):
+            image_cache.directory = gourmanddir / "thumbnails"
 
     # Convenience method for showing progress dialogs for import/export/deletion
     def show_progress_dialog(self, thread, progress_dialog_kwargs=None, message=_("Import paused"), stop_message=_("Stop import")):
@@ -143,9 +145,9 @@ class GourmandApplication:
         autosave_timeout = 2 * 60 * 1000  # in milliseconds
         GLib.timeout_add(autosave_timeout, autosave)
 
-        # Connect views to update on modifications
-        self.rd.modify_hooks.append(self.update_attribute_models)
-        self.rd.add_hooks.append(self.update_attribute_models)
+        # Connect views to update on modifications. Attribute models
+        # are updated once after a batch of changes rather than by the
+        # add and modify hooks, which run once per recipe.
         self.rd.delete_hooks.append(self.update_attribute_models)
 
         # Create models that are accessed by other objects
@@ -428,12 +430,15 @@ class GourmandApplication:
         self.rd.delete_by_criteria(self.rd.ingredients_table, {"deleted": True})
         # Save our recipe info...
         self.save()
+        self.rd.close()
         for r in list(self.rc.values()):
             r.hide()
 
 
 class SuspendableDeletions(SuspendableThread):
 
+    batch_size = 100
+
     def __init__(self, recs, name=None):
         self.recs = recs
         self.rg = RecGui.instance()
@@ -441,9 +446,14 @@ class SuspendableDeletions(SuspendableThread):
 
     def do_run(self):
         tot = len(self.recs)
-        for n, r in enumerate(self.recs):
+        # Commit a batch at a time, so that pausing us doesn't keep
+        # the database locked.
+        for start in range(0, tot, self.batch_size):
             self.check_for_sleep()
-            self.rg.rd.delete_rec(r)
+            with self.rg.rd.transaction():
+                for r in self.recs[start : start + self.batch_size]:
+                    self.rg.rd.delete_rec(r)
+            n = min(start + self.batch_size, tot)
             self.emit("progress", float(n) / tot, _("Permanently deleted %s of %s recipes") % (n, tot))
 
 
@@ -528,11 +538,10 @@ class RecTrash(RecIndex):
     #    self.sort_by = []
 
     def update_from_db(self):
-        self.update_rmodel(self.rg.rd.fetch_all(self.rg.rd.recipe_table, deleted=True))
+        self.update_rmodel(self.search_recipes(self.default_searches))
 
     def undelete_selected_recs(self, *args):
-        mod, rr = self.rectree.get_selection().get_selected_rows()
-        recs = [mod[path][0] for path in rr]
+        recs = self.get_selected_recs_from_rec_tree()
         msg = ""
         for r in recs:
             msg += r.title + ", "
@@ -549,7 +558,7 @@ class RecTrash(RecIndex):
         if not sel:
             return
         mod, rr = sel.get_selected_rows()
-        recs = [mod[path][0] for path in rr]
+        recs = self.get_full_recs([mod[path][0] for path in rr])
         self.rg.purge_rec_tree(recs, rr, mod)
         self.update_from_db()
 
@@ -735,20 +744,22 @@ class StuffThatShouldBePlugins:
                 custom_yes=Gtk.STOCK_OK,
                 custom_no=Gtk.STOCK_CANCEL,
             ):
-                for r in recs:
-                    # Need to copy in case we're dealing with
-                    # categories as they would get messed up by
-                    # modify_rec
-                    changes = self.batchEditor.values.copy()
-                    if only_where_blank:
-                        for attribute in list(changes.keys()):
-                            if (attribute == "category" and self.rd.get_cats(r)) or (hasattr(r, attribute) and getattr(r, attribute)):
-                                del changes[attribute]
-                        if changes:
+                # One commit for the lot; our modify hooks update
+                # the index once it is done.
+                with self.rd.transaction():
+                    for r in recs:
+                        # Need to copy in case we're dealing with
+                        # categories as they would get messed up by
+                        # modify_rec
+                        changes = self.batchEditor.values.copy()
+                        if only_where_blank:
+                            for attribute in list(changes.keys()):
+                                if (attribute == "category" and self.rd.get_cats(r)) or (hasattr(r, attribute) and getattr(r, attribute)):
+                                    del changes[attribute]
+                            if changes:
+                                self.rd.modify_rec(r, changes)
+                        else:
                             self.rd.modify_rec(r, changes)
-                    else:
-                        self.rd.modify_rec(r, changes)
-                    self.rmodel.update_recipe(r)
             else:
                 print("Cancelled")
         self.batchEditor.dialog.hide()
@@ -69,12 +69,11 @@ class RecipeBrowserView(Gtk.IconView):
             if hasattr(self, "category_images"):
                 stment = and_(
                     col == val,
-                    self.rd.recipe_table.c.image is not None,
-                    self.rd.recipe_table.c.image != bytes(),
+                    self.rd.recipe_table.c.image_id.isnot(None),
                     not_(self.rd.recipe_table.c.title.in_(self.category_images)),
                 )
             else:
-                stment = and_(col == val, self.rd.recipe_table.c.image is not None, self.rd.recipe_table.c.image != bytes())
+                stment = and_(col == val, self.rd.recipe_table.c.image_id.isnot(None))
             result = tbl.select(stment, limit=1).execute().fetchone()
             if not hasattr(self, "category_images"):
                 self.category_images = []
@@ -87,10 +86,11 @@ class RecipeBrowserView(Gtk.IconView):
         else:
             tbl = self.rd.recipe_table
             col = getattr(self.rd.recipe_table.c, attr)
-            stment = and_(col == val, self.rd.recipe_table.c.image is not None, self.rd.recipe_table.c.image != bytes())
+            stment = and_(col == val, self.rd.recipe_table.c.image_id.isnot(None))
             result = tbl.select(stment, limit=1).execute().fetchone()
-        if result and result.thumb:
-            return scale_pb(bytes_to_pixbuf(result.image))
+        preview = result and self.rd.get_preview(result)
+        if preview:
+            return scale_pb(bytes_to_pixbuf(preview))
         else:
             return self.get_base_icon(attr) or self.get_base_icon("category")
 
@@ -139,7 +139,7 @@ class RecipeBrowserView(Gtk.IconView):
             else:
                 searches.append({"column": attr, "search": val})
         for recipe in self.rd.search_recipes(searches, sort_by=[("title", 1)]):
-            pb = get_recipe_image(recipe)
+            pb = get_recipe_image(recipe, self.rd.get_preview(recipe))
             m.append((str(recipe.id), recipe.title, pb, None))
 
     def set_path(self, path):
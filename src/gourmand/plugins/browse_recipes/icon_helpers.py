@@ -51,9 +51,10 @@ attr_to_icon = {
 }
 
 
-def get_recipe_image(rec):
-    if rec.image:
-        pb = scale_pb(bytes_to_pixbuf(rec.image))
+def get_recipe_image(rec, image):
+    """Return an icon for rec made from image (bytes, or None)."""
+    if image:
+        pb = scale_pb(bytes_to_pixbuf(image))
     else:
         pb = generic_recipe_image.copy()
     big_side = (pb.get_property("height") > pb.get_property("width") and pb.get_property("height")) or pb.get_property("width")
@@ -50,6 +50,7 @@ class RecipeMergerDialog:
     RECIPE_DUP_MODE = 0
     ING_DUP_MODE = 1
     COMPLETE_DUP_MODE = 2
+    NEAR_DUP_MODE = 3
 
     DUP_INDEX_PAGE = 0
     MERGE_PAGE = 1
@@ -124,6 +125,8 @@ class RecipeMergerDialog:
             dups = self.rd.find_duplicates(by="recipe", recipes=self.in_recipes, include_deleted=include_deleted)
         elif search_mode == self.ING_DUP_MODE:
             dups = self.rd.find_duplicates(by="ingredient", recipes=self.in_recipes, include_deleted=include_deleted)
+        elif search_mode == self.NEAR_DUP_MODE:
+            dups = self.rd.find_all_duplicates(recipes=self.in_recipes, include_deleted=include_deleted, near=True)
         else:  # == self.COMPLETE_DUP_MODE
             dups = self.rd.find_complete_duplicates(include_deleted=include_deleted, recipes=self.in_recipes)
         self.setup_treemodel(dups)
@@ -132,14 +135,16 @@ class RecipeMergerDialog:
 
     def setup_treemodel(self, dups):
         self.treeModel = Gtk.TreeStore(int, int, str, int, str)  # dup_index, rec_id, rec_title, last_modified, number_of_duplicates
+        ids = [id for duplicate_recipes in dups for id in duplicate_recipes]
+        recs = {r.id: r for r in self.rd.get_recs(ids)}
         for dup_index, duplicate_recipes in enumerate(dups):
             first = duplicate_recipes[0]
             others = duplicate_recipes[1:]
             nduplicates = len(duplicate_recipes)
-            r = self.rd.get_rec(first)
+            r = recs[first]
             firstIter = self.treeModel.append(None, (dup_index or 0, first or 0, r.title or "", r.last_modified or 0, str(nduplicates)))
             for o in others:
-                r = self.rd.get_rec(o)
+                r = recs[o]
                 self.treeModel.append(firstIter, (dup_index, o, r.title, r.last_modified or 0, ""))
 
     def merge_next_recipe(
@@ -152,7 +157,7 @@ class RecipeMergerDialog:
             )
             duplicate_recipes = self.dups[self.current_dup_index]
             # self.idt = IngDiffTable(self.rd,duplicate_recipes[0],duplicate_recipes[1])
-            self.current_recs = [self.rd.get_rec(i) for i in duplicate_recipes]
+            self.current_recs = self.rd.get_recs(duplicate_recipes)
             last_modified = {"last_modified": [r.last_modified for r in self.current_recs]}
             self.current_diff_data = recipeIdentifier.diff_recipes(self.rd, self.current_recs)
             last_modified.update(self.current_diff_data)
@@ -256,7 +261,7 @@ class RecipeMergerDialog:
             )
             self.current_dup_index = self.to_merge.pop(0)
             duplicate_recipes = self.dups[self.current_dup_index]
-            self.current_recs = [self.rd.get_rec(i) for i in duplicate_recipes]
+            self.current_recs = self.rd.get_recs(duplicate_recipes)
             do_auto_merge()
             while Gtk.events_pending():
                 Gtk.main_iteration()
@@ -367,7 +372,7 @@ class DiffTable(Gtk.Table):
         for attr, name, typ in (
             [("last_modified", "Last Modified", None)]
             + gglobals.REC_ATTRS
-            + [("image", "Image", None)]
+            + [("image_id", "Image", None)]
             + [(attr, gglobals.TEXT_ATTR_DIC[attr], None) for attr in gglobals.DEFAULT_TEXT_ATTR_ORDER]
         ):
             if attr in diff_dic:
@@ -626,7 +631,7 @@ def get_display_constructor(attribute):
         return lambda v: ratingWidget.StarImage(ratingWidget.star_generator, value=v, upper=10)
     elif attribute in ["preptime", "cooktime"]:
         return lambda v: Gtk.Label(label=convert.seconds_to_timestring(v))
-    elif attribute == "image":
+    elif attribute == "image_id":
         return lambda v: (v and Gtk.Label(label="An Image") or Gtk.Label(label="No Image"))
     elif attribute in gglobals.DEFAULT_TEXT_ATTR_ORDER:
         return make_text_label
@@ -666,7 +671,7 @@ if __name__ == "__main__":
         print(t.selected_dic)
 
     def test_merger(rd, conflicts):
-        recs = [rd.get_rec(i) for i in conflicts]
+        recs = rd.get_recs(conflicts)
         rmerger = RecipeMerger(rd)
         to_fill, conflict_dic = recipeIdentifier.merge_recipes(rd, recs)
         if conflict_dic:
@@ -224,6 +224,11 @@ class FieldEditor:
         return criteria, table
 
     def apply_changes(self, criteria, table):
+        with self.rd.transaction():
+            self._apply_changes(criteria, table)
+        self.rg.reset_search()
+
+    def _apply_changes(self, criteria, table):
         changes = self.get_changes()
         other_changes = self.get_other_changes()
         if self.field != "category" and self.other_field != "category":
@@ -251,7 +256,6 @@ class FieldEditor:
             else:
                 table = self.rd.recipe_table
             self.rd.update_by_criteria(table, criteria, changes)
-        self.rg.reset_search()
 
 
 if __name__ == "__main__":
@@ -2,10 +2,18 @@ import base64
 import xml.sax.saxutils
 
 import gourmand.exporters.exporter as exporter
-from gourmand.exporters.xml_exporter import XmlExporter
+from gourmand.exporters.xml_exporter import XmlStreamExporter, XmlWriter
 
+# This order is now in our DTD so we'd better make it solid.
+ATTR_ORDER = ("title", "category", "cuisine", "source", "link", "rating", "preptime", "cooktime", "yields")
+ORDER = ["attr", "image", "ings", "text"]
 
-class rec_to_xml(XmlExporter):
+# Images are base64-encoded this many bytes at a time. A multiple of 3
+# encodes without padding, so the chunks can simply be concatenated.
+IMAGE_CHUNK_SIZE = 3 * 2**16
+
+
+class rec_to_xml(XmlStreamExporter):
     """A vastly simplified recipe XML exporter.
 
     The previous XML format was written as a format designed for
@@ -14,28 +22,25 @@ class rec_to_xml(XmlExporter):
     result, the code is much simpler, and the format should be quicker
     to write and more convenient for exchanging single recipes.
 
-    This implementation actually uses the DOM to ensure correctness.
+    Elements are written out as soon as we reach them, so exporting a
+    large database never needs more memory than a single recipe.
     """
 
     doc_element = "gourmetDoc"
-    doctype_desc = ""
-    dtd_path = ""
     ALLOW_PLUGINS_TO_WRITE_NEW_FIELDS = False
 
     def write_head(self):
-        self.rec_el = self.create_element_with_attrs("recipe", {"id": self.r.id})
-        self.top_element.appendChild(self.rec_el)
+        XmlStreamExporter.write_head(self)
+        self.writer.start_element("recipe", {"id": self.r.id})
 
     def write_attr(self, attr, text):
-        self.rec_el.appendChild(self.create_text_element(attr.replace(" ", ""), text))
+        self.writer.text_element(attr.replace(" ", ""), text)
 
     def write_text(self, attr, text):
-        self.rec_el.appendChild(self.create_text_element(attr.replace(" ", ""), text))
+        self.writer.text_element(attr.replace(" ", ""), text)
 
     def write_image(self, image):
-        image_el = self.create_element_with_attrs("image", {"format": "jpeg"})
-        image_el.appendChild(self.xmlDoc.createCDATASection(base64.b64encode(image).decode()))
-        self.rec_el.appendChild(image_el)
+        self.writer.cdata_element("image", b64encode_chunks(image), {"format": "jpeg"})
 
     def handle_italic(self, chunk):
         return "&lt;i&gt;" + chunk + "&lt;/i&gt;"
@@ -47,49 +52,45 @@ class rec_to_xml(XmlExporter):
         return "&lt;u&gt;" + chunk + "&lt;/u&gt;"
 
     def write_foot(self):
-        if self.i_created_this_document:
-            self.xmlDoc.writexml(self.ofi, newl="\n", addindent="\t", encoding="UTF-8")
+        self.writer.end_element()
+        XmlStreamExporter.write_foot(self)
 
     def write_inghead(self):
-        self.inglist_el = self.xmlDoc.createElement("ingredient-list")
-        self.top_inglist = self.inglist_el  # because groups will let us nest...
-        self.rec_el.appendChild(self.inglist_el)
+        self.writer.start_element("ingredient-list")
+
+    def write_ingfoot(self):
+        self.writer.end_element()
 
     def write_ingref(self, amount=1, unit=None, item=None, refid=None, optional=False):
-        self.inglist_el.appendChild(self.create_text_element("ingref", item, {"refid": str(refid), "amount": amount}))
+        self.writer.text_element("ingref", item, {"refid": str(refid), "amount": amount})
 
     def write_ing(self, amount=1, unit=None, item=None, key=None, optional=False):
         if optional:
-            ing_el = self.create_element_with_attrs("ingredient", {"optional": "yes"})
+            self.writer.start_element("ingredient", {"optional": "yes"})
         else:
-            ing_el = self.create_element_with_attrs("ingredient", {})
-        self.inglist_el.appendChild(ing_el)
+            self.writer.start_element("ingredient")
         if amount:
-            ing_el.appendChild(self.create_text_element("amount", amount))
+            self.writer.text_element("amount", amount)
         if unit:
-            ing_el.appendChild(self.create_text_element("unit", unit))
+            self.writer.text_element("unit", unit)
         if item:
-            ing_el.appendChild(self.create_text_element("item", item))
+            self.writer.text_element("item", item)
         if key:
-            ing_el.appendChild(self.create_text_element("key", key))
+            self.writer.text_element("key", key)
+        self.writer.end_element()
 
     def write_grouphead(self, name):
-        group_el = self.xmlDoc.createElement("inggroup")
-        group_el.appendChild(self.create_text_element("groupname", name))
-        self.inglist_el = group_el
+        self.writer.start_element("inggroup")
+        self.writer.text_element("groupname", name)
 
     def write_groupfoot(self):
-        self.top_inglist.appendChild(self.inglist_el)
-        self.inglist_el = self.top_inglist
+        self.writer.end_element()
 
 
-class recipe_table_to_xml(exporter.ExporterMultirec, XmlExporter):
+class recipe_table_to_xml(exporter.ExporterMultirec):
     doc_element = "gourmetDoc"
-    doctype_desc = ""
-    dtd_path = ""
 
     def __init__(self, rd, recipe_table, out, one_file=True, change_units=False, mult=1):
-        self.create_xmldoc()
         exporter.ExporterMultirec.__init__(
             self,
             rd,
@@ -98,29 +99,23 @@ class recipe_table_to_xml(exporter.ExporterMultirec, XmlExporter):
             one_file=True,
             ext="xml",
             exporter=rec_to_xml,
-            exporter_kwargs={
-                "change_units": change_units,
-                "mult": mult,
-                "xmlDoc": self.xmlDoc,
-                # This order is now in our DTD so we'd
-                # better make it solid.
-                "attr_order": (
-                    "title",
-                    "category",
-                    "cuisine",
-                    "source",
-                    "link",
-                    "rating",
-                    "preptime",
-                    "cooktime",
-                    "yields",
-                ),
-                "order": ["attr", "image", "ings", "text"],
-            },
+            exporter_kwargs={"change_units": change_units, "mult": mult, "attr_order": ATTR_ORDER, "order": ORDER},
         )
 
+    def write_header(self, *args):
+        self.writer = XmlWriter(self.ofi)
+        self.writer.start_document(self.doc_element)
+        self.exporter_kwargs["xml_writer"] = self.writer
+
     def write_footer(self, *args):
-        self.xmlDoc.writexml(self.ofi, newl="\n", addindent="\t", encoding="UTF-8")
+        self.writer.end_document()
+
+
+def b64encode_chunks(data, chunk_size=IMAGE_CHUNK_SIZE):
+    """Yield data base64-encoded, chunk_size bytes at a time."""
+    data = memoryview(data)
+    for start in range(0, len(data), chunk_size):
+        yield base64.b64encode(data[start : start + chunk_size]).decode()
 
 
 def quoteattr(str):
@@ -1,4 +1,3 @@
-import base64
 import xml.sax
 import xml.sax.saxutils
 
@@ -30,6 +29,8 @@ class RecHandler(xml_importer.RecHandler):
             else:
                 self.start_rec()
 
+        if name == "image":
+            self.start_base64()
         if name == "ingredient":
             self.start_ing(recipe_id=self.rec["id"])
             if attrs.get("optional", False):
@@ -53,7 +54,7 @@ class RecHandler(xml_importer.RecHandler):
         elif name == "ingredient":
             self.commit_ing()
         elif name == "image":
-            self.rec["image"] = base64.b64decode(self.elbuf.strip())
+            self.rec["image"] = self.end_base64()
         elif name == "yields":
             txt = xml.sax.saxutils.unescape(self.elbuf.strip())
             match = NUMBER_FINDER.search(txt)
@@ -1,4 +1,3 @@
-import base64
 import xml.sax
 import xml.sax.saxutils
 
@@ -37,6 +36,7 @@ class RecHandler(xml_importer.RecHandler):
                         print("Warning: can't translate ", raw)
         if name == "image":
             self.in_mixed = 0
+            self.start_base64()
         if name == "inggroup":
             self.in_mixed = 0
             self.group = unquoteattr(attrs.get("name"))
@@ -74,7 +74,7 @@ class RecHandler(xml_importer.RecHandler):
         if name == "title":
             self.rec["title"] = xml.sax.saxutils.unescape(self.elbuf)
         if name == "image":
-            self.rec["image"] = base64.b64decode(self.elbuf)
+            self.rec["image"] = self.end_base64()
         if name == "recipe":
             # self.rd.add_rec(self.rec)
             self.commit_rec()
@@ -1,5 +1,3 @@
-import base64
-
 from gourmand.importers import xml_importer
 
 
@@ -41,6 +39,8 @@ class KrecHandler(xml_importer.RecHandler):
             self.start_ing()
         if name == "ingredient-group":
             self.group = attrs.get("name", "")
+        if name in self.RECTAGS and self.RECTAGS[name][1] == self.BASE_64:
+            self.start_base64()
 
     def endElement(self, name):
         key, method = None, None
@@ -65,7 +65,7 @@ class KrecHandler(xml_importer.RecHandler):
                 for k in key:
                     obj[k] = self.elbuf
             elif method == self.BASE_64:
-                obj[key] = base64.b64decode(self.elbuf)
+                obj[key] = self.end_base64()
             else:
                 obj[key] = self.elbuf
 
@@ -1,5 +1,5 @@
-import os.path
 import re
+import shutil
 import xml.sax
 
 import gourmand.importers.importer as importer
@@ -22,15 +22,21 @@ class Mx2Cleaner:
         self.encodings = ["cp1252", "iso8859", "ascii", "latin_1", "cp850", "utf-8"]
 
     def cleanup(self, infile, outfile):
-        infile = open(infile, "rb")
-        outfile = open(outfile, "w", encoding="utf-8")
-        for line in infile.readlines():
-            line = self.decode(line)
-            line = self.toss_regs(line)
-            line = self.fix_attrs(line)
-            outfile.write(line)
-        infile.close()
-        outfile.close()
+        with self.open(infile) as cleaned, open(outfile, "w", encoding="utf-8") as out:
+            shutil.copyfileobj(cleaned, out)
+
+    def open(self, filename):
+        """Return filename as a file object, which we clean as it is read."""
+        return CleanedMx2File(self, filename)
+
+    def clean_lines(self, data: bytes) -> str:
+        """Clean data, which holds whole lines."""
+        try:
+            # Lines are decoded one by one only if they have to be.
+            lines = data.decode(self.encodings[0]).split("\n")
+        except UnicodeDecodeError:
+            lines = [self.decode(line) for line in data.split(b"\n")]
+        return "\n".join(self.fix_attrs(self.toss_regs(line)) for line in lines)
 
     def toss_regs(self, instr):
         m = self.toss_regexp.search(instr)
@@ -65,6 +71,54 @@ class Mx2Cleaner:
                 pass
 
 
+class CleanedMx2File:
+    """An mx2 file, cleaned by an Mx2Cleaner as it is read.
+
+    Our cleaner works on whole lines, so we keep the start of a line
+    we have read until we have read its end.
+    """
+
+    def __init__(self, cleaner, filename):
+        self.cleaner = cleaner
+        self.raw = open(filename, "rb")
+        self.rest = b""
+        self.text = ""
+
+    def read(self, size=-1):
+        while size < 0 or len(self.text) < size:
+            chunk = self.raw.read(xml_importer.CHUNK_SIZE)
+            if not chunk:
+                if self.rest:
+                    self.text += self.cleaner.clean_lines(self.rest)
+                    self.rest = b""
+                break
+            data = self.rest + chunk
+            end = data.rfind(b"\n") + 1
+            self.rest = data[end:]
+            if end:
+                self.text += self.cleaner.clean_lines(data[:end])
+        if size < 0:
+            size = len(self.text)
+        text, self.text = self.text[:size], self.text[size:]
+        return text
+
+    def tell(self):
+        """Return how far through the raw file we have read."""
+        return self.raw.tell()
+
+    def fileno(self):
+        return self.raw.fileno()
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
 class MastercookXMLHandler(xml_importer.RecHandler):
     """We handle MasterCook XML Files"""
 
@@ -92,6 +146,9 @@ class MastercookXMLHandler(xml_importer.RecHandler):
             "Yield": ["unit", "qty"],
         }
         self.current_elements = []
+        # The buffers collecting character data, by name, and the names
+        # of those open.
+        self.buffers = {}
         self.bufs = []
         xml.sax.ContentHandler.__init__(self)
         importer.Importer.__init__(self, conv=conv)
@@ -131,13 +188,18 @@ class MastercookXMLHandler(xml_importer.RecHandler):
         if self.bufs:
             debug("adding to %s bufs: %s" % (len(self.bufs), ch), 0)
         for buf in self.bufs:
-            setattr(self, buf, getattr(self, buf) + ch)
+            self.buffers[buf].append(ch)
+
+    def start_buf(self, buf):
+        self.buffers[buf] = []
+        self.bufs.append(buf)
+
+    def get_buf(self, buf):
+        return "".join(self.buffers[buf])
 
     def Nam_handler(self, start=False, end=False, attrs=None):
-        if start:
-            # we simply count recipes so that we can
-            # indicate progress.
-            self.total += 1
+        # Our converter shows progress by how much of the file it has read.
+        pass
 
     def RcpE_handler(self, start=False, end=False, attrs=None):
         if start:
@@ -154,8 +216,7 @@ class MastercookXMLHandler(xml_importer.RecHandler):
 
     def RTxt_handler(self, start=False, end=False, attrs=None):
         if start:
-            self.cdata_buf = ""
-            self.bufs.append("cdata_buf")
+            self.start_buf("cdata_buf")
         if end:
             self.bufs.remove("cdata_buf")
 
@@ -169,15 +230,14 @@ class MastercookXMLHandler(xml_importer.RecHandler):
 
     def CatT_handler(self, start=False, end=False, attrs=None):
         if start:
-            self.catbuf = ""
-            self.bufs.append("catbuf")
+            self.start_buf("catbuf")
         if end:
             self.bufs.remove("catbuf")
-            self.catbuf = self.catbuf.strip()
+            catbuf = self.get_buf("catbuf").strip()
             if "category" in self.rec:
-                self.rec["category"] = self.rec["category"] + " " + self.catbuf
+                self.rec["category"] = self.rec["category"] + " " + catbuf
             else:
-                self.rec["category"] = xml.sax.saxutils.unescape(self.catbuf)
+                self.rec["category"] = xml.sax.saxutils.unescape(catbuf)
 
     def IngR_handler(self, start=False, end=False, attrs=None):
         if attrs:
@@ -203,22 +263,20 @@ class MastercookXMLHandler(xml_importer.RecHandler):
 
     def DirT_handler(self, start=False, end=False, attrs=None):
         if start:
-            self.dbuf = ""
-            self.bufs.append("dbuf")
+            self.start_buf("dbuf")
         if end:
             self.bufs.remove("dbuf")
-            self._add_to_instructions(self.dbuf.strip())
+            self._add_to_instructions(self.get_buf("dbuf").strip())
 
     # this also gets added to instructions
     Desc_handler = DirT_handler
 
     def Note_handler(self, start=False, end=False, attrs=None):
         if start:
-            self.dbuf = ""
-            self.bufs.append("dbuf")
+            self.start_buf("dbuf")
         if end:
             self.bufs.remove("dbuf")
-            buf = xml.sax.saxutils.unescape(self.dbuf.strip())
+            buf = xml.sax.saxutils.unescape(self.get_buf("dbuf").strip())
             if "modifications" in self.rec:
                 self.rec["modifications"] = self.rec["modifications"] + "\n%s" % buf
             else:
@@ -226,18 +284,16 @@ class MastercookXMLHandler(xml_importer.RecHandler):
 
     def IPrp_handler(self, start=False, end=False, attrs=None):
         if start:
-            self.ipbuf = ""
-            self.bufs.append("ipbuf")
+            self.start_buf("ipbuf")
         if end:
-            self.item += "; %s" % xml.sax.saxutils.unescape(self.ipbuf.strip())
+            self.item += "; %s" % xml.sax.saxutils.unescape(self.get_buf("ipbuf").strip())
             self.bufs.remove("ipbuf")
 
     def Srce_handler(self, start=False, end=False, attrs=None):
         if start:
-            self.srcbuf = ""
-            self.bufs.append("srcbuf")
+            self.start_buf("srcbuf")
         if end:
-            self.rec["source"] = self.srcbuf.strip()
+            self.rec["source"] = self.get_buf("srcbuf").strip()
             self.bufs.remove("srcbuf")
 
 
@@ -250,12 +306,7 @@ class MastercookImporter(xml_importer.Converter):
             filename=filename,
         )
 
-    def pre_run(self):
-        self.emit("progress", 0.03, _("Tidying up XML"))
-        cleaner = Mx2Cleaner()
-        base, ext = os.path.splitext(self.fn)
-        cleanfn = base + ".gourmetcleaned" + ext
-        cleaner.cleanup(self.fn, cleanfn)
-        debug("Cleaned up file saved to %s" % cleanfn, 1)
-        self.orig_fn = self.fn
-        self.fn = cleanfn
+    def open_file(self):
+        # MasterCook writes XML that needs tidying up, which we do as
+        # the parser reads it.
+        return Mx2Cleaner().open(self.fn)
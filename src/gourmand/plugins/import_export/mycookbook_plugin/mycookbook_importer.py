@@ -1,12 +1,15 @@
-import os
+import posixpath
 import re
+import zipfile
 
+from lxml import etree
 from PIL import Image
 
 import gourmand.image_utils
 from gourmand.gdebug import *  # noqa: F403  # TODO: Fix.
 from gourmand.gglobals import *  # noqa: F403  # TODO: Fix.
-from gourmand.importers import xml_importer
+from gourmand.i18n import _
+from gourmand.importers import importer, xml_importer
 
 
 class RecHandler(xml_importer.RecHandler):
@@ -55,10 +58,6 @@ class RecHandler(xml_importer.RecHandler):
             self.commit_rec()
             return
         if name == "li" and self.current_section == "ingredient":
-            if not hasattr(self, "db"):
-                import gourmand.backends.db as db
-
-                self.db = db.get_database()
             ingdic = self.rd.parse_ingredient(self.elbuf.strip())
             self.start_ing(**ingdic)
             self.commit_ing()
@@ -72,18 +71,15 @@ class RecHandler(xml_importer.RecHandler):
             obj = self.rec
         if name == "imagepath":
             obj = self.rec
-            # get the temp directory and build the image path
-            (dirname, filename) = os.path.split(self.parent_thread.fn)
-            (pic_dirname, pic_filename) = os.path.split(self.elbuf.strip())
-            pic_fullpath = os.path.join(dirname, "images", pic_filename)
-
             # try to import the image
-            if os.path.isfile(pic_fullpath):
+            image = self.parent_thread.open_image(self.elbuf.strip())
+            if image:
                 try:
-                    im = Image.open(pic_fullpath)
-                    obj["image"] = gourmand.image_utils.image_to_bytes(im)
+                    with image:
+                        im = Image.open(image)
+                        obj["image"] = gourmand.image_utils.image_to_bytes(im)
                 except Exception as e:
-                    print("Issue loading: " + pic_fullpath)
+                    print("Issue loading: " + self.elbuf.strip())
                     print(str(e))
 
         # times fixing
@@ -117,5 +113,43 @@ class RecHandler(xml_importer.RecHandler):
 
 
 class Converter(xml_importer.Converter):
+    """Import a MyCookbook archive, reading its XML straight from the zip.
+
+    Images are read from the archive as recipes refer to them.
+    """
+
     def __init__(self, filename, conv=None):
         xml_importer.Converter.__init__(self, filename, RecHandler, recMarker="</recipe>", conv=conv, name="MCB Importer")
+
+    def do_run(self):
+        with zipfile.ZipFile(self.fn) as self.zf:
+            xmlname = [name for name in self.zf.namelist() if name.endswith(".xml")][0]
+            self.image_dir = posixpath.join(posixpath.dirname(xmlname), "images")
+            size = self.zf.getinfo(xmlname).file_size
+            with self.zf.open(xmlname) as f:
+                # MyCookbook's XML is not always well formed, so we let
+                # lxml recover from its errors.
+                for event, el in etree.iterparse(f, events=("start", "end"), recover=True):
+                    if event == "start":
+                        self.rh.startElement(el.tag, el.attrib)
+                        continue
+                    self.rh.elbuf = "".join(el.itertext())
+                    self.rh.endElement(el.tag)
+                    if el.tag == RecHandler.RECIPE_TAG:
+                        # Let go of the recipes we are done with.
+                        el.clear()
+                        while el.getprevious() is not None:
+                            del el.getparent()[0]
+                        self.check_for_sleep()
+                        if size:
+                            self.emit("progress", float(f.tell()) / size, _("Imported %s recipes.") % self.rh.count)
+        self.added_ings = self.rh.added_ings
+        self.added_recs = self.rh.added_recs
+        importer.Importer._run_cleanup_(self.rh)
+
+    def open_image(self, imagepath):
+        """Open the image imagepath names in our archive, or return None if it is not there."""
+        try:
+            return self.zf.open(posixpath.join(self.image_dir, posixpath.basename(imagepath)))
+        except KeyError:
+            return None
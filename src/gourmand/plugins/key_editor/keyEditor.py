@@ -171,7 +171,7 @@ class KeyEditor:
                 % text,
             ):
                 self.rd.update_by_criteria(self.rd.ingredients_table, curdic, {"ingkey": text})
-                self.rd.delete_by_criteria(self.rd.keylookup_table, {"ingkey": key})
+                self.rd.delete_key_from_keydic(key)
         elif field == "item":
             if de.getBoolean(
                 label=_('Change all items "%s" to "%s"?') % (curdic["item"], text),
@@ -394,7 +394,7 @@ class KeyEditor:
                     newdic,
                 )
                 if "ingkey" in curdic and "ingkey" in newdic:
-                    self.rd.delete_by_criteria(self.rd.keylookup_table, {"ingkey": curdic["ingkey"]})
+                    self.rd.delete_key_from_keydic(curdic["ingkey"])
         self.resetTree()
 
     def editNutritionalInfoCB(self, *args):
@@ -682,13 +682,5 @@ class KeyStore(pageable_store.PageableTreeStore, pageable_store.PageableViewStor
     def get_recs(self, key, item) -> str:
         """Return a string with a list of recipes containing an ingredient with
         key and item"""
-        recs = [i.recipe_id for i in self.rd.fetch_all(self.rd.ingredients_table, ingkey=key, item=item)]
-        titles = []
-        looked_at = []
-        for r_id in recs:
-            if r_id in looked_at:
-                continue
-            rec = self.rd.get_rec(r_id)
-            if rec:
-                titles.append(rec.title)
-        return ", ".join(titles)
+        recs = dict.fromkeys(i.recipe_id for i in self.rd.fetch_all(self.rd.ingredients_table, ingkey=key, item=item))
+        return ", ".join(rec.title for rec in self.rd.get_recs(recs))
@@ -6,18 +6,30 @@ from gourmand.plugin import DatabasePlugin
 from . import parser_data
 
 
+def make_nutrition_table(metadata):
+    cols = [
+        Column(name, gourmand.backends.db.map_type_to_sqlalchemy(typ), **(name == "ndbno" and {"primary_key": True} or {}))
+        for lname, name, typ in parser_data.NUTRITION_FIELDS
+    ] + [Column("foodgroup", Text(), **{})]
+    return Table("nutrition", metadata, *cols)
+
+
+def make_usda_weights_table(metadata):
+    return Table(
+        "usda_weights",
+        metadata,
+        Column("id", Integer(), primary_key=True),
+        *[Column(name, gourmand.backends.db.map_type_to_sqlalchemy(typ), **{}) for lname, name, typ in parser_data.WEIGHT_FIELDS],
+    )
+
+
 class NutritionDataPlugin(DatabasePlugin):
 
     name = "nutritondata"
     version = 4
 
     def setup_usda_weights_table(self):
-        self.db.usda_weights_table = Table(
-            "usda_weights",
-            self.db.metadata,
-            Column("id", Integer(), primary_key=True),
-            *[Column(name, gourmand.backends.db.map_type_to_sqlalchemy(typ), **{}) for lname, name, typ in parser_data.WEIGHT_FIELDS],
-        )
+        self.db.usda_weights_table = make_usda_weights_table(self.db.metadata)
 
         class UsdaWeight(object):
             pass
@@ -58,14 +70,29 @@ class NutritionDataPlugin(DatabasePlugin):
     def do_add_nutrition(self, d):
         return self.db.do_add_and_return_item(self.db.nutrition_table, d, id_prop="ndbno")
 
+    def load_nutrition_database(self, filename):
+        """Copy the USDA tables from the nutrition database at filename,
+        as made by databaseGrabber.build_nutrition_database, into ours.
+
+        Rows already in our nutrition table are replaced; our USDA
+        weights are replaced wholesale.
+        """
+        with self.db.db.connect() as connection:
+            # SQLite refuses to ATTACH within a transaction, so we
+            # attach first and begin afterwards.
+            connection.exec_driver_sql("ATTACH DATABASE ? AS usda", (str(filename),))
+            try:
+                with connection.begin():
+                    connection.execute(self.db.usda_weights_table.delete())
+                    for table, verb in [(self.db.nutrition_table, "INSERT OR REPLACE"), (self.db.usda_weights_table, "INSERT")]:
+                        cols = ", ".join(c.name for c in table.columns if c.name != "id")
+                        connection.exec_driver_sql("%s INTO main.%s (%s) SELECT %s FROM usda.%s" % (verb, table.name, cols, cols, table.name))
+            finally:
+                connection.exec_driver_sql("DETACH DATABASE usda")
+
     def create_tables(self, *args):
         # print 'nutritional_information.data_plugin.create_tables()'
-        cols = [
-            Column(name, gourmand.backends.db.map_type_to_sqlalchemy(typ), **(name == "ndbno" and {"primary_key": True} or {}))
-            for lname, name, typ in parser_data.NUTRITION_FIELDS
-        ] + [Column("foodgroup", Text(), **{})]
-        # print 'nutrition cols:',cols
-        self.db.nutrition_table = Table("nutrition", self.db.metadata, *cols)
+        self.db.nutrition_table = make_nutrition_table(self.db.metadata)
 
         class Nutrition(object):
             pass
@@ -76,6 +103,7 @@ class NutritionDataPlugin(DatabasePlugin):
         self.setup_nutritionaliases_table()
         self.setup_nutritionconversions_table()
         self.db.do_add_nutrition = self.do_add_nutrition
+        self.db.load_nutrition_database = self.load_nutrition_database
 
     def update_version(self, gourmand_stored, plugin_stored, gourmand_current, plugin_current):
         if (gourmand_stored[0] == 0 and gourmand_stored[1] < 14) or (plugin_stored < 1):
@@ -1,17 +1,38 @@
+import csv
+import io
 import re
 import tempfile
 import urllib.request
 import zipfile
+from pathlib import Path
 from pkgutil import get_data
 
+import sqlalchemy
+
 from gourmand.gdebug import TimeAction
 from gourmand.i18n import _
 
+from .data_plugin import make_nutrition_table, make_usda_weights_table
 from .parser_data import ABBREVS, ABBREVS_STRT, FOOD_GROUPS, NUTRITION_FIELDS, WEIGHT_FIELDS
 
+# The nutrition and usda_weights tables, ready made by
+# build_nutrition_database when Gourmand is built.
+NUTRITION_DATABASE = Path(__file__).parent.parent.parent / "data" / "nutrition.sqlite"
+
 expander_regexp = None
 
 
+class USDADialect(csv.Dialect):
+    """The USDA's data files: fields split on ^, text between ~s."""
+
+    delimiter = "^"
+    quotechar = "~"
+    doublequote = False
+    lineterminator = "\r\n"
+    quoting = csv.QUOTE_MINIMAL
+    skipinitialspace = False
+
+
 def compile_expander_regexp():
     regexp = r"(?<!\w)("
     regexp += "|".join(list(ABBREVS.keys()))
@@ -35,6 +56,85 @@ def expand_abbrevs(line):
     return line
 
 
+def read_usda_file(data, field_defs):
+    """Return the field names and lines of USDA data file data (bytes).
+
+    field_defs is as for DatabaseGrabber.parse_line, which we agree
+    with: empty numbers become None. Types are converted a column at a
+    time, and each line is returned as a list of its fields.
+    """
+    # TODO: Convert the USDA files to UTF-8
+    lines = csv.reader(io.StringIO(data.decode("iso-8859-1")), USDADialect)
+    names, columns = [], []
+    for (lname, sname, typ), column in zip(field_defs, zip(*lines)):
+        if typ == "float":
+            column = [float(v) if v else None for v in column]
+        elif typ == "int":
+            column = [int(float(v)) if v else None for v in column]
+        names.append(sname)
+        columns.append(column)
+    return names, [list(row) for row in zip(*columns)]
+
+
+def read_usda_data(show_progress=None):
+    """Return the field names and lines of our packaged USDA nutrition
+    and weight data, ready for the nutrition and usda_weights tables."""
+    if show_progress:
+        show_progress(0.03, _("Parsing nutritional data..."))
+    # TODO: Convert FOOD_DES.txt to UTF-8
+    groups = get_data("gourmand", "data/%s" % DatabaseGrabber.DESC_FILE_NAME).decode("iso-8859-1")
+    foodgroups_by_ndbno = {int(flds[0]): int(flds[1]) for flds in csv.reader(io.StringIO(groups), USDADialect)}
+    nutrition_names, nutrition = read_usda_file(get_data("gourmand", "data/%s" % DatabaseGrabber.ABBREV_FILE_NAME), NUTRITION_FIELDS)
+    ndbno, desc = nutrition_names.index("ndbno"), nutrition_names.index("desc")
+    nutrition_names.append("foodgroup")
+    for row in nutrition:
+        row[desc] = expand_abbrevs(row[desc])
+        row.append(FOOD_GROUPS[foodgroups_by_ndbno[row[ndbno]]])
+    if show_progress:
+        show_progress(0.5, _("Parsing weight data..."))
+    weight_names, weights = read_usda_file(get_data("gourmand", "data/%s" % DatabaseGrabber.WEIGHT_FILE_NAME), WEIGHT_FIELDS)
+    # We have never stored the standard deviation.
+    stdev = weight_names.index("stdev")
+    for row in weights:
+        row[stdev] = None
+    return (nutrition_names, nutrition), (weight_names, weights)
+
+
+def load_usda_data(connection, nutrition_table, usda_weights_table, show_progress=None):
+    """Fill nutrition_table and usda_weights_table from our packaged USDA data.
+
+    Everything is written within one transaction, with one executemany
+    per table. Rows already in nutrition_table are replaced, as are all
+    of our USDA weights.
+    """
+    data = read_usda_data(show_progress)
+    if show_progress:
+        show_progress(0.8, _("Saving nutritional data..."))
+    with connection.begin():
+        connection.execute(usda_weights_table.delete())
+        for (table, verb), (names, rows) in zip([(nutrition_table, "INSERT OR REPLACE"), (usda_weights_table, "INSERT")], data):
+            # Straight to the driver: SQLAlchemy would make a dictionary
+            # of every row's parameters.
+            SQL = "%s INTO %s (%s) VALUES (%s)" % (verb, table.name, ", ".join(names), ", ".join(["?"] * len(names)))
+            connection.exec_driver_sql(SQL, list(map(tuple, rows)))
+
+
+def build_nutrition_database(filename):
+    """Create a database at filename holding only our USDA tables, for
+    NutritionDataPlugin.load_nutrition_database."""
+    filename = Path(filename)
+    if filename.exists():
+        filename.unlink()
+    engine = sqlalchemy.create_engine("sqlite:///%s" % filename)
+    metadata = sqlalchemy.MetaData()
+    nutrition_table = make_nutrition_table(metadata)
+    usda_weights_table = make_usda_weights_table(metadata)
+    metadata.create_all(engine)
+    with engine.connect() as connection:
+        load_usda_data(connection, nutrition_table, usda_weights_table)
+    engine.dispose()
+
+
 class DatabaseGrabber:
     USDA_ZIP_URL = "http://www.nal.usda.gov/fnic/foodcomp/Data/SR17/dnload/sr17abbr.zip"
     ABBREV_FILE_NAME = "ABBREV.txt"
@@ -88,6 +188,18 @@ class DatabaseGrabber:
         self.parse_weightfile(weights)
 
     def grab_data(self) -> None:
+        self.db.changed = True
+        if NUTRITION_DATABASE.exists():
+            if self.show_progress:
+                self.show_progress(0.03, _("Copying nutritional data..."))
+            self.db.load_nutrition_database(NUTRITION_DATABASE)
+        else:
+            with self.db.db.connect() as connection:
+                load_usda_data(connection, self.db.nutrition_table, self.db.usda_weights_table, self.show_progress)
+
+    def grab_data_line_by_line(self) -> None:
+        """Load our USDA data a line at a time, as we did before
+        load_usda_data."""
         self.db.changed = True
         self.get_groups()
         self.get_abbrev()
@@ -198,20 +310,9 @@ class DatabaseGrabber:
 
 
 if __name__ == "__main__":
-    tot_prog = 0
-
-    def show_prog(perc, msg):
-        perc = perc * 100
-        if perc - tot_prog:
-            print("|" * int(perc - tot_prog))
-
-    print("getting our recipe database")
-    import gourmand.recipeManager
-
-    db = gourmand.recipeManager.RecipeManager(**gourmand.recipeManager.dbargs)
-    print("getting our grabber ready")
-    grabber = DatabaseGrabber(db, show_prog)
-    print("grabbing recipes!")
-    grabber.grab_data("/home/tom/Projects/grm/data/")
-    # grabber.parse_weightfile(open('/home/tom/Projects/grm/data/WEIGHT.txt','r'))
-    # grabber.get_weight('/home/tom/Projects/nutritional_data/WEIGHT.txt')
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the ready-made nutrition database shipped with Gourmand.")
+    parser.add_argument("filename", nargs="?", default=str(NUTRITION_DATABASE))
+    args = parser.parse_args()
+    build_nutrition_database(args.filename)
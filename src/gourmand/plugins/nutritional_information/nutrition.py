@@ -1,9 +1,21 @@
+import operator
 import re
 import sys
-from typing import List, Tuple
+from array import array
+from collections import defaultdict
+from typing import Dict, List, Tuple
 
 from .parser_data import SUMMABLE_FIELDS
 
+# Where each summable field is found in our nutrient vectors.
+SUMMABLE_INDEX = {field: n for n, field in enumerate(SUMMABLE_FIELDS)}
+get_summable_fields = operator.attrgetter(*SUMMABLE_FIELDS)
+
+
+def nutrient_vector(row):
+    """Return the summable fields of a nutrition row as an array in SUMMABLE_FIELDS order."""
+    return array("d", [n or 0 for n in get_summable_fields(row)])
+
 # Our basic module for interaction with our nutritional information DB
 
 
@@ -14,24 +26,62 @@ class NutritionData:
     ingredient-keys and our nutritional data.
     """
 
+    # The caches we keep of what we read from the nutrition tables:
+    # alias: ingkey -> nutritionaliases row
+    # desc: description -> nutrition row
+    # nutrition: ndbno -> nutrition row
+    # gramweights: ndbno -> get_gramweights()
+    # conversions: ndbno -> get_conversions()
+    # densities: ndbno -> densities from usda_weights
+    # custom_conversions: ingkey -> [(unit, factor), ...] from nutritionconversions
+    # vectors: ndbno -> nutrient_vector() of the nutrition row
+    CACHES = ("alias", "desc", "nutrition", "gramweights", "conversions", "densities", "custom_conversions", "vectors")
+
     def __init__(self, db, conv):
         self.db = db
         self.conv = conv
         self.gramwght_regexp = re.compile("([0-9.]+)?( ?([^,]+))?(, (.*))?")
         self.wght_breaker = re.compile(r"([^ ,]+)([, ]+\(?(.*)\)?)?$")
+        self.caches: Dict[str, dict] = {name: {} for name in self.CACHES}
+        self.cache_hits: Dict[str, int] = defaultdict(int)
+        self.cache_misses: Dict[str, int] = defaultdict(int)
+
+    def _cached(self, cache, key, fetch):
+        """Return fetch(key), remembering the result in cache."""
+        try:
+            ret = self.caches[cache][key]
+        except KeyError:
+            self.cache_misses[cache] += 1
+            ret = self.caches[cache][key] = fetch(key)
+        else:
+            self.cache_hits[cache] += 1
+        return ret
+
+    def clear_cache(self):
+        """Forget everything we have read from the nutrition tables.
+
+        The setters below keep our caches up to date themselves: this is
+        only needed after changing the tables some other way.
+        """
+        for cache in self.caches.values():
+            cache.clear()
+
+    def get_cache_stats(self):
+        """Return {cache: (hits, misses, hit rate)}."""
+        ret = {}
+        for name in self.CACHES:
+            hits, misses = self.cache_hits[name], self.cache_misses[name]
+            ret[name] = (hits, misses, hits / (hits + misses) if hits + misses else 0.0)
+        return ret
 
     def set_key(self, key, row):
         """Create an automatic equivalence for ingredient key 'key' and nutritional DB row ROW"""
-        if not row:
-            row = self._get_key(key)
-        # density=self.get_density(key,row)
         if row:
-            self.row.ndbno = row.ndbno
-        else:
-            self.db.do_add(self.db.nutritionaliases_table, {"ndbno": row.ndbno, "ingkey": key})
+            self.set_key_from_ndbno(key, row.ndbno)
 
     def set_density_for_key(self, key, density_equivalent):
         self.db.update_by_criteria(self.db.nutritionaliases_table, {"ingkey": key}, {"density_equivalent": density_equivalent})
+        self.caches["alias"].pop(key, None)
 
     def set_key_from_ndbno(self, key, ndbno):
         """Create an automatic equivalence between ingredient key 'key' and ndbno
@@ -43,6 +93,7 @@ class NutritionData:
             self.db.do_modify(self.db.nutritionaliases_table, prev_association, {"ndbno": ndbno}, "ingkey")
         else:
             self.db.do_add(self.db.nutritionaliases_table, {"ndbno": ndbno, "ingkey": key})
+        self.caches["alias"].pop(key, None)
 
     def set_conversion(self, key, unit, factor):
         """Set conversion for ingredient key.
@@ -56,6 +107,7 @@ class NutritionData:
             self.db.do_modify(self.db.nutritionconversions_table, prev_entry, {"factor": factor})
         else:
             self.db.do_add(self.db.nutritionconversions_table, {"ingkey": key, "unit": unit, "factor": factor})
+        self.caches["custom_conversions"].pop(key, None)
 
     def get_matches(self, key: str) -> List[Tuple[str, int]]:
         """Handed a string, get a list of likely USDA database matches.
@@ -77,8 +129,20 @@ class NutritionData:
     def _get_key(self, key):
         """Handed an ingredient key, get our nutritional Database equivalent
         if one exists."""
-        row = self.db.fetch_one(self.db.nutritionaliases_table, **{"ingkey": str(key)})
-        return row
+        return self._cached("alias", str(key), lambda k: self.db.fetch_one(self.db.nutritionaliases_table, ingkey=k))
+
+    def _get_nutrition_row(self, ndbno):
+        return self._cached("nutrition", ndbno, lambda n: self.db.fetch_one(self.db.nutrition_table, ndbno=n))
+
+    def _make_nutinfo(self, row):
+        """Return a NutritionInfo for row, sharing one vector between every NutritionInfo for the same row."""
+        return NutritionInfo(row, vector=self._cached("vectors", row.ndbno, lambda n: nutrient_vector(row)))
+
+    def _get_custom_conversions(self, key):
+        """Return [(unit, factor), ...] from our custom conversions for key."""
+        return self._cached(
+            "custom_conversions", key, lambda k: [(conv.unit, conv.factor) for conv in self.db.fetch_all(self.db.nutritionconversions_table, ingkey=k)]
+        )
 
     def get_nutinfo_for_ing(self, ing, rd, multiplier=None):
         """A convenience function that grabs the requisite items from
@@ -119,15 +183,19 @@ class NutritionData:
         return NutritionVapor(self, key, rowref=ni, amount=amt, unit=unit, ingObject=ingObject)
 
     def get_nutinfo_from_desc(self, desc):
+        nvrow = self._cached("desc", desc, self._get_row_from_desc)
+        if nvrow:
+            return self._make_nutinfo(nvrow)
+
+    def _get_row_from_desc(self, desc):
         nvrow = self.db.fetch_one(self.db.nutrition_table, **{"desc": desc})
         if nvrow:
-            return NutritionInfo(nvrow)
+            return nvrow
         if desc:
             matches = self.get_matches(desc)
             if len(matches) == 1:
                 ndbno = matches[0][1]
-                nvrow = self.db.fetch_one(self.db.nutrition_table, ndbno=ndbno)
-                return NutritionInfo(nvrow)
+                return self._get_nutrition_row(ndbno)
 
     def get_nutinfo(self, key):
         """Get our nutritional information for ingredient key 'key'
@@ -136,9 +204,9 @@ class NutritionData:
         """
         aliasrow = self._get_key(key)
         if aliasrow:
-            nvrow = self.db.fetch_one(self.db.nutrition_table, **{"ndbno": aliasrow.ndbno})
+            nvrow = self._get_nutrition_row(aliasrow.ndbno)
             if nvrow:
-                return NutritionInfo(nvrow)
+                return self._make_nutinfo(nvrow)
         else:
             # See if the key happens to match an existing description...
             ni = self.get_nutinfo_from_desc(key)
@@ -213,16 +281,17 @@ class NutritionData:
                 unit = self.conv.unit_dict[unit]
             elif not unit:
                 unit = ""
-            lookup = self.db.fetch_one(self.db.nutritionconversions_table, ingkey=key, unit=unit)
+            custom_conversions = self._get_custom_conversions(key)
+            lookup = [factor for conv_unit, factor in custom_conversions if conv_unit == unit]
             if lookup:
-                cnv = lookup.factor
+                cnv = lookup[0]
             else:
                 # otherwise, cycle through any units we have and see
                 # if we can get a conversion via those units...
-                for conv in self.db.fetch_all(self.db.nutritionconversions_table, ingkey=key):
-                    factor = self.conv.converter(unit, conv.unit)
+                for conv_unit, conv_factor in custom_conversions:
+                    factor = self.conv.converter(unit, conv_unit)
                     if factor:
-                        cnv = conv.factor * factor
+                        cnv = conv_factor * factor
         if cnv:
             return (0.01 * amt) / cnv
 
@@ -239,6 +308,10 @@ class NutritionData:
             row = self.get_nutinfo(key)
         if not row:
             return {}, {}
+        densities, units = self._cached("conversions", row.ndbno, lambda ndbno: self._get_conversions(row))
+        return dict(densities), dict(units)
+
+    def _get_conversions(self, row):
         units = {}
         densities = {}
         for gd, gw in list(self.get_gramweights(row).items()):
@@ -271,23 +344,29 @@ class NutritionData:
         if key in self.conv.density_table:
             return {"": self.conv.density_table[key]}
         else:
-            densities = {}
-            for gd, gw in list(self.get_gramweights(row).items()):
-                a, u, e = gd
-                if not a:
-                    continue
-                convfactor = self.conv.converter(u, "ml")
-                if convfactor:  # if we are a volume
-                    # divide mass by volume converted to milileters
-                    # (gramwts are in grams)
-                    density = float(gw) / (a * convfactor)
-                    densities[e] = density
-            return densities
+            return dict(self._cached("densities", row.ndbno, lambda ndbno: self._get_densities(row)))
+
+    def _get_densities(self, row):
+        densities = {}
+        for gd, gw in list(self.get_gramweights(row).items()):
+            a, u, e = gd
+            if not a:
+                continue
+            convfactor = self.conv.converter(u, "ml")
+            if convfactor:  # if we are a volume
+                # divide mass by volume converted to milileters
+                # (gramwts are in grams)
+                density = float(gw) / (a * convfactor)
+                densities[e] = density
+        return densities
 
     def get_gramweights(self, row):
         """Return a dictionary with gram weights."""
+        return self._cached("gramweights", row.ndbno, lambda ndbno: self._get_gramweights(ndbno))
+
+    def _get_gramweights(self, ndbno):
         ret = {}
-        nutweights = self.db.fetch_all(self.db.usda_weights_table, **{"ndbno": row.ndbno})
+        nutweights = self.db.fetch_all(self.db.usda_weights_table, **{"ndbno": ndbno})
         for nw in nutweights:
             mtch = self.wght_breaker.match(nw.unit)
             if not mtch:
@@ -333,7 +412,12 @@ class NutritionData:
         """Add custom nutritional information."""
         # new_ndbno = self.db.increment_field(self.db.nutrition_table,'ndbno')
         # if new_ndbno: nutrition_dictionary['ndbno']=new_ndbno
-        return self.db.do_add_nutrition(nutrition_dictionary).ndbno
+        ndbno = self.db.do_add_nutrition(nutrition_dictionary).ndbno
+        # Descriptions we could not find before may match the new row.
+        self.caches["desc"].clear()
+        self.caches["nutrition"].pop(ndbno, None)
+        self.caches["vectors"].pop(ndbno, None)
+        return ndbno
 
 
 class NutritionInfo:
@@ -369,11 +453,24 @@ class NutritionInfo:
     (Carrot + Eggplant).desc => 'CARROTS,RAW, EGGPLANT,RAW'
     """
 
-    def __init__(self, rowref, mult=1, fudged=False, ingObject=None):
+    def __init__(self, rowref, mult=1, fudged=False, ingObject=None, vector=None):
         self.__rowref__ = rowref
         self.__mult__ = mult
         self.__fudged__ = fudged
         self.__ingobject__ = ingObject
+        self.__vector__ = vector
+
+    def _get_vector(self):
+        """Return the summable fields of our row, unmultiplied, as an array in SUMMABLE_FIELDS order."""
+        if self.__vector__ is None:
+            if isinstance(self.__rowref__, NutritionInfo):
+                # We wrap another NutritionInfo, as get_nutinfo_for_item does.
+                mult = self.__rowref__.__mult__
+                vector = self.__rowref__._get_vector()
+                self.__vector__ = vector if mult == 1 else array("d", [n * mult for n in vector])
+            else:
+                self.__vector__ = nutrient_vector(self.__rowref__)
+        return self.__vector__
 
     def __getattr__(self, attr):
         if attr[0] != "_":
@@ -397,7 +494,7 @@ class NutritionInfo:
             return NutritionInfoList([self] + obj.__nutinfos__)
 
     def __mul__(self, n):
-        return NutritionInfo(self.__rowref__, mult=self.__mult__ * n, fudged=self.__fudged__, ingObject=self.__ingobject__)
+        return NutritionInfo(self.__rowref__, mult=self.__mult__ * n, fudged=self.__fudged__, ingObject=self.__ingobject__, vector=self.__vector__)
 
 
 KEY_VAPOR = 0  # when we don't have a key
@@ -489,16 +586,40 @@ class NutritionInfoList(list, NutritionInfo):
         # self.__getitem__ = self.__nutinfos__.__getitem__
         self.__mult__ = 1
         self.__ingobject__ = ingObject
+        # Our summed fields, worked out the first time one is asked
+        # for. _reset throws them away again.
+        self.__totals__ = None
+
+    def _get_weighted_vectors(self, weight=1):
+        """Yield (multiplier, vector) for every NutritionInfo we contain, including those in embedded lists."""
+        weight = weight * (self.__mult__ or 1)
+        for ni in self.__nutinfos__:
+            if isinstance(ni, NutritionVapor):
+                continue
+            elif isinstance(ni, NutritionInfoList):
+                yield from ni._get_weighted_vectors(weight)
+            else:
+                yield weight * ni.__mult__, ni._get_vector()
+
+    def _get_totals(self):
+        """Return our summable fields, summed, as an array in SUMMABLE_FIELDS order."""
+        if self.__totals__ is None:
+            weights, vectors = [], []
+            for weight, vector in self._get_weighted_vectors():
+                weights.append(weight)
+                vectors.append(vector)
+            # The product of our weights with the matrix of our vectors,
+            # a column (one field of every row) at a time.
+            columns = zip(*vectors) if vectors else [()] * len(SUMMABLE_FIELDS)
+            self.__totals__ = array("d", [sum(map(operator.mul, weights, column)) for column in columns])
+        return self.__totals__
 
     def __getattr__(self, attr):
         if attr[0] != "_":
+            if attr in SUMMABLE_INDEX:
+                return self._get_totals()[SUMMABLE_INDEX[attr]]
             alist = [getattr(ni, attr) for ni in self.__nutinfos__]
-            if attr in SUMMABLE_FIELDS:
-                if self.__mult__:
-                    alist = [n * self.__mult__ for n in alist]
-                return sum(alist)
-            else:
-                return ", ".join(map(str, alist))
+            return ", ".join(map(str, alist))
         else:
             # somehow this magically gets us standard
             # attribute handling...
@@ -506,11 +627,14 @@ class NutritionInfoList(list, NutritionInfo):
 
     def _reset(self):
         """See if we can turn any of our vapor into matter."""
+        self.__totals__ = None
         for i in range(len(self.__nutinfos__)):
             obj = self.__nutinfos__[i]
             if isinstance(obj, NutritionVapor):
                 # try resetting
                 self.__nutinfos__[i] = obj._reset()
+            elif isinstance(obj, NutritionInfoList):
+                obj._reset()
 
     def _get_vapor(self):
         """Return a list of nutritionVapor if there is any
@@ -473,7 +473,7 @@ class RecCardDisplay(plugin_loader.Pluggable):
                     widgLab.hide()
 
     def update_image(self):
-        imagestring = self.current_rec.image
+        imagestring = self.rg.rd.get_image(self.current_rec)
         if imagestring is None:
             self.orig_pixbuf = None
             self.imageDisplay.hide()
@@ -960,11 +960,13 @@ class RecEditor(WidgetSaver.WidgetPrefs, plugin_loader.Pluggable):
         self.mainRecEditActionGroup.get_action("ShowRecipeCard").set_sensitive(True)
         self.new = False
         newdict = {"id": self.current_rec.id}
-        for m in self.modules:
-            newdict = m.save(newdict)
-        self.current_rec = self.rg.rd.modify_rec(self.current_rec, newdict)
-        self.rg.rd.update_hashes(self.current_rec)
-        self.rg.rmodel.update_recipe(self.current_rec)
+        # Ingredients and recipe are written in one commit, after
+        # which the modify hooks update our index.
+        with self.rg.rd.transaction():
+            for m in self.modules:
+                newdict = m.save(newdict)
+            self.current_rec = self.rg.rd.modify_rec(self.current_rec, newdict)
+            self.rg.rd.update_hashes(self.current_rec)
         if "title" in newdict:
             self.window.set_title(f"{self.edit_title} " f"{self.current_rec.title.strip()}")
         self.set_edited(False)
@@ -1390,8 +1392,9 @@ class ImageBox:
         debug("get_image (self, rec=None):", 5)
         if rec is None:
             rec = self.rc.current_rec
-        if rec.image:
-            self.set_from_bytes(rec.image)
+        image = self.rg.rd.get_image(rec)
+        if image:
+            self.set_from_bytes(image)
         else:
             self.image = None
             self.hide()
@@ -2026,17 +2029,18 @@ class IngredientController(plugin_loader.Pluggable):
 
         # end commit iter
 
-        while iter:
-            n = commit_iter(iter, n)
-            iter = self.imodel.iter_next(iter)
-        # Now delete all deleted ings...  (We're not *really* deleting
-        # them -- we're just setting a handy flag to delete=True. This
-        # makes Undo faster. It also would allow us to allow users to
-        # go back through their "ingredient Trash" if we wanted to put
-        # in a user interface for them to do so.
-        for i in deleted:
-            self.ingredient_objects.remove(i)
-        self.rg.rd.modify_ings(deleted, {"deleted": True})
+        with self.rg.rd.transaction():
+            while iter:
+                n = commit_iter(iter, n)
+                iter = self.imodel.iter_next(iter)
+            # Now delete all deleted ings...  (We're not *really* deleting
+            # them -- we're just setting a handy flag to delete=True. This
+            # makes Undo faster. It also would allow us to allow users to
+            # go back through their "ingredient Trash" if we wanted to put
+            # in a user interface for them to do so.
+            for i in deleted:
+                self.ingredient_objects.remove(i)
+            self.rg.rd.modify_ings(deleted, {"deleted": True})
 
 
 class IngredientTreeUI:
@@ -7,7 +7,7 @@ from gi.repository import Gdk, GdkPixbuf, GLib, GObject, Gtk, Pango
 from gourmand.i18n import _
 
 from . import Undo, convert
-from .backends.db import RecipeManager
+from .backends.db import RecipeManager, RecipeResults
 from .gdebug import debug
 from .gglobals import DEFAULT_HIDDEN_COLUMNS, INT_REC_ATTRS, REC_ATTRS
 from .gtk_extras import WidgetSaver, mnemonic_manager, pageable_store, ratingWidget
@@ -195,8 +195,8 @@ class RecIndex:
         self.last_search = {}
         # self.rvw = self.rd.fetch_all(self.rd.recipe_table,deleted=False)
         self.searches = self.default_searches[0:]
-        # List of entries in the `recipe` database table
-        self.rvw = self.rd.search_recipes(self.searches, sort_by=self.sort_by)  # List["RowProxy"]
+        # Entries in the `recipe` database table, fetched a page at a time
+        self.rvw = self.search_recipes(self.searches)
 
     def search_entry_activate_cb(self, *args):
         if self.rmodel._get_length_() == 1:
@@ -454,15 +454,23 @@ class RecIndex:
             srch["search"] = "%" + txt.replace("%", "%%") + "%"
         return srch
 
+    def search_recipes(self, searches) -> "RecipeResults":
+        """Return a lazy view of recipes matching searches, in our sort order.
+
+        Only the columns shown in the index are fetched, plus image_id
+        for looking up thumbnails.
+        """
+        return self.rd.lazy_search_recipes(searches, sort_by=self.sort_by, columns=RecipeModel.columns + ["image_id"])
+
     def do_search(self, txt, searchBy):
         if txt and searchBy:
             srch = self.make_search_dic(txt, searchBy)
             self.last_search = srch.copy()
-            self.update_rmodel(self.rd.search_recipes(self.searches + [srch], sort_by=self.sort_by))
+            self.update_rmodel(self.search_recipes(self.searches + [srch]))
         elif self.searches:
-            self.update_rmodel(self.rd.search_recipes(self.searches, sort_by=self.sort_by))
+            self.update_rmodel(self.search_recipes(self.searches))
         else:
-            self.update_rmodel(self.rd.fetch_all(self.recipe_table, deleted=False, sort_by=self.sort_by))
+            self.update_rmodel(self.search_recipes([{"column": "deleted", "operator": "=", "search": False}]))
 
     def limit_search(self, *args):
         debug("limit_search (self, *args):", 5)
@@ -603,10 +611,20 @@ class RecIndex:
         sel = self.rectree.get_selection()
         if sel:
             sel.selected_foreach(foreach, recs)
-            return recs
+            return self.get_full_recs(recs)
         else:
             return []
 
+    def get_full_recs(self, recs):
+        """Return whole recipes for rows from our model.
+
+        Our model only holds the columns the index shows.
+        """
+        if not recs:
+            return []
+        full_recs = {r.id: r for r in self.rd.fetch_all(self.rd.recipe_table, id=("in", [r.id for r in recs]))}
+        return [full_recs[r.id] for r in recs if r.id in full_recs]
+
     def selection_changedCB(self, *args):
         """We pass along true or false to selection_changed
         to say whether there is a selection or not."""
@@ -663,19 +681,26 @@ class RecipeModel(pageable_store.PageableViewStore):
 
     def __init__(self, vw, rd, per_page=None):
         self.rd = rd
+        # Categories by recipe ID, for the rows of the slice we're getting.
+        self.categories = {}
         pageable_store.PageableViewStore.__init__(self, vw, columns=self.columns, column_types=self.column_types, per_page=per_page)
         self.made_categories = False
 
     def _get_slice_(self, bottom, top):
         try:
-            return [[self._get_value_(r, col) for col in self.columns] for r in self.view[bottom:top]]
+            rows = self.view[bottom:top]
+            self.categories = self.rd.get_cats_many([r.id for r in rows])
+            return [[self._get_value_(r, col) for col in self.columns] for r in rows]
         except:
             print("_get_slice_ failed with", bottom, top)
             raise
 
     def _get_value_(self, row, attr):
         if attr == "category":
-            cats = self.rd.get_cats(row)
+            if row.id in self.categories:
+                cats = self.categories[row.id]
+            else:
+                cats = self.rd.get_cats(row)
             if cats:
                 return ", ".join(cats)
             else:
@@ -686,8 +711,9 @@ class RecipeModel(pageable_store.PageableViewStore):
         elif attr=="rec":
             return row
         elif attr == "thumb":
-            if row.thumb:
-                return bytes_to_pixbuf(row.thumb)
+            thumb = self.rd.get_thumb(row)
+            if thumb:
+                return bytes_to_pixbuf(thumb)
             else:
                 return None
         elif attr in INT_REC_ATTRS:
@@ -701,15 +727,18 @@ class RecipeModel(pageable_store.PageableViewStore):
 
     def update_recipe(self, recipe):
         """Handed a recipe (or a recipe ID), we update its display if visible."""
-        debug("Updating recipe %s" % recipe.title, 3)
         if not isinstance(recipe, int):
             recipe = recipe.id  # make recipe == id
+        debug("Updating recipe %s" % recipe, 3)
         for n, row in enumerate(self):
             debug("Looking at row", 3)
             if row[0].id == recipe:
                 indx = int(n + (self.page * self.per_page))
                 # update parent
-                self.parent_list[indx] = self.rd.fetch_one(self.rd.recipe_table, id=recipe)
+                if isinstance(self.parent_list, RecipeResults):
+                    self.parent_list[indx] = self.parent_list.fetch_row(recipe)
+                else:
+                    self.parent_list[indx] = self.rd.fetch_one(self.rd.recipe_table, id=recipe)
                 # update self
                 self.update_iter(row.iter)
                 debug("updated row -- breaking", 3)
@@ -11,6 +11,7 @@ functions.
 
 """
 
+import array
 import difflib
 import hashlib
 import re
@@ -23,7 +24,7 @@ from gourmand.i18n import _
 
 from .gglobals import REC_ATTRS, TEXT_ATTR_DIC
 
-IMAGE_ATTRS = ["image", "thumb"]
+IMAGE_ATTRS = ["image_id"]
 ALL_ATTRS = [r[0] for r in REC_ATTRS] + list(TEXT_ATTR_DIC.keys()) + IMAGE_ATTRS
 REC_FIELDS = [
     "title",
@@ -93,6 +94,110 @@ def hash_recipe(rec, rd, conv=None):
     return rechash, inghash
 
 
+# Near-duplicate stuff
+
+# Recipes are near-duplicates when at least this share of their tokens
+# (see get_recipe_tokens) are the same.
+NEAR_DUPLICATE_THRESHOLD = 0.7
+# MinHash signatures are MINHASH_SIZE values long, cut into LSH_BANDS
+# bands. With bands of 4 values, recipes 0.7 alike share a band 99% of
+# the time, and recipes 0.3 alike 12% of the time.
+MINHASH_SIZE = 64
+LSH_BANDS = 16
+
+
+def get_recipe_tokens(title, ings, conv):
+    """Return the set of words in title, ingredient keys and
+    standardized ingredients that near-duplicates will share."""
+    tokens = set("title:" + word for word in re.findall(r"\w+", (title or "").lower()))
+    for i in ings:
+        tokens.add("key:" + (i.ingkey or i.item or "").lower())
+        tokens.add("ing:" + standardize_ingredient(i, conv))
+    return tokens
+
+
+def hash_token(token):
+    return int.from_bytes(hashlib.blake2b(token.encode("utf8"), digest_size=8).digest(), "little")
+
+
+def get_minhash(hashes, size=MINHASH_SIZE):
+    """Return the MinHash signature of a set of token hashes.
+
+    Rather than hashing every token size times over, we hash each once
+    and keep the smallest hash to fall in each of size bins (one
+    permutation hashing). Empty bins borrow from the next full bin
+    along, so that similar sets still agree on most of the signature.
+    """
+    bins = [None] * size
+    for h in hashes:
+        n, value = h % size, h // size
+        if bins[n] is None or value < bins[n]:
+            bins[n] = value
+    signature = list(bins)
+    for n in range(size):
+        if bins[n] is None:
+            distance = 1
+            while bins[(n + distance) % size] is None:
+                distance += 1
+            # Above any real value, which is at most 64 bits.
+            signature[n] = bins[(n + distance) % size] + distance * 2**64
+    return signature
+
+
+def get_similarity(hashes1, hashes2):
+    """Return the Jaccard similarity of two sets of token hashes."""
+    shared = len(set(hashes1).intersection(hashes2))
+    return shared / (len(hashes1) + len(hashes2) - shared)
+
+
+class NearDuplicateFinder:
+    """Group recipes whose tokens are at least threshold alike.
+
+    Recipes are added one at a time. Their MinHash signatures are cut
+    into bands, and a recipe is only compared with the first recipe to
+    fall in the same bucket as it for some band (locality-sensitive
+    hashing), so that finding every group takes near-linear rather than
+    quadratic time. Comparisons use the token sets themselves, so that
+    chance collisions are never reported.
+    """
+
+    def __init__(self, threshold=NEAR_DUPLICATE_THRESHOLD, bands=LSH_BANDS, size=MINHASH_SIZE):
+        self.threshold = threshold
+        self.size = size
+        self.rows = size // bands
+        self.buckets = [{} for band in range(bands)]
+        # key -> sorted token hashes
+        self.hashes = {}
+        # key -> key of a recipe in the same group, for the keys in groups
+        self.parents = {}
+
+    def add(self, key, tokens):
+        hashes = array.array("Q", sorted(set(hash_token(t) for t in tokens)))
+        if not hashes:
+            return
+        self.hashes[key] = hashes
+        signature = get_minhash(hashes, self.size)
+        for band, buckets in enumerate(self.buckets):
+            first = buckets.setdefault(hash(tuple(signature[band * self.rows : (band + 1) * self.rows])), key)
+            if first != key and self.find(first) != self.find(key) and get_similarity(self.hashes[first], hashes) >= self.threshold:
+                self.parents[self.find(key)] = self.find(first)
+
+    def find(self, key):
+        self.parents.setdefault(key, key)
+        while self.parents[key] != key:
+            self.parents[key] = self.parents[self.parents[key]]
+            key = self.parents[key]
+        return key
+
+    def get_groups(self):
+        """Return lists of the keys of near-duplicates, in the order they were added."""
+        groups = {}
+        for key in self.hashes:
+            if key in self.parents:
+                groups.setdefault(self.find(key), []).append(key)
+        return [keys for keys in groups.values() if len(keys) > 1]
+
+
 # Diff stuff
 
 
@@ -429,7 +429,7 @@ class IngredientAndPantryList:
         debug("resetSL (self):", 5)
         if not hasattr(self, "cats_setup") or not self.cats_setup:
             self.setup_category_ui()
-        self.data, self.pantry = self.organize_list(self.lst)
+        self.data, self.pantry = self.organize_totals()
         self.slMod = self.createIngModel(self.data)
         self.pMod = self.createIngModel(self.pantry)
         self.slTree.set_model(self.slMod)
@@ -819,11 +819,14 @@ class ShopGui(ShoppingList, plugin_loader.Pluggable, IngredientAndPantryList):
             last_val = val
             iter = mod.iter_next(iter)
 
-    def reset(self):
-        self.grabIngsFromRecs(list(self.recs.values()), self.extras)
+    def refresh(self):
         self.resetSL()
         self.rectree.set_model(self.create_rmodel())
 
+    def reset(self):
+        self.grabIngsFromRecs(list(self.recs.values()), self.extras)
+        self.refresh()
+
     # Callbacks
     def hide(self, *args):
         self.w.hide()
@@ -838,8 +841,9 @@ class ShopGui(ShoppingList, plugin_loader.Pluggable, IngredientAndPantryList):
         if selectedRecs:
             for t in selectedRecs:
                 self.recs.__delitem__(t.id)
+                self.aggregator.remove(t.id)
                 debug("clear removed %s" % t, 3)
-            self.reset()
+            self.refresh()
         elif de.getBoolean(label=_("No recipes selected. Do you want to clear the entire list?"), cancel=False):
             self.recs = {}
             self.extras = []
@@ -892,11 +896,9 @@ class ShopGui(ShoppingList, plugin_loader.Pluggable, IngredientAndPantryList):
         dct = get_recipe_manager().parse_ingredient(txt)
         if not dct:
             dct = {"amount": None, "unit": None, "item": txt}
-        self.extras.append([dct.get("amount"), dct.get("unit"), dct.get("item")])
         # Make sure it doesn't end up in the pantry...
         self.sh.remove_from_pantry(dct.get("item"))
-        self.grabIngsFromRecs(list(self.recs.values()), self.extras)
-        self.resetSL()
+        self.addExtra([dct.get("amount"), dct.get("unit"), dct.get("item")])
         self.add_entry.set_text("")
 
     def category_changed(self, *args):
@@ -34,17 +34,12 @@ class Shopper:
         self.init_pantry()
         self.mypantry = {}
         for a, u, k in inglist:
-            if self.pantry.has_key(k) and self.pantry[k]:
+            if k in self.pantry and self.pantry[k]:
                 # print "%s is in pantry" %k
                 dic = self.mypantry
             else:
                 dic = self.dic
-            try:
-                a = float(a)
-            except Exception:
-                if not isinstance(a, tuple):
-                    debug("Warning, can't make sense of amount %s; reading as None" % a, 0)
-                    a = None
+            a = read_amount(a)
             if k in dic:
                 dic[k].append([a, u])
             else:
@@ -156,7 +151,7 @@ class Shopper:
         if not dic:
             pass
         for i, a in list(dic.items()):
-            if self.orgdic.has_key(i) and self.orgdic[i]:
+            if i in self.orgdic and self.orgdic[i]:
                 c = self.orgdic[i]
             else:
                 c = _("Unknown")
@@ -223,6 +218,197 @@ class Shopper:
         return self.orgcats
 
 
+def read_amount(a):
+    """Return amount a as a float, a tuple (for a range) or None."""
+    try:
+        return float(a)
+    except Exception:
+        if not isinstance(a, tuple):
+            debug("Warning, can't make sense of amount %s; reading as None" % a, 0)
+            return None
+        return a
+
+
+class AmountTotal:
+    """The running total of one ingredient in one kind of unit.
+
+    low and high are the total in base units of the unit's dimension
+    (high differs from low when ranges were added); amounts holds the
+    [amount, unit] pairs that went into the total.
+    """
+
+    def __init__(self):
+        self.low = 0
+        self.high = 0
+        self.ranges = 0
+        self.amounts = []
+
+
+class ShoppingAggregator:
+    """Add up the ingredients of the recipes on a shopping list as they come and go.
+
+    Amounts of an ingredient are kept as running totals, one for each
+    dimension their units convert in (volume, mass...) plus one for
+    each unit the converter doesn't know, so that adding, removing or
+    rescaling a recipe only touches that recipe's ingredients. dic
+    maps ingredient keys to lists of [amount, unit] as Shopper.dic does,
+    and only the keys a change touches are worked out again.
+
+    Amounts that would need the ingredient's density to add up (a cup
+    and a few grams of flour) are listed separately.
+    """
+
+    def __init__(self, conv=None):
+        self.cnv = conv or convert.get_converter()
+        # recipe -> (ingredients at a multiplier of 1, multiplier, [(key, total key, amount, unit)...])
+        self.recipes = {}
+        # ingredient key -> {total key: AmountTotal}, in display order
+        self.totals = {}
+        self.dic = {}
+        self.serial = 0
+
+    def add(self, recipe, ingredients, mult=1):
+        """Add [amount, unit, key] ingredients for recipe, multiplied by mult."""
+        if recipe in self.recipes:
+            self.remove(recipe)
+        contributions = []
+        touched = set()
+        for a, u, k in ingredients:
+            a = self.scale_amount(read_amount(a), mult)
+            contributions.append((k, self.add_amount(k, a, u), a, u))
+            touched.add(k)
+        self.recipes[recipe] = (ingredients, mult, contributions)
+        self.update_dic(touched)
+
+    def remove(self, recipe):
+        """Take recipe's ingredients off the list."""
+        ingredients, mult, contributions = self.recipes.pop(recipe)
+        touched = set()
+        for k, total_key, a, u in contributions:
+            total = self.totals[k][total_key]
+            total.amounts.remove([a, u])
+            if not total.amounts:
+                del self.totals[k][total_key]
+                if not self.totals[k]:
+                    del self.totals[k]
+            else:
+                low, high = self.get_base_amounts(a, u)
+                total.low -= low
+                total.high -= high
+                if isinstance(a, tuple):
+                    total.ranges -= 1
+            touched.add(k)
+        self.update_dic(touched)
+        return ingredients, mult
+
+    def rescale(self, recipe, mult):
+        """Change the multiplier of a recipe we already have.
+
+        Unlike removing and adding the recipe again, this keeps the
+        order of the amounts of each ingredient.
+        """
+        ingredients, old_mult, contributions = self.recipes[recipe]
+        rescaled = []
+        touched = set()
+        for ingredient, (k, total_key, old_a, u) in zip(ingredients, contributions):
+            a = self.scale_amount(read_amount(ingredient[0]), mult)
+            total = self.totals[k][total_key]
+            total.amounts[total.amounts.index([old_a, u])] = [a, u]
+            if total_key[0] != "alone":
+                old_low, old_high = self.get_base_amounts(old_a, u)
+                low, high = self.get_base_amounts(a, u)
+                total.low += low - old_low
+                total.high += high - old_high
+            rescaled.append((k, total_key, a, u))
+            touched.add(k)
+        self.recipes[recipe] = (ingredients, mult, rescaled)
+        self.update_dic(touched)
+
+    @staticmethod
+    def scale_amount(a, mult):
+        if mult == 1 or not a:
+            return a
+        if isinstance(a, tuple):
+            return (a[0] * mult, a[1] * mult)
+        return a * mult
+
+    def get_factor(self, u):
+        """Return how many base units of its dimension there are in unit u."""
+        unit = self.cnv.unit_dict.get(u, u)
+        if unit in self.cnv.unit_factors:
+            return self.cnv.unit_factors[unit][1]
+        return 1
+
+    def get_base_amounts(self, a, u):
+        """Return the low and high amount of a u in base units."""
+        factor = self.get_factor(u)
+        if isinstance(a, tuple):
+            return a[0] * factor, a[1] * factor
+        return a * factor, a * factor
+
+    def get_total_key(self, a, u):
+        if not a or (isinstance(a, tuple) and not (a[0] and a[1])):
+            # Like Converter.add_reasonably, we don't add up missing amounts
+            self.serial += 1
+            return ("alone", self.serial)
+        unit = self.cnv.unit_dict.get(u, u)
+        if unit in self.cnv.unit_factors:
+            return ("dimension", self.cnv.unit_factors[unit][0])
+        return ("unit", u)
+
+    def add_amount(self, k, a, u):
+        totals = self.totals.setdefault(k, {})
+        total_key = self.get_total_key(a, u)
+        if total_key in totals:
+            # As in Shopper, amounts we add to move to the end of the list
+            total = totals.pop(total_key)
+        else:
+            total = AmountTotal()
+        totals[total_key] = total
+        total.amounts.append([a, u])
+        if total_key[0] != "alone":
+            low, high = self.get_base_amounts(a, u)
+            total.low += low
+            total.high += high
+            if isinstance(a, tuple):
+                total.ranges += 1
+        return total_key
+
+    def update_dic(self, keys):
+        for k in keys:
+            if k in self.totals:
+                self.dic[k] = [self.format_total(total) for total in self.totals[k].values()]
+            elif k in self.dic:
+                del self.dic[k]
+
+    def readable_amount(self, amount, units):
+        """Return the most readable [amount, unit] for amount base units."""
+        best = None
+        for u in units:
+            a = amount / self.get_factor(u)
+            score = self.cnv.readability_score(a)
+            if best is None or score > best[0]:
+                best = (score, a, u)
+        return self.cnv.adjust_unit(best[1], best[2], favor_current_unit=False)
+
+    def format_total(self, total):
+        if len(total.amounts) == 1:
+            return list(total.amounts[0])
+        units = []
+        for a, u in total.amounts:
+            if u not in units:
+                units.append(u)
+        if not total.ranges:
+            return list(self.readable_amount(total.low, units))
+        low = self.readable_amount(total.low, units)
+        high = self.readable_amount(total.high, units)
+        low = self.cnv.adjust_unit(*low, favor_current_unit=False)
+        high = self.cnv.adjust_unit(*high, favor_current_unit=False)
+        if low[1] != high[1]:
+            low = (low[0] * self.cnv.converter(low[1], high[1]), high[1])
+        return [(low[0], high[0]), high[1]]
+
+
 def setup_default_orgdic():
     from .defaults.defaults import lang as defaults
 
@@ -231,6 +417,9 @@ def setup_default_orgdic():
 
 class ShoppingList:
 
+    # The key under which extras are handed to our aggregator
+    EXTRAS = None
+
     def __init__(self):
         self.recs = {}
         self.extras = []
@@ -250,13 +439,26 @@ class ShoppingList:
         debug("grabIngsFromRecs (self, recs):", 5)
         """Handed an array of (rec . mult)s, we combine their ingredients.
         recs may be IDs or objects."""
-        self.lst = start[0:]
+        self.aggregator = ShoppingAggregator()
+        self.aggregator.add(self.EXTRAS, start[0:])
+        if recs:
+            # Every recipe's references, expanded in one go.
+            expanded = self.rd.expand_references([rec.id for rec, mult in recs], 1, self.includes, self.warn_recursion)
         for rec, mult in recs:
-            self.lst.extend(self.grabIngFromRec(rec, mult=mult))
-        return self.organize_list(self.lst)
-
-    def organize_list(self, lst):
-        self.sh = self.get_shopper(lst)
+            self.aggregator.add(rec.id, expanded[rec.id], mult)
+        return self.organize_totals()
+
+    def organize_totals(self):
+        """Sort our totals into our shopping list and our pantry."""
+        if not hasattr(self, "sh"):
+            self.sh = self.get_shopper([])
+        self.sh.dic = {}
+        self.sh.mypantry = {}
+        for k, amts in self.aggregator.dic.items():
+            if k in self.sh.pantry and self.sh.pantry[k]:
+                self.sh.mypantry[k] = amts
+            else:
+                self.sh.dic[k] = amts
         data = self.sh.organize(self.sh.dic)
         pantry = self.sh.organize(self.sh.mypantry)
         debug("returning: data=%s pantry=%s" % (data, pantry), 5)
@@ -266,71 +468,13 @@ class ShoppingList:
         """Get an ingredient from a recipe and return a list with our amt,unit,key"""
         """We will need [[amt,un,key],[amt,un,key]]"""
         debug("grabIngFromRec (self, rec=%s, mult=%s):" % (rec, mult), 5)
-        # Grab all of our ingredients
-        ings = self.rd.get_ings(rec)
-        lst = []
-        include_dic = self.includes.get(rec.id) or {}
-        for i in ings:
-            if hasattr(i, "refid"):
-                refid = i.refid
-            else:
-                refid = None
-            debug("adding ing %s, %s" % (i.item, refid), 4)
-            if i.optional:
-                # handle boolean includes value which applies to ALL ingredients
-                if not include_dic:
-                    continue
-                if isinstance(include_dic, dict):
-                    # Then we have to look at the dictionary itself...
-                    if (i.ingkey not in include_dic) or not include_dic[i.ingkey]:
-                        # we ignore our ingredient (don't add it)
-                        continue
-            if self.rd.get_amount(i):
-                amount = self.rd.get_amount(i, mult=mult)
-            else:
-                amount = None
-            if refid:
-                ## a reference tells us to get another recipe
-                ## entirely.  it has two parts: i.item (regular name),
-                ## i.refid, i.refmult (amount we multiply recipe by)
-                ## if we don't have the reference (i.refid), we just
-                ## output the recipe name
-                debug("Grabbing recipe as ingredient!", 2)
-                # disallow recursion
-                subrec = self.rd.get_referenced_rec(i)
-                if subrec.id == rec.id:
-                    de.show_message(
-                        label=_("Recipe calls for itself as an ingredient."),
-                        sublabel=_("Ingredient %s will be ignored.") % rec.title + _("Infinite recursion is not allowed in recipes!"),
-                    )
-                    continue
-                if subrec:
-                    # recipe refs need an amount. We'll
-                    # assume if need be.
-                    amt = self.rd.get_amount_as_float(i)
-                    if not amt:
-                        amount = amt
-                    refmult = mult * amt
-                    if subrec.id not in include_dic:
-                        d = self.getOptionalDic(
-                            self.rd.get_ings(subrec),
-                            refmult,
-                            self.prefs,
-                        )
-                        include_dic[subrec.id] = d
-                    nested_list = self.grabIngFromRec(subrec, refmult)
-                    lst.extend(nested_list)
-                    continue
-                else:
-                    # it appears we don't have this recipe
-                    debug("We don't have recipe %s" % i.item, 0)
-                    if not i.unit:
-                        i.unit = "recipe"
-                    if not i.ingkey:
-                        i.ingkey = i.item
-            lst.append([amount, i.unit, i.ingkey])
-        debug("grabIngFromRec returning %s" % lst, 5)
-        return lst
+        return self.rd.expand_references([rec.id], mult, self.includes, self.warn_recursion)[rec.id]
+
+    def warn_recursion(self, rec_id, ing):
+        de.show_message(
+            label=_("Recipe calls for itself as an ingredient."),
+            sublabel=_("Ingredient %s will be ignored.") % ing.item + _("Infinite recursion is not allowed in recipes!"),
+        )
 
     def getOptionalDic(self, ivw, mult, prefs):
         """Return a dictionary of optional ingredients with a TRUE|FALSE value
@@ -391,8 +535,34 @@ class ShoppingList:
             _, mult_already = self.recs[rec.id]
             mult += mult_already
         self.recs[rec.id] = (rec, mult)
-        self.includes[rec.id] = includes
-        self.reset()
+        if rec.id in self.aggregator.recipes and self.includes.get(rec.id) == includes:
+            self.aggregator.rescale(rec.id, mult)
+        else:
+            self.includes[rec.id] = includes
+            self.aggregator.add(rec.id, self.grabIngFromRec(rec), mult)
+        self.refresh()
+
+    def removeRec(self, rec):
+        """Take recipe off our list."""
+        del self.recs[rec.id]
+        self.aggregator.remove(rec.id)
+        self.refresh()
+
+    def changeMultiplier(self, rec, mult):
+        """Set the multiplier of a recipe that is on our list."""
+        self.recs[rec.id] = (rec, mult)
+        self.aggregator.rescale(rec.id, mult)
+        self.refresh()
+
+    def addExtra(self, extra):
+        """Add an [amount, unit, item] that comes from no recipe."""
+        self.extras.append(extra)
+        self.aggregator.add(self.EXTRAS, self.extras)
+        self.refresh()
+
+    def refresh(self):
+        """Show our totals after a change to our recipes or extras."""
+        self.data, self.pantry = self.organize_totals()
 
     def reset(self):
         self.grabIngsFromRecs(list(self.recs.values()), self.extras)
@@ -104,7 +104,10 @@ class SuspendableThread(threading.Thread, _IdleObject):
 
     def run(self):
         try:
-            self.do_run()
+            try:
+                self.do_run()
+            finally:
+                self.end_run()
         except Terminated:
             self.emit("stopped")
         except Exception:
@@ -119,6 +122,10 @@ class SuspendableThread(threading.Thread, _IdleObject):
         # periodically, otherwise pausing & cancelling won't work
         raise NotImplementedError
 
+    def end_run(self):
+        """Called however do_run ends, before we signal how it went."""
+        pass
+
     def suspend(self):
         self.suspended = True
 
@@ -0,0 +1,25 @@
+from itertools import count
+
+import pytest
+
+from gourmand.backends import db
+
+
+@pytest.fixture
+def new_database(request, tmp_path):
+    """Return a function opening a new, empty RecData each time it is called.
+
+    Like db.get_database(), the databases are opened without a filename:
+    a file of ours would be backed up as it is brought up to date, and
+    the backup shows a modal dialog, which would hang the test run.
+
+    Test classes using this fixture get it as self.new_database.
+    """
+    paths = (tmp_path / ("recipes-%s.db" % n) for n in count())
+
+    def new_database() -> db.RecData:
+        return db.RecData(None, "sqlite:///%s" % next(paths))
+
+    if request.instance is not None:
+        request.instance.new_database = new_database
+    return new_database
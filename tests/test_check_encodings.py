@@ -0,0 +1,71 @@
+import codecs
+from pathlib import Path
+
+import pytest
+
+from gourmand import check_encodings
+
+TEST_FILE_DIRECTORY = Path(__file__).parent / "recipe_files"
+
+
+@pytest.mark.parametrize("filename", ["mealmaster.mmf", "mastercook_text_export.mxp", "test_set.grmt"])
+def test_utf8(filename):
+    path = TEST_FILE_DIRECTORY / filename
+    got = check_encodings.GetFile(str(path))
+    assert got.enc == "utf-8"
+    assert iter(got.lines) is got.lines
+    assert list(got.lines) == path.read_text(encoding="utf-8").splitlines()
+
+
+@pytest.mark.parametrize("encoding", ["utf_8_sig", "utf_16"])
+def test_byte_order_mark(tmp_path, encoding):
+    text = (TEST_FILE_DIRECTORY / "test_set.grmt").read_text(encoding="utf-8")
+    path = tmp_path / "recipes.grmt"
+    path.write_bytes(text.encode(encoding))
+    assert check_encodings.GetFile(str(path)).enc == encoding
+    assert list(check_encodings.get_file(str(path))) == text.splitlines()
+
+
+def test_ask_user(monkeypatch):
+    path = TEST_FILE_DIRECTORY / "athenos.mx2"
+    # latin_1 would read its curly quotes as control characters.
+    assert set(check_encodings.CheckEncoding(str(path)).get_encodings()) == {"cp850", "cp1252"}
+
+    monkeypatch.setattr(check_encodings, "ask_user", False)
+    with pytest.raises(check_encodings.EncodingUndecided):
+        check_encodings.get_file(str(path))
+
+    monkeypatch.setattr(check_encodings, "ask_user", True)
+    monkeypatch.setattr(check_encodings, "getEncoding", lambda encodings: "cp1252")
+    assert list(check_encodings.get_file(str(path))) == path.read_text(encoding="cp1252").splitlines()
+    monkeypatch.setattr(check_encodings, "getEncoding", lambda encodings: None)
+    assert check_encodings.get_file(str(path)) is None
+
+
+def test_samples(tmp_path):
+    path = tmp_path / "recipes.txt"
+    path.write_bytes(b"Recipe\r\n" * check_encodings.SAMPLE_SIZE + "Caf\xe9\r\n".encode("latin_1"))
+    checker = check_encodings.CheckEncoding(str(path))
+    samples = checker.read_samples()
+    assert len(samples) == check_encodings.OFFSET_SAMPLES + 1
+    assert sum(map(len, samples)) < path.stat().st_size / 4
+    # The last sample sees that the file is not ASCII.
+    assert list(checker.get_encodings()) == ["iso8859", "cp850"]
+
+
+def test_sample_boundaries(tmp_path):
+    path = tmp_path / "recipes.txt"
+    line = "Crème brûlée\n"
+    path.write_bytes((line * check_encodings.SAMPLE_SIZE).encode("utf_16_le"))
+    checker = check_encodings.CheckEncoding(str(path), encodings=["utf_16_le", "utf_8"])
+    # Our samples cut UTF-16 in step, but through the middle of lines.
+    assert set(codecs.decode(checker.read_samples()[1], "utf_16_le")) == set(line)
+    assert list(checker.get_encodings()) == ["utf_16_le"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64])
+def test_lines_across_chunks(monkeypatch, chunk_size):
+    path = TEST_FILE_DIRECTORY / "athenos.mx2"
+    monkeypatch.setattr(check_encodings, "CHUNK_SIZE", chunk_size)
+    monkeypatch.setattr(check_encodings, "getEncoding", lambda encodings: "cp1252")
+    assert list(check_encodings.get_file(str(path))) == path.read_text(encoding="cp1252").splitlines()
@@ -15,6 +15,21 @@ class ConvertTest(unittest.TestCase):
         self.assertEqual(self.c.convert_w_density("ml", "g", item="water"), 1)
         self.assertEqual(self.c.convert_w_density("ml", "g", density=0.5), 0.5)
 
+    def test_conversions_through_other_units(self):
+        self.assertAlmostEqual(self.c.converter("gallon", "tsp"), 768)
+        self.assertAlmostEqual(self.c.converter("kg", "lb"), 1000 / 28.35 / 16)
+        self.assertAlmostEqual(self.c.converter("days", "minutes"), 24 * 60)
+        self.assertFalse(self.c.converter("c", "g"))
+        self.assertAlmostEqual(self.c.converter("c", "g", item="water"), 8 * 28.35)
+        self.assertAlmostEqual(self.c.converter("g", "c", density=0.5), 1 / (4 * 28.35))
+
+    def test_possible_conversions(self):
+        conversions = self.c.possible_conversions("c")
+        self.assertIn("ml", conversions)
+        self.assertNotIn("g", conversions)
+        self.assertNotIn("c", conversions)
+        self.assertAlmostEqual(conversions["Tbs"], 1 / 16)
+
     def test_readability(self):
         self.assertTrue(self.c.readability_score(1, "cup") > self.c.readability_score(0.8, "cups"))
         self.assertTrue(self.c.readability_score(1 / 3.0, "tsp.") > self.c.readability_score(0.123, "tsp."))
@@ -1,7 +1,35 @@
+import io
+import sqlite3
+import threading
 import unittest
+from contextlib import contextmanager
+from pathlib import Path
 
+import pytest
+import sqlalchemy
+
+import gourmand.__version__
 from gourmand.backends import db
+from gourmand.exporters.exporter import ExporterMultirec
+from gourmand.image_utils import bytes_to_image, image_to_bytes
 from gourmand.plugin_loader import MasterLoader
+from gourmand.prefs import Prefs
+from gourmand.recindex import RecipeModel
+
+
+@contextmanager
+def record_statements(rd):
+    """Collect the (SQL, parameters) of statements rd runs within this context."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        statements.append((statement, parameters))
+
+    sqlalchemy.event.listen(rd.db, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        sqlalchemy.event.remove(rd.db, "before_cursor_execute", before_cursor_execute)
 
 
 class DBTest(unittest.TestCase):
@@ -152,6 +180,629 @@ class TestSearch(DBTest):
         assert len(self.db.search_recipes([{"column": "ingredient", "search": "sugar, brown"}, {"column": "ingredient", "search": "apple"}])) == 1
 
 
+class TestBatchedLoaders(DBTest):
+    def add_recs(self, n):
+        ids = []
+        for i in range(n):
+            rec = self.db.add_rec({"title": "Batched %s" % i, "category": "Soup, Dessert"})
+            self.db.add_ings([{"recipe_id": rec.id, "item": "ing %s" % pos, "ingkey": "ing %s" % pos, "position": 2 - pos} for pos in range(3)])
+            ids.append(rec.id)
+        return ids
+
+    def test_match_single_loaders(self):
+        ids = self.add_recs(3)
+        missing = max(ids) + 1000
+        ings = self.db.get_ings_many(ids + [missing])
+        cats = self.db.get_cats_many(ids + [missing])
+        for id in ids:
+            expected = sorted(self.db.get_ings(id), key=lambda i: i.position)
+            self.assertEqual([i.id for i in ings[id]], [i.id for i in expected])
+            self.assertEqual(cats[id], self.db.get_cats(self.db.get_rec(id)))
+        self.assertEqual(ings[missing], [])
+        self.assertEqual(cats[missing], [])
+        recs = self.db.get_recs([ids[2], missing, ids[0]])
+        self.assertEqual([r.title for r in recs], ["Batched 2", "Batched 0"])
+
+    def test_chunks(self):
+        with record_statements(self.db) as statements:
+            self.db.get_ings_many(range(-2 * db.IN_CHUNK_SIZE - 1, 0))
+        self.assertEqual(len(statements), 3)
+
+    def count_queries(self, func, n):
+        recs = self.db.get_recs(self.add_recs(n))
+        with record_statements(self.db) as statements:
+            func(recs)
+        return len(statements)
+
+    def test_constant_queries(self):
+        def load(recs):
+            self.db.get_ings_many([r.id for r in recs])
+            self.db.get_cats_many([r.id for r in recs])
+
+        self.assertEqual(self.count_queries(load, 3), self.count_queries(load, 30))
+
+    def test_export_constant_queries(self):
+        def export(recs):
+            out = io.StringIO()
+            ExporterMultirec(self.db, recs, out, exporter_kwargs={"do_markup": False}).do_run()
+            self.assertIn(recs[-1].title, out.getvalue())
+
+        self.assertEqual(self.count_queries(export, 3), self.count_queries(export, 30))
+
+
+class TestQueryCache(DBTest):
+    def test_shapes(self):
+        self.db.delete_by_criteria(self.db.keylookup_table, {})
+        for word, item, count in [("apple", "apple pie", 2), ("apple", "apple juice", 1), ("pear", None, 4)]:
+            self.db.do_add(self.db.keylookup_table, {"word": word, "item": item, "ingkey": word, "count": count})
+        self.db._query_cache.clear()
+        before = self.db.query_cache_info()
+        self.assertEqual(self.db.fetch_one(self.db.keylookup_table, item="apple pie").count, 2)
+        self.assertEqual(self.db.fetch_one(self.db.keylookup_table, item="apple juice").count, 1)
+        self.assertIsNone(self.db.fetch_one(self.db.keylookup_table, item="pear tart"))
+        # Comparing with None is a shape of its own.
+        self.assertEqual(self.db.fetch_one(self.db.keylookup_table, item=None).word, "pear")
+        for ids in [[1], [1, 2, 3], []]:
+            self.db.fetch_all(self.db.keylookup_table, id=("in", ids))
+        self.assertEqual(self.db.fetch_len(self.db.keylookup_table, word="apple"), 2)
+        self.assertEqual(self.db.fetch_len(self.db.keylookup_table, word=("!=", "apple")), 1)
+        info = self.db.query_cache_info()
+        self.assertEqual(info.misses - before.misses, 5)
+        self.assertEqual(info.hits - before.hits, 4)
+        self.assertEqual(info.currsize, 5)
+
+    def test_same_results_uncached(self):
+        def fetch():
+            return [
+                self.db.fetch_all(self.db.recipe_table, sort_by=[("title", 1)], deleted=False),
+                self.db.fetch_count(self.db.ingredients_table, "ingkey", sort_by=[("count", -1)], deleted=False),
+                self.db.fetch_all(self.db.recipe_table, title=("LIKE", "Foo%")),
+                self.db.fetch_all(self.db.recipe_table, title=("REGEXP", "^foo")),
+                self.db.fetch_len(self.db.recipe_table),
+            ]
+
+        self.db.add_rec({"title": "Foo cache"})
+        cached = fetch()
+        self.db.query_cache_size = 0
+        try:
+            self.assertEqual(fetch(), cached)
+        finally:
+            del self.db.query_cache_size
+
+
+class TestRegexp(DBTest):
+    def test_regexp_functions(self):
+        row = self.db.db.execute(
+            "SELECT 'Apple pie' REGEXP 'apple', 'Apple pie' REGEXP 'Apple', REGEXP_I('apple', 'Apple pie'), REGEXP_I('apple', NULL)"
+        ).fetchone()
+        self.assertEqual(tuple(row), (0, 1, 1, 0))
+
+    def test_search_compiles_once(self):
+        self.db.add_rec({"title": "Regexp apple pie", "cuisine": "American"})
+        db.compile_regexp.cache_clear()
+        result = self.db.search_recipes([{"column": "anywhere", "search": "APPLE pie", "operator": "REGEXP"}])
+        self.assertIn("Regexp apple pie", [r.title for r in result])
+        info = db.compile_regexp.cache_info()
+        self.assertEqual(info.misses, 1)
+        self.assertGreater(info.hits, 0)
+        # NULLs never get as far as Python.
+        criterion = db.regexp_match(self.db.recipe_table.c.source, "pie")
+        self.assertIn("recipe.source IS NOT NULL AND", str(criterion))
+
+
+class TestFullTextSearch(DBTest):
+    def setUp(self):
+        super().setUp()
+        self.assertTrue(self.db.has_full_text_index)
+        self.db.delete_by_criteria(self.db.ingredients_table, {})
+        self.db.delete_by_criteria(self.db.recipe_table, {})
+        self.db.delete_by_criteria(self.db.categories_table, {})
+        pie = self.db.add_rec({"title": "Apple Pie", "cuisine": "American", "category": "Dessert, Baking"})
+        self.db.add_ings(
+            [
+                {"recipe_id": pie.id, "item": "Granny Smith apples", "ingkey": "apple", "position": 0},
+                {"recipe_id": pie.id, "item": "brown sugar", "ingkey": "sugar, brown", "position": 1},
+            ]
+        )
+        self.db.add_rec({"title": "Ratatouille", "cuisine": "French", "instructions": "Stew the aubergines slowly."})
+        self.db.add_rec({"title": "Pie crust", "source": "Grandma", "category": "Baking"})
+
+    def search_titles(self, column, text, use_index=True):
+        self.db.has_full_text_index = use_index
+        try:
+            recs = self.db.search_recipes([{"column": column, "operator": "LIKE", "search": "%" + text + "%"}])
+        finally:
+            self.db.has_full_text_index = True
+        return sorted(r.title for r in recs)
+
+    def test_matches_like_search(self):
+        for column, text in [
+            ("anywhere", "pie"),
+            ("anywhere", "BAKING"),
+            ("anywhere", "sugar, br"),
+            ("anywhere", "aubergine"),
+            ("anywhere", "andma"),
+            ("anywhere", "nothing like this"),
+            ("title", "pie"),
+            ("ingredient", "apple"),
+            ("category", "dessert"),
+            ("cuisine", "ench"),
+        ]:
+            self.assertEqual(self.search_titles(column, text), self.search_titles(column, text, use_index=False), (column, text))
+
+    def test_index_follows_changes(self):
+        rec = self.db.fetch_one(self.db.recipe_table, title="Ratatouille")
+        self.assertEqual(self.search_titles("anywhere", "zucchini"), [])
+        self.db.add_ing({"recipe_id": rec.id, "item": "zucchini", "ingkey": "zucchini", "position": 0})
+        self.assertEqual(self.search_titles("anywhere", "zucchini"), ["Ratatouille"])
+        self.db.modify_rec(rec, {"title": "Vegetable stew", "category": "Stews"})
+        self.assertEqual(self.search_titles("anywhere", "ratatouille"), [])
+        self.assertEqual(self.search_titles("category", "stews"), ["Vegetable stew"])
+        self.db.delete_rec(rec)
+        self.assertEqual(self.search_titles("anywhere", "zucchini"), [])
+
+    def test_rebuild(self):
+        self.db.db.execute("DELETE FROM recipe_fts")
+        self.assertEqual(self.search_titles("anywhere", "pie"), [])
+        self.db.rebuild_full_text_index()
+        self.assertEqual(self.search_titles("anywhere", "pie"), ["Apple Pie", "Pie crust"])
+
+
+class TestRecipeResults(DBTest):
+    def setUp(self):
+        super().setUp()
+        self.db.delete_by_criteria(self.db.recipe_table, {})
+        self.db.delete_by_criteria(self.db.categories_table, {})
+        titles = ["Soup", "salad", None, "Bread", "", "Soup", "Apple tart", "Zabaglione", "bread", "Quiche", "Pie", "Gnocchi", "Soup"]
+        for n, title in enumerate(titles):
+            rec = {"title": title, "rating": (n * 7) % 4 or None, "preptime": n % 3 * 60, "category": ["Soup", "Dessert", ""][n % 3]}
+            self.db.add_rec(rec)
+        self.searches = [{"column": "deleted", "operator": "=", "search": False}]
+
+    def expected_ids(self, sort_by):
+        return [r.id for r in self.db.search_recipes(self.searches, sort_by=sort_by + [("id", 1)])]
+
+    def test_pages_match_search_recipes(self):
+        for sort_by in [[], [("title", 1)], [("title", -1)], [("rating", 1)], [("rating", -1), ("title", 1)], [("preptime", 1), ("title", -1)]]:
+            for read_ahead in (True, False):
+                expected = self.expected_ids(sort_by)
+                results = self.db.lazy_search_recipes(self.searches, sort_by=sort_by, read_ahead=read_ahead)
+                self.assertEqual(results.count(), len(expected))
+                with record_statements(self.db) as statements:
+                    forward = [r.id for n in range(5) for r in results.page(n, 3)]
+                self.assertEqual(forward, expected, sort_by)
+                # Paging forwards never needs an OFFSET (SQLite always gets
+                # "LIMIT ? OFFSET ?", so look at the parameter).
+                offsets = [parameters[-1] for sql, parameters in statements if "OFFSET" in sql]
+                self.assertEqual(offsets, [0] * len(offsets))
+                backward = [[r.id for r in results.page(n, 3)] for n in reversed(range(5))]
+                self.assertEqual([i for page in reversed(backward) for i in page], expected, sort_by)
+                # Jumping straight to a page falls back to an offset.
+                results = self.db.lazy_search_recipes(self.searches, sort_by=sort_by, read_ahead=read_ahead)
+                self.assertEqual([r.id for r in results.page(3, 3)], expected[9:12])
+                self.assertEqual([r.id for r in results], expected)
+                self.assertEqual(results[-1].id, expected[-1])
+
+    def test_category_sort(self):
+        results = self.db.lazy_search_recipes(self.searches, sort_by=[("category", 1)])
+        ids = [r.id for n in range(5) for r in results.page(n, 3)]
+        self.assertEqual(sorted(ids), sorted(self.expected_ids([])))
+
+    def test_columns(self):
+        self.db.add_rec({"title": "Columns", "instructions": "Lots of text"})
+        results = self.db.lazy_search_recipes([{"column": "title", "operator": "=", "search": "Columns"}], columns=["title", "category"])
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].title, "Columns")
+        self.assertFalse(results[0].deleted)
+        self.assertFalse(hasattr(results[0], "instructions"))
+
+
+class TestIndexes(DBTest):
+    def query_plan(self, func):
+        """Return the query plans of the statements func runs."""
+        with record_statements(self.db) as statements:
+            func()
+        self.assertTrue(statements)
+        # SQLite doesn't prepare EXPLAIN statements again when indexes
+        # change, so we explain with new connections.
+        self.db.db.dispose()
+        return " ".join(row[-1] for statement, parameters in statements for row in self.db.db.execute("EXPLAIN QUERY PLAN " + statement, parameters))
+
+    def test_hot_queries_use_indexes(self):
+        rec = self.db.add_rec({"title": "Indexed soup", "category": "Soup"})
+        not_deleted = {"column": "deleted", "operator": "=", "search": False}
+        plans = {
+            "ix_ingredients_recipe_id_deleted_position": lambda: self.db.get_ings(rec),
+            "ix_ingredients_ingkey": lambda: self.db.fetch_all(self.db.ingredients_table, ingkey="apple"),
+            "ix_categories_recipe_id": lambda: self.db.get_cats(rec),
+            "ix_categories_category": lambda: self.db.search_recipes([{"column": "category", "search": "Entree", "operator": "="}]),
+            "ix_keylookup_word": lambda: self.db.fetch_all(self.db.keylookup_table, word="apple"),
+            "ix_keylookup_item": lambda: self.db.fetch_one(self.db.keylookup_table, item="apple"),
+            "ix_recipe_recipe_hash": lambda: self.db.find_duplicates(by="recipe"),
+            "ix_recipe_ingredient_hash": lambda: self.db.find_duplicates(by="ingredient"),
+            "ix_recipe_deleted_title": lambda: self.db.search_recipes([not_deleted, {"column": "title", "operator": "=", "search": "Foo"}]),
+            "ix_recipe_recipe_hash_ingredient_hash_deleted": lambda: self.db.find_all_duplicates(),
+        }
+        indexes = [row.name for row in self.db.db.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+        for index, func in plans.items():
+            self.assertIn(index, indexes)
+            self.assertIn(index, self.query_plan(func))
+
+    def test_missing_indexes_are_recreated(self):
+        def lookup():
+            self.db.fetch_all(self.db.keylookup_table, word="apple")
+
+        self.db.db.execute("DROP INDEX ix_keylookup_word")
+        self.assertNotIn("ix_keylookup_word", self.query_plan(lookup))
+        self.db.update_version_info(gourmand.__version__.version)
+        self.assertIn("ix_keylookup_word", self.query_plan(lookup))
+
+
+class TestAddRecsBulk(DBTest):
+    def make_recs(self):
+        return [
+            {
+                "title": "Bulk %s" % n,
+                "instructions": "Stir.",
+                "category": "Bulk, Soup",
+                "ingredients": [
+                    {"amount": 2, "unit": "c.", "item": "water", "ingkey": "water", "position": 0},
+                    {"amount": 1, "unit": "tsp.", "item": "salt", "ingkey": "salt", "position": 1},
+                ],
+            }
+            for n in range(3)
+        ]
+
+    def test_add_recs_bulk(self):
+        reserved = self.db.new_id()
+        recs = self.make_recs()
+        recs[1]["id"] = reserved
+        ids = self.db.add_recs_bulk(recs)
+        self.assertEqual(ids[1], reserved)
+        self.assertNotIn(reserved, self.db.new_ids)
+        for n, rid in enumerate(ids):
+            rec = self.db.get_rec(rid)
+            self.assertEqual(rec.title, "Bulk %s" % n)
+            self.assertFalse(rec.deleted)
+            self.assertEqual(sorted(self.db.get_cats(rec)), ["Bulk", "Soup"])
+            self.assertEqual([i.item for i in self.db.order_ings(self.db.get_ings(rec))[0][1]], ["water", "salt"])
+
+    def test_hashes_match_add_rec(self):
+        (rid,) = self.db.add_recs_bulk(self.make_recs()[:1])
+        bulk = self.db.get_rec(rid)
+        rec = self.make_recs()[0]
+        ings = rec.pop("ingredients")
+        single = self.db.add_rec(rec)
+        for i in ings:
+            i["recipe_id"] = single.id
+        self.db.add_ings(ings)
+        self.db.update_hashes(single)
+        single = self.db.get_rec(single.id)
+        self.assertEqual((bulk.recipe_hash, bulk.ingredient_hash), (single.recipe_hash, single.ingredient_hash))
+
+    def test_one_statement_per_table(self):
+        recs = self.make_recs()
+        reserved = self.db.reserve_ids(2)
+        self.assertEqual(self.db.fetch_len(self.db.recipe_table, id=("in", reserved)), 2)
+        recs[0]["id"], recs[2]["id"] = reserved
+        with record_statements(self.db) as statements:
+            ids = self.db.add_recs_bulk(recs)
+        self.assertEqual([ids[0], ids[2]], reserved)
+        self.assertFalse(self.db.new_ids & set(reserved))
+        writes = [sql.split()[:3] for sql, params in statements if not sql.startswith("SELECT")]
+        self.assertEqual([w for w in writes if w[0] == "UPDATE"], [])
+        for table in ["recipe", "categories", "ingredients"]:
+            self.assertEqual(writes.count(["INSERT", "INTO", table]), 1)
+        self.assertEqual(self.db.fetch_len(self.db.recipe_table, id=("in", ids), deleted=False), 3)
+
+    def test_values_are_coerced(self):
+        recs = self.make_recs()
+        recs[1]["ingredients"][0]["amount"] = "lots"
+        recs[2]["ingredients"][1]["optional"] = "yes"
+        ids = self.db.add_recs_bulk(recs)
+        ings = [self.db.order_ings(self.db.get_ings(rid))[0][1] for rid in ids]
+        self.assertEqual([[i.amount for i in rings] for rings in ings], [[2, 1], [None, 1], [2, 1]])
+        self.assertTrue(ings[2][1].optional)
+
+    def test_full_text_index(self):
+        if not self.db.has_full_text_index:
+            self.skipTest("SQLite lacks FTS5 trigrams")
+        reserved = self.db.new_id()
+        recs = self.make_recs()
+        recs[1]["id"] = reserved
+        recs[2]["ingredients"].append({"amount": 1, "item": "kohlrabi", "ingkey": "kohlrabi"})
+        ids = self.db.add_recs_bulk(recs)
+        self.assertEqual([r.id for r in self.db.search_recipes([{"column": "ingredient", "search": "%kohlrab%", "operator": "LIKE"}])], [ids[2]])
+        self.assertEqual(self.db.db.execute("SELECT count(*) FROM recipe_fts_paused").scalar(), 0)
+        fts = "SELECT * FROM recipe_fts WHERE rowid IN (%s) ORDER BY rowid" % ", ".join(map(str, ids))
+        indexed = self.db.db.execute(fts).fetchall()
+        self.db.rebuild_full_text_index()
+        self.assertEqual(indexed, self.db.db.execute(fts).fetchall())
+
+
+class TestReferences(DBTest):
+    def add_rec(self, title, ings):
+        rec = self.db.add_rec({"title": title})
+        for n, ing in enumerate(ings):
+            self.db.add_ing(dict(ing, recipe_id=rec.id, position=n))
+        return rec
+
+    def add_chain(self, name, length):
+        # Each recipe calls for 2 of the one before, the first for 1 cup of flour.
+        rec = self.add_rec("%s 0" % name, [{"amount": 1, "unit": "cup", "item": "flour", "ingkey": "flour"}])
+        recs = [rec]
+        for n in range(1, length):
+            ings = [{"amount": 2, "item": rec.title, "refid": rec.id}, {"amount": 1, "unit": "tsp", "item": "salt", "ingkey": "salt"}]
+            rec = self.add_rec("%s %s" % (name, n), ings)
+            recs.append(rec)
+        return recs
+
+    def test_deep_chain(self):
+        recs = self.add_chain("Deep chain", 30)
+        with record_statements(self.db) as statements:
+            expanded = self.db.expand_references([recs[-1].id, recs[2].id], mult=0.5)
+        # However deep the references go.
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(expanded[recs[2].id], [[2.0, "cup", "flour"], [1.0, "tsp", "salt"], [0.5, "tsp", "salt"]])
+        ings = expanded[recs[-1].id]
+        self.assertEqual(len(ings), 30)
+        self.assertEqual(ings[0], [2.0**28, "cup", "flour"])
+
+    def test_cycles(self):
+        a = self.add_rec("Cycle A", [{"amount": 1, "unit": "cup", "item": "milk", "ingkey": "milk"}])
+        b = self.add_rec("Cycle B", [{"amount": 3, "item": "Cycle A", "refid": a.id}, {"amount": 1, "item": "egg", "ingkey": "egg"}])
+        c = self.add_rec("Cycle C", [{"amount": 2, "item": "Cycle B", "refid": b.id}, {"item": "Cycle C", "refid": 0}])
+        self.db.add_ing({"recipe_id": a.id, "position": 1, "amount": 1, "item": "Cycle C", "refid": c.id})
+        # Cycle C's second ingredient calls for Cycle C itself.
+        self.db.modify_ing(self.db.get_ings(c)[1], {"refid": c.id})
+        cycles = []
+        expanded = self.db.expand_references([a.id, b.id, c.id], on_cycle=lambda id, ing: cycles.append((id, ing.item)))
+        # Each recipe stops where it would come round to itself again.
+        self.assertEqual(expanded[a.id], [[1.0, "cup", "milk"], [2.0, None, "egg"]])
+        self.assertEqual(expanded[b.id], [[3.0, "cup", "milk"], [1.0, None, "egg"]])
+        self.assertEqual(expanded[c.id], [[6.0, "cup", "milk"], [2.0, None, "egg"]])
+        self.assertIn((c.id, "Cycle C"), cycles)
+        self.assertIn((b.id, "Cycle A"), cycles)
+
+    def test_optional_and_missing(self):
+        sauce = self.add_rec("Optional sauce", [{"amount": 1, "item": "basil", "ingkey": "basil", "optional": True}])
+        rec = self.add_rec(
+            "Optional pasta",
+            [
+                {"amount": 1, "item": "parmesan", "ingkey": "parmesan", "optional": True},
+                {"amount": 1, "item": "Optional sauce", "refid": sauce.id},
+                {"amount": 2, "item": "Lost recipe", "refid": 10**9},
+            ],
+        )
+        self.assertEqual(self.db.expand_references([rec.id])[rec.id], [[2, "recipe", "Lost recipe"]])
+        expanded = self.db.expand_references([rec.id], includes={rec.id: {"parmesan": True}, sauce.id: True})
+        self.assertEqual(expanded[rec.id], [[1, None, "parmesan"], [1, None, "basil"], [2, "recipe", "Lost recipe"]])
+
+    def test_include_linked_recipes(self):
+        recs = self.add_chain("Linked chain", 4)
+        # A reference to a recipe that's gone is found again by title.
+        top = self.add_rec("Linked chain top", [{"amount": 1, "item": "Linked chain 3", "refid": 10**9}])
+        linked = [top]
+        self.db.include_linked_recipes(linked)
+        self.assertEqual(sorted(r.id for r in linked), sorted([top.id] + [r.id for r in recs]))
+        self.assertEqual(self.db.get_ings(top)[0].refid, recs[-1].id)
+
+
+@pytest.mark.usefixtures("new_database")
+class TestDuplicates(DBTest):
+    def add_rec(self, title, ings, **dic):
+        # The same last_modified, which would otherwise stop us merging.
+        rec = self.db.add_rec(dict(dic, title=title, instructions="Mix it all together and bake for an hour.", last_modified=1000))
+        for n, (amount, unit, item) in enumerate(ings):
+            self.db.add_ing({"recipe_id": rec.id, "amount": amount, "unit": unit, "item": item, "ingkey": item, "position": n})
+        self.db.update_hashes(rec)
+        return self.db.get_rec(rec.id)
+
+    def setUp(self):
+        super().setUp()
+        # A database of our own, so that every duplicate is one of ours.
+        self.db = self.new_database()
+        ings = [(2, "cup", "flour"), (1, "cup", "sugar"), (2, None, "egg"), (1, "tsp", "vanilla"), (0.5, "cup", "butter")]
+        self.cake = self.add_rec("Duplicate pound cake", ings)
+        self.copy = self.add_rec("Duplicate pound cake", ings)
+        self.deleted_copy = self.add_rec("Duplicate pound cake", ings, deleted=True)
+        # Near duplicates: another word in the title, another amount.
+        self.near = self.add_rec("Duplicate pound cake II", [(3, "cup", "flour")] + ings[1:])
+        self.other = self.add_rec("Duplicate lemon cake", [(1, None, "lemon"), (1, "cup", "sugar"), (2, None, "egg")])
+
+    def test_find_all_duplicates(self):
+        ids = [self.cake.id, self.copy.id, self.deleted_copy.id]
+        self.assertEqual(self.db.find_all_duplicates(), [ids])
+        self.assertEqual(self.db.find_complete_duplicates(), [ids])
+        self.assertEqual(self.db.find_all_duplicates(include_deleted=False), [ids[:2]])
+        self.assertEqual(self.db.find_duplicates(by="ingredient", include_deleted=False), [ids[:2]])
+        self.assertEqual(self.db.find_all_duplicates(recipes=[self.other]), [])
+        with record_statements(self.db) as statements:
+            self.db.find_all_duplicates()
+        self.assertEqual(len(statements), 1)
+
+    def test_near_duplicates(self):
+        ids = [self.cake.id, self.copy.id, self.near.id]
+        self.assertEqual(self.db.find_all_duplicates(include_deleted=False, near=True), [ids])
+        self.assertEqual(self.db.find_all_duplicates(include_deleted=False, near=True, threshold=0.95), [ids[:2]])
+
+    def test_merge_mergeable_duplicates(self):
+        self.db.merge_mergeable_duplicates()
+        self.assertEqual(self.db.find_all_duplicates(include_deleted=False), [])
+        self.assertEqual(self.db.get_rec(self.cake.id).title, "Duplicate pound cake")
+        self.assertIsNone(self.db.get_rec(self.copy.id))
+        self.assertIsNotNone(self.db.get_rec(self.deleted_copy.id))
+
+
+@pytest.mark.usefixtures("new_database")
+class TestTransaction(DBTest):
+    def setUp(self):
+        super().setUp()
+        # A database of our own, so that our hooks see only our recipes.
+        self.db = self.new_database()
+        self.added, self.modified = [], []
+        self.db.add_hooks.append(self.added.append)
+        self.db.modify_hooks.append(self.modified.append)
+
+    def test_one_commit(self):
+        commits = []
+
+        def commit(conn):
+            commits.append(conn)
+
+        sqlalchemy.event.listen(self.db.db, "commit", commit)
+        with self.db.transaction():
+            rec = self.db.add_rec({"title": "Transaction soup"})
+            for n in range(5):
+                self.db.add_ing_and_update_keydic({"recipe_id": rec.id, "item": "carrot %s" % n, "ingkey": "carrot", "position": n})
+            self.db.modify_rec(rec, {"cuisine": "French"})
+            self.db.modify_rec(rec, {"source": "Grandma"})
+            # Hooks wait for the commit.
+            self.assertEqual(self.added, [])
+            self.assertEqual(self.modified, [])
+        sqlalchemy.event.remove(self.db.db, "commit", commit)
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(self.added, [rec.id])
+        self.assertEqual(self.modified, [rec.id])
+        self.assertEqual(len(self.db.get_ings(rec)), 5)
+        self.assertEqual(self.db.get_rec(rec.id).source, "Grandma")
+
+    def test_modify_hooks(self):
+        rec = self.db.add_rec({"title": "Hooked soup"})
+        rmodel = RecipeModel(self.db.lazy_search_recipes([], columns=RecipeModel.columns), self.db, per_page=RecipeModel.per_page)
+        # The index's hook, as main.py registers it, is handed the ID.
+        self.db.modify_hooks.insert(0, rmodel.update_recipe)
+        with self.db.transaction():
+            self.db.modify_rec(rec, {"title": "Hooked stew"})
+        self.assertEqual(self.modified, [rec.id])
+        title = RecipeModel.columns.index("title")
+        self.assertEqual([row[title] for row in rmodel if row[0].id == rec.id], ["Hooked stew"])
+
+    def test_rollback(self):
+        with self.assertRaises(ZeroDivisionError):
+            with self.db.transaction():
+                rec = self.db.add_rec({"title": "Doomed soup"})
+                1 / 0
+        self.assertIsNone(self.db.get_rec(rec.id))
+        self.assertEqual(self.added, [])
+
+    def test_savepoint(self):
+        with self.db.transaction():
+            kept = self.db.add_rec({"title": "Kept soup"})
+            try:
+                with self.db.transaction():
+                    dropped = self.db.add_rec({"title": "Dropped soup"})
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertIsNotNone(self.db.get_rec(kept.id))
+        self.assertIsNone(self.db.get_rec(dropped.id))
+        self.assertEqual(self.added, [kept.id])
+
+
+@pytest.mark.usefixtures("new_database")
+class TestSqliteProfiles(DBTest):
+    def pragma(self, rd, name):
+        return rd.db.execute("PRAGMA %s" % name).scalar()
+
+    def test_balanced(self):
+        rd = self.new_database()
+        self.assertEqual(rd.sqlite_profile, "balanced")
+        self.assertEqual(self.pragma(rd, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(rd, "synchronous"), 1)
+        self.assertEqual(self.pragma(rd, "cache_size"), -64 * 1024)
+        self.assertEqual(self.pragma(rd, "mmap_size"), 256 * 2**20)
+        with rd.use_sqlite_profile("bulk"):
+            self.assertEqual(self.pragma(rd, "cache_size"), -256 * 1024)
+            self.assertEqual(self.pragma(rd, "wal_autocheckpoint"), 10000)
+            self.assertEqual(self.pragma(rd, "journal_mode"), "wal")
+        self.assertEqual(self.pragma(rd, "cache_size"), -64 * 1024)
+        rd.add_rec({"title": "Checkpointed soup"})
+        rd.close()
+        wal = Path(rd.db.url.database + "-wal")
+        self.assertFalse(wal.exists() and wal.stat().st_size)
+
+    def test_connections_keep_their_pragmas(self):
+        rd = self.new_database()
+        rd.db.dispose()
+        connections, statements = [], []
+
+        def on_connect(dbapi_con, con_record):
+            connections.append(dbapi_con)
+            dbapi_con.set_trace_callback(statements.append)
+
+        sqlalchemy.event.listen(rd.db, "connect", on_connect)
+        rec = rd.add_rec({"title": "Pooled soup"})
+        for _ in range(20):
+            rd.get_rec(rec.id)
+            rd.get_ings(rec)
+            rd.get_cats(rec)
+        self.assertEqual(len(connections), 1)
+        self.assertEqual(statements.count("PRAGMA cache_size = %s" % (-64 * 1024)), 1)
+        self.assertEqual(self.pragma(rd, "cache_size"), -64 * 1024)
+        # A connection moving to another profile gets all of its pragmas.
+        with rd.use_sqlite_profile("bulk"):
+            self.assertEqual(self.pragma(rd, "temp_store"), 2)
+        self.assertEqual(self.pragma(rd, "temp_store"), 0)
+        self.assertEqual(len(connections), 1)
+
+    def test_safe(self):
+        prefs = Prefs.instance()
+        prefs["sqlite_profile"] = "safe"
+        try:
+            rd = self.new_database()
+        finally:
+            del prefs["sqlite_profile"]
+        self.assertEqual(self.pragma(rd, "journal_mode"), "delete")
+        self.assertEqual(self.pragma(rd, "synchronous"), 2)
+        # Importing doesn't override the user's choice.
+        with rd.use_sqlite_profile("bulk"):
+            self.assertEqual(self.pragma(rd, "synchronous"), 2)
+            self.assertNotEqual(self.pragma(rd, "cache_size"), -256 * 1024)
+
+    def test_concurrent_reads_and_writes(self):
+        rd = self.new_database()
+        errors = []
+        writing = threading.Event()
+        writing.set()
+
+        def write():
+            try:
+                for n in range(20):
+                    with rd.transaction():
+                        for m in range(20):
+                            rd.add_rec({"title": "Concurrent soup %s-%s" % (n, m)})
+            except Exception as e:
+                errors.append(e)
+            finally:
+                writing.clear()
+
+        def read():
+            try:
+                while writing.is_set():
+                    rd.fetch_all(rd.recipe_table, deleted=False)
+                    rd.search_recipes([{"column": "title", "search": "soup", "operator": "LIKE"}])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write)] + [threading.Thread(target=read) for _ in range(3)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(rd.fetch_len(rd.recipe_table), 400)
+        # A reader in the middle of a read doesn't hold up a writer, and
+        # goes on seeing what was there when it started.
+        with rd.db.connect() as reader:
+            reader.exec_driver_sql("BEGIN")
+            self.assertEqual(reader.exec_driver_sql("SELECT count(*) FROM recipe").scalar(), 400)
+            rd.add_rec({"title": "Concurrent soup"})
+            self.assertEqual(reader.exec_driver_sql("SELECT count(*) FROM recipe").scalar(), 400)
+            reader.exec_driver_sql("COMMIT")
+        self.assertEqual(rd.fetch_len(rd.recipe_table), 401)
+
+
 class TestUnicode(DBTest):
     def test_unicode(self):
         rec = self.db.add_rec(
@@ -193,10 +844,59 @@ class TestIdReservation(DBTest):
 img = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xdb\x00C\x00\x08\x06\x06\x07\x06\x05\x08\x07\x07\x07\t\t\x08\n\x0c\x14\r\x0c\x0b\x0b\x0c\x19\x12\x13\x0f\x14\x1d\x1a\x1f\x1e\x1d\x1a\x1c\x1c $.' \",#\x1c\x1c(7),01444\x1f'9=82<.342\xff\xdb\x00C\x01\t\t\t\x0c\x0b\x0c\x18\r\r\x182!\x1c!22222222222222222222222222222222222222222222222222\xff\xc0\x00\x11\x08\x00(\x00#\x03\x01\"\x00\x02\x11\x01\x03\x11\x01\xff\xc4\x00\x1f\x00\x00\x01\x05\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x00\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\xff\xc4\x00\xb5\x10\x00\x02\x01\x03\x03\x02\x04\x03\x05\x05\x04\x04\x00\x00\x01}\x01\x02\x03\x00\x04\x11\x05\x12!1A\x06\x13Qa\x07\"q\x142\x81\x91\xa1\x08#B\xb1\xc1\x15R\xd1\xf0$3br\x82\t\n\x16\x17\x18\x19\x1a%&'()*456789:CDEFGHIJSTUVWXYZcdefghijstuvwxyz\x83\x84\x85\x86\x87\x88\x89\x8a\x92\x93\x94\x95\x96\x97\x98\x99\x9a\xa2\xa3\xa4\xa5\xa6\xa7\xa8\xa9\xaa\xb2\xb3\xb4\xb5\xb6\xb7\xb8\xb9\xba\xc2\xc3\xc4\xc5\xc6\xc7\xc8\xc9\xca\xd2\xd3\xd4\xd5\xd6\xd7\xd8\xd9\xda\xe1\xe2\xe3\xe4\xe5\xe6\xe7\xe8\xe9\xea\xf1\xf2\xf3\xf4\xf5\xf6\xf7\xf8\xf9\xfa\xff\xc4\x00\x1f\x01\x00\x03\x01\x01\x01\x01\x01\x01\x01\x01\x01\x00\x00\x00\x00\x00\x00\x01\x02\x03\x04\x05\x06\x07\x08\t\n\x0b\xff\xc4\x00\xb5\x11\x00\x02\x01\x02\x04\x04\x03\x04\x07\x05\x04\x04\x00\x01\x02w\x00\x01\x02\x03\x11\x04\x05!1\x06\x12AQ\x07aq\x13\"2\x81\x08\x14B\x91\xa1\xb1\xc1\t#3R\xf0\x15br\xd1\n\x16$4\xe1%\xf1\x17\x18\x19\x1a&'()*56789:CDEFGHIJSTUVWXYZcdefghijstuvwxyz\x82\x83\x84\x85\x86\x87\x88\x89\x8a\x92\x93\x94\x95\x96\x97\x98\x99\x9a\xa2\xa3\xa4\xa5\xa6\xa7\xa8\xa9\xaa\xb2\xb3\xb4\xb5\xb6\xb7\xb8\xb9\xba\xc2\xc3\xc4\xc5\xc6\xc7\xc8\xc9\xca\xd2\xd3\xd4\xd5\xd6\xd7\xd8\xd9\xda\xe2\xe3\xe4\xe5\xe6\xe7\xe8\xe9\xea\xf2\xf3\xf4\xf5\xf6\xf7\xf8\xf9\xfa\xff\xda\x00\x0c\x03\x01\x00\x02\x11\x03\x11\x00?\x00\xf5\x01#r\xc0\x1c\x01\x92q\xd0S\x9a\xea+x\x1a{\xa9\x92(\x82\x16R\xc7n\xefl\x9e+\x07\xc6z\xf0\xd3$\x16p\xa4A\xf2\xb2d\xb1S\x8eq\xfc'=\xff\x00:\xcf\x9a\xf7Q\xf1O\x85\x9eDB\xa9\x14\xdbJ\xc7\xceO\xe4\x0f\x7f\xd6\xaeUU\xb4*4\x9bj\xfb\x1d5\x9e\xadk}m\xba\x19\xe3\x92U8a\x1b\x02\x05`k\xfe'm1\x84\x0bl\x1d\x87F.F>\xb8\xebShKi\xa0\xe9-4\xf8I\xe7E\r\xba,\x98\xd8\x03\x81\x8c\xe4\xf5\xcf^A\x14\x96\x97:>\xb5rl\xae\x00\xbd\x91\x8b\"\xbbB\xcaz\xfd\xe1\xe9\xeb\xc1\x1c}1I\xc9\xc9+n5\x15\x17\xaa\xba,\xe9\xda\xb5\xd6\xa3a\r\xdb\xa2\xabH2F\x07c\x8f\xe9Etp\xd9\xc1o\x04p\xc5\x10\x11\xc6\xa1T{\n+U-52v\xbe\x86\x0f\x8c\xbc2\xfa\xcc\x90\xdc@3 \xc4dd\x0f\xa7\xf3\xadm\x13H\x87C\xd2\xa2\xb2\x1f31\xdc\xe4\x0e\x0b\x1cg\xf9\x01Z\x8e\xe7#\x18\x1e\xe6\xa2\xbb\xbb\x8a\xd9Y\x9d\x86\xc03\x9a\xc9E'r\xdc\xdb\x8f)\xc6\xfcF\xd3e\xb9\xb3\x82\xea0\xc7h*v\xfey\xff\x00>\x95\x93\xf0\xfbIxo\x1e\xfex\xdbj\x02\xa8I\xfe#\xd7\xf4\xcf\xe7]\xcc\x97\xd1\xdd\xda\xc8\x8a\x98S\xf2\xe5\xfe\\\xfd;\xf1\x8c\xfe\x1d\xba\xd3\x86AX\xc4,\x15F7\xed\x00\x13\xdf\x8c\xf1\xcei{?{\x98~\xd3\xdc\xe5,1%\x89\x07\x03\xd0QF(\xadL\xc9\xd9\xc6*\xa5\xec\"x\n\xed\xdcr\x1b\x1e\xb84QR\x80\xa0\xc8\xb3C\xf6i\"|0\xc6\x0eG\x1f^\xb9\xabS\\}\x968`p\xca\xa3\x01X\xe4\x8f\xc4\xff\x00\x8d\x14U\x89\n\xf7r+m\x8ebT\x01\x8c-\x14QH\x0f\xff\xd9"  # noqa: E501
 
 
+@pytest.mark.usefixtures("new_database")
+class TestRecipeImages(DBTest):
+    def test_identical_images_are_stored_once(self):
+        r1 = self.db.add_rec({"title": "Same picture", "image": img})
+        r2 = self.db.add_rec({"title": "Same picture again", "image": img})
+        self.assertEqual(r1.image_id, r2.image_id)
+        self.assertEqual(self.db.fetch_len(self.db.recipe_images_table, id=r1.image_id), 1)
+        self.assertEqual(self.db.get_image(r2), img)
+        self.assertEqual(bytes_to_image(self.db.get_thumb(r2)).size, (35, 40))
+        self.assertEqual(bytes_to_image(self.db.get_preview(r2)).size, (35, 40))
+
+    def test_unused_images_are_deleted(self):
+        # An image no other test uses
+        image = image_to_bytes(bytes_to_image(img).rotate(90))
+        r1 = self.db.add_rec({"title": "Picture", "image": image})
+        r2 = self.db.add_rec({"title": "Shared picture", "image": image})
+        image_id = r1.image_id
+        r1 = self.db.modify_rec(r1, {"image": None})
+        self.assertIsNone(r1.image_id)
+        self.assertIsNone(self.db.get_image(r1))
+        self.assertEqual(self.db.fetch_len(self.db.recipe_images_table, id=image_id), 1)
+        self.db.delete_rec(r2)
+        self.assertEqual(self.db.fetch_len(self.db.recipe_images_table, id=image_id), 0)
+
+    def test_images_move_off_old_recipe_rows(self):
+        rd = self.new_database()
+        path = rd.db.url.database
+        rd.base_connection.close()
+        rd.db.dispose()
+        # Put the recipe table back the way it was before recipe_images.
+        columns = ["%s %s" % (c.name, c.type.compile(rd.db.dialect)) for c in rd.recipe_table.columns if c.name != "image_id"]
+        con = sqlite3.connect(path)
+        con.execute("DROP TABLE recipe")
+        con.execute("CREATE TABLE recipe (%s, image BLOB, thumb BLOB)" % ", ".join(columns))
+        con.executemany("INSERT INTO recipe (id, title, image, deleted) VALUES (?, ?, ?, 0)", [(1, "One", img), (2, "Two", img), (3, "None", None)])
+        con.commit()
+        con.close()
+
+        rd = db.RecData(None, rd.url)
+        columns = [c["name"] for c in sqlalchemy.inspect(rd.db).get_columns("recipe")]
+        self.assertNotIn("image", columns)
+        self.assertNotIn("thumb", columns)
+        self.assertEqual(rd.fetch_len(rd.recipe_images_table), 1)
+        self.assertEqual(rd.get_image(rd.get_rec(1)), img)
+        self.assertEqual(rd.get_image(rd.get_rec(2)), img)
+        self.assertTrue(rd.get_thumb(rd.get_rec(2)))
+        self.assertIsNone(rd.get_image(rd.get_rec(3)))
+
+
 class TestMoreDataStuff(DBTest):
     def test_image_data(self):
         r = self.db.add_rec({"image": img})
-        self.assertEqual(r.image, img)
+        self.assertEqual(self.db.get_image(r), img)
 
     def test_update(self):
         r = self.db.add_rec({"title": "Foo", "cuisine": "Bar", "source": "Z"})
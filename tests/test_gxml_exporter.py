@@ -0,0 +1,205 @@
+import base64
+import io
+import os
+import re
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from gourmand.exporters.exporter import ExporterMultirec
+from gourmand.exporters.xml_exporter import XmlExporter
+from gourmand.image_utils import image_to_bytes
+from gourmand.plugins.import_export.gxml_plugin import gxml2_exporter, gxml2_importer
+
+
+class rec_to_xml_dom(XmlExporter):
+    """rec_to_xml as it was, building each recipe in a DOM document,
+    to check the streaming exporter against.
+
+    The whole document is held in memory until write_foot.
+    """
+
+    doc_element = "gourmetDoc"
+    doctype_desc = ""
+    dtd_path = ""
+    ALLOW_PLUGINS_TO_WRITE_NEW_FIELDS = False
+
+    def write_head(self):
+        self.rec_el = self.create_element_with_attrs("recipe", {"id": self.r.id})
+        self.top_element.appendChild(self.rec_el)
+
+    def write_attr(self, attr, text):
+        self.rec_el.appendChild(self.create_text_element(attr.replace(" ", ""), text))
+
+    def write_text(self, attr, text):
+        self.rec_el.appendChild(self.create_text_element(attr.replace(" ", ""), text))
+
+    def write_image(self, image):
+        image_el = self.create_element_with_attrs("image", {"format": "jpeg"})
+        image_el.appendChild(self.xmlDoc.createCDATASection(base64.b64encode(image).decode()))
+        self.rec_el.appendChild(image_el)
+
+    def handle_italic(self, chunk):
+        return "&lt;i&gt;" + chunk + "&lt;/i&gt;"
+
+    def handle_bold(self, chunk):
+        return "&lt;b&gt;" + chunk + "&lt;/b&gt;"
+
+    def handle_underline(self, chunk):
+        return "&lt;u&gt;" + chunk + "&lt;/u&gt;"
+
+    def write_foot(self):
+        if self.i_created_this_document:
+            self.xmlDoc.writexml(self.ofi, newl="\n", addindent="\t", encoding="UTF-8")
+
+    def write_inghead(self):
+        self.inglist_el = self.xmlDoc.createElement("ingredient-list")
+        self.top_inglist = self.inglist_el  # because groups will let us nest...
+        self.rec_el.appendChild(self.inglist_el)
+
+    def write_ingref(self, amount=1, unit=None, item=None, refid=None, optional=False):
+        self.inglist_el.appendChild(self.create_text_element("ingref", item, {"refid": str(refid), "amount": amount}))
+
+    def write_ing(self, amount=1, unit=None, item=None, key=None, optional=False):
+        if optional:
+            ing_el = self.create_element_with_attrs("ingredient", {"optional": "yes"})
+        else:
+            ing_el = self.create_element_with_attrs("ingredient", {})
+        self.inglist_el.appendChild(ing_el)
+        if amount:
+            ing_el.appendChild(self.create_text_element("amount", amount))
+        if unit:
+            ing_el.appendChild(self.create_text_element("unit", unit))
+        if item:
+            ing_el.appendChild(self.create_text_element("item", item))
+        if key:
+            ing_el.appendChild(self.create_text_element("key", key))
+
+    def write_grouphead(self, name):
+        group_el = self.xmlDoc.createElement("inggroup")
+        group_el.appendChild(self.create_text_element("groupname", name))
+        self.inglist_el = group_el
+
+    def write_groupfoot(self):
+        self.top_inglist.appendChild(self.inglist_el)
+        self.inglist_el = self.top_inglist
+
+
+class recipe_table_to_xml_dom(ExporterMultirec, XmlExporter):
+    doc_element = "gourmetDoc"
+    doctype_desc = ""
+    dtd_path = ""
+
+    def __init__(self, rd, recipe_table, out, one_file=True, change_units=False, mult=1):
+        self.create_xmldoc()
+        ExporterMultirec.__init__(
+            self,
+            rd,
+            recipe_table,
+            out,
+            one_file=True,
+            ext="xml",
+            exporter=rec_to_xml_dom,
+            exporter_kwargs={
+                "change_units": change_units,
+                "mult": mult,
+                "xmlDoc": self.xmlDoc,
+                "attr_order": gxml2_exporter.ATTR_ORDER,
+                "order": gxml2_exporter.ORDER,
+            },
+        )
+
+    def write_footer(self, *args):
+        self.xmlDoc.writexml(self.ofi, newl="\n", addindent="\t", encoding="UTF-8")
+
+
+def export(rd, recs, exporter_class=gxml2_exporter.recipe_table_to_xml, out=None):
+    out = out or io.StringIO()
+    exporter_class(rd, list(recs), out).do_run()
+    return out
+
+
+@pytest.mark.usefixtures("new_database")
+class TestStreamingExport(unittest.TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.rd = self.new_database()
+        soup = self.rd.add_rec(
+            {
+                "title": 'Soup & "stuff" <with> brackets',
+                "cuisine": "Thai",
+                "source": "Grandma",
+                "rating": 7,
+                "preptime": 600,
+                "yields": 3,
+                "yield_unit": "cups",
+                "instructions": "Stir <i>well</i> & serve <b>hot</b>.",
+                "modifications": "Add more <u>salt</u>.",
+            }
+        )
+        bread = self.rd.add_rec({"title": "Bread", "instructions": "Bake."})
+        self.rd.do_add_cat({"recipe_id": soup.id, "category": "Soup"})
+        self.rd.add_ings(
+            [
+                {"recipe_id": soup.id, "amount": 1, "unit": "c.", "item": "water", "ingkey": "water", "position": 0},
+                {"recipe_id": soup.id, "amount": 2, "item": "eggs", "ingkey": "egg", "optional": True, "inggroup": "Garnish", "position": 1},
+                {"recipe_id": soup.id, "amount": 1, "unit": "slice", "item": "Bread", "refid": bread.id, "position": 2},
+                {"recipe_id": bread.id, "amount": 3, "unit": "c.", "item": "flour", "ingkey": "flour, all-purpose", "position": 0},
+            ]
+        )
+        image = image_to_bytes(Image.effect_noise((400, 300), 64).convert("RGB"))
+        self.rd.modify_rec(soup, {"image_id": self.rd.store_image(image)})
+        self.recs = [self.rd.get_rec(soup.id), self.rd.get_rec(bread.id)]
+
+    def test_matches_dom_export(self):
+        self.assertEqual(export(self.rd, self.recs).getvalue(), export(self.rd, self.recs, recipe_table_to_xml_dom).getvalue())
+
+    def test_single_recipe(self):
+        out = io.StringIO()
+        gxml2_exporter.rec_to_xml(self.rd, self.recs[1], out, attr_order=gxml2_exporter.ATTR_ORDER, order=gxml2_exporter.ORDER).do_run()
+        self.assertEqual(out.getvalue(), export(self.rd, self.recs[1:]).getvalue())
+
+    def test_round_trip(self):
+        def normalize(xml):
+            xml = re.sub(r'(id)="\d+"', r'\1="#"', xml)
+            return re.sub(r"<!\[CDATA\[[^]]*\]\]>", "", xml)
+
+        filename = self.directory / "recipes.grmt"
+        with open(filename, "w", encoding="utf-8") as out:
+            export(self.rd, self.recs, out=out)
+        converter = gxml2_importer.Converter(str(filename))
+        converter.do_run()
+        rm = converter.rh.rd
+        imported = sorted(converter.added_recs, key=lambda rec: rec.title, reverse=True)
+        self.assertEqual([rec.title for rec in imported], [rec.title for rec in self.recs])
+        self.assertEqual(normalize(export(rm, imported).getvalue()), normalize(export(self.rd, self.recs).getvalue()))
+        self.assertEqual(Image.open(io.BytesIO(rm.get_image(imported[0]))).size, (400, 300))
+
+    def test_peak_memory(self):
+        recs = []
+        for n in range(16):
+            # Not really a JPEG, but the exporter does not care.
+            image_id = self.rd.store_image(os.urandom(2**19), thumb=b"")
+            recs.append(self.rd.add_rec({"title": "Recipe %s" % n, "image_id": image_id}))
+
+        def peak(exporter_class):
+            with open(self.directory / "peak.grmt", "w", encoding="utf-8") as out:
+                tracemalloc.start()
+                try:
+                    export(self.rd, recs, exporter_class, out)
+                    return tracemalloc.get_traced_memory()[1]
+                finally:
+                    tracemalloc.stop()
+
+        dom_peak = peak(recipe_table_to_xml_dom)
+        streaming_peak = peak(gxml2_exporter.recipe_table_to_xml)
+        # The DOM holds every encoded image at once; streaming, one.
+        self.assertLess(streaming_peak * 4, dom_peak)
+
+
+if __name__ == "__main__":
+    unittest.main()
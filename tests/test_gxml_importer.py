@@ -0,0 +1,85 @@
+import base64
+import io
+import tempfile
+import tracemalloc
+import unittest
+from pathlib import Path
+
+from PIL import Image
+
+from gourmand.image_utils import image_to_bytes
+from gourmand.importers import xml_importer
+from gourmand.plugins.import_export.gxml_plugin import gxml2_importer
+
+RECIPE = """<recipe id="%(id)s">
+<title>Recipe %(id)s</title>
+<category>Test</category>
+<ingredient-list>
+<ingredient><amount>2</amount><unit>cups</unit><item>flour</item></ingredient>
+</ingredient-list>
+%(image)s<instructions>%(instructions)s</instructions>
+</recipe>
+"""
+INSTRUCTIONS = "Stir the pot &amp; taste it. " * 20
+
+
+def write_gxml2(filename, n_recipes, image):
+    # Split the image over many lines, as our exporter does.
+    encoded = base64.b64encode(image).decode()
+    image_element = '<image format="jpeg"><![CDATA[%s]]></image>\n' % "\n".join(encoded[i : i + 76] for i in range(0, len(encoded), 76))
+    with open(filename, "w", encoding="utf-8") as out:
+        out.write('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE gourmetDoc>\n<gourmetDoc>\n')
+        for n in range(n_recipes):
+            out.write(RECIPE % {"id": n, "image": image_element, "instructions": INSTRUCTIONS})
+        out.write("</gourmetDoc>\n")
+
+
+class TestBase64Decoder(unittest.TestCase):
+    def test_pieces(self):
+        data = bytes(range(256)) * 3
+        encoded = base64.encodebytes(data).decode()
+        for size in [1, 3, 5, 77]:
+            decoder = xml_importer.Base64Decoder()
+            for start in range(0, len(encoded), size):
+                decoder.feed(encoded[start : start + size])
+            self.assertEqual(decoder.close(), data)
+
+
+class TestStreamingImport(unittest.TestCase):
+    def import_file(self, n_recipes):
+        """Import a file of n_recipes, returning (converter, file size, peak memory, progress)."""
+        filename = Path(tempfile.mkdtemp()) / "recipes.grmt"
+        image = image_to_bytes(Image.effect_noise((500, 500), 64).convert("RGB"))
+        write_gxml2(filename, n_recipes=n_recipes, image=image)
+        converter = gxml2_importer.Converter(str(filename))
+        converter.rh.batch_size = 2
+        progress = []
+        converter.emit = lambda signal, fraction, message: progress.append(fraction)
+        tracemalloc.start()
+        try:
+            converter.do_run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return converter, filename.stat().st_size, peak, progress
+
+    def test_peak_memory(self):
+        # The first import sets up all sorts, which we leave out.
+        self.import_file(8)
+        converter, size, peak, progress = self.import_file(24)
+        self.assertEqual(converter.rh.count, 24)
+        rd = converter.rh.rd
+        imported = sorted(converter.added_recs, key=lambda rec: rec.id)
+        self.assertEqual(rd.get_rec(imported[-1].id).instructions, INSTRUCTIONS.replace("&amp;", "&").strip())
+        self.assertEqual(Image.open(io.BytesIO(rd.get_image(imported[-1]))).size, (500, 500))
+        self.assertEqual(progress, sorted(progress))
+        self.assertEqual(progress[-1], 1)
+
+        small_size, small_peak = self.import_file(8)[1:3]
+        self.assertGreater(size, 2 * small_size)
+        # We hold a batch of recipes at a time, never the whole file, so
+        # a bigger file barely raises our peak.
+        self.assertLess(peak - small_peak, (size - small_size) / 8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import contextlib
 import unittest
 
 from gourmand.importers import importer
@@ -9,6 +10,7 @@ class TestImporter(unittest.TestCase):
         self.i = importer.Importer()
 
     def _get_last_rec_(self):
+        self.i.flush_recs()
         return self.i.added_recs[-1]
 
     def test_recipe_import(self):
@@ -37,6 +39,81 @@ class TestImporter(unittest.TestCase):
         self.assertEqual(ing.unit, "cups")
         self.assertEqual(ing.item, "water")
 
+    def test_parse(self):
+        def do_run():
+            self.i.start_rec()
+            self.i.rec.update({"title": "Sauce", "id": "sauce", "rating": "Great"})
+            self.i.commit_rec()
+            self.i.start_rec()
+            self.i.rec["title"] = "Pasta"
+            self.i.start_ing()
+            self.i.add_ref("sauce")
+            self.i.add_item("Sauce")
+            self.i.commit_ing()
+            self.i.commit_rec()
+
+        self.i.do_run = do_run
+        recipes = self.i.rd.fetch_len(self.i.rd.recipe_table)
+        (sauce, sauce_ings), (pasta, pasta_ings) = list(self.i.parse())
+        self.assertEqual(self.i.rd.fetch_len(self.i.rd.recipe_table), recipes)
+        self.assertEqual(sauce["rating"], "Great")
+        self.assertLess(sauce["id"], 0)
+        self.assertEqual(sauce_ings, [])
+        self.assertEqual(pasta["title"], "Pasta")
+        self.assertEqual([ing["refid"] for ing in pasta_ings], [sauce["id"]])
+
+    def test_references_across_batches(self):
+        self.i.batch_size = 2
+        reserved = []
+        reserve_ids = self.i.rd.reserve_ids
+        self.i.rd.reserve_ids = lambda n: reserved.append(n) or reserve_ids(n)
+        for title, rid, refs in [("Pasta", None, ["sauce", "cheese"]), ("Cheese", "cheese", []), ("Sauce", "sauce", []), ("Lasagna", None, ["sauce"])]:
+            self.i.start_rec()
+            self.i.rec.update({"title": title, "id": rid})
+            for ref in refs:
+                self.i.start_ing()
+                self.i.add_ref(ref)
+                self.i.add_item(ref)
+                self.i.commit_ing()
+            self.i.commit_rec()
+        self.i.flush_recs()
+        pasta, cheese, sauce, lasagna = self.i.added_recs[-4:]
+        # Both references from the first batch are reserved together.
+        self.assertEqual(reserved, [2])
+        self.assertEqual([i.refid for i in self.i.rd.get_ings(pasta)], [sauce.id, cheese.id])
+        self.assertEqual([i.refid for i in self.i.rd.get_ings(lasagna)], [sauce.id])
+        self.assertEqual(sauce.title, "Sauce")
+        self.assertFalse(sauce.deleted)
+
+    def test_recipes_are_kept_when_terminated(self):
+        titles = ["Terminated %s" % n for n in range(3)]
+
+        def do_run():
+            for title in titles:
+                self.i.start_rec()
+                self.i.rec["title"] = title
+                self.i.commit_rec()
+            self.i.terminate()
+            self.i.check_for_sleep()
+            self.fail("check_for_sleep should have raised Terminated")
+
+        self.i.do_run = do_run
+        self.i.run()
+        self.assertEqual([r.title for r in self.i.added_recs], titles)
+        for rec in self.i.added_recs:
+            self.assertEqual(self.i.rd.get_rec(rec.id).title, rec.title)
+
+    def test_recipes_are_kept_after_an_error(self):
+        def do_run():
+            self.i.start_rec()
+            self.i.rec["title"] = "Before the error"
+            self.i.commit_rec()
+            raise ValueError("bad file")
+
+        self.i.do_run = do_run
+        self.i.run()
+        self.assertEqual(self.i.rd.get_rec(self.i.added_recs[-1].id).title, "Before the error")
+
 
 class ImporterTest(unittest.TestCase):
 
@@ -80,6 +157,9 @@ class RatingConverterTest(unittest.TestCase):
                 for attr, val in list(d.items()):
                     self.recs[n][attr] = val
 
+            def transaction(self):
+                return contextlib.nullcontext()
+
         self.db = FakeDB()
 
     def test_automatic_converter(self):
@@ -0,0 +1,181 @@
+import unittest
+from collections import defaultdict
+
+import pytest
+import sqlalchemy
+
+from gourmand.defaults.defaults import lang as defaults
+from gourmand.keymanager import KeyManager
+
+ITEMS = [
+    "flour",
+    "all-purpose flour",
+    "Whole Wheat Flour",
+    "sugar",
+    "brown sugar",
+    "eggs",
+    "egg",
+    "large eggs, beaten",
+    "butter",
+    "unsalted butter",
+    "salt",
+    "onions",
+    "red onion",
+    "garlic cloves",
+    "tomatoes",
+    "canned tomatoes",
+    "milk",
+    "olive oil",
+    "black pepper",
+    "chicken breasts",
+    "cabbage, shredded",
+    "fresh basil leaves",
+    "basil",
+    "no such thing",
+    "smoked paprika",
+]
+
+
+def sql_look_for_key(rm, txt):
+    """KeyManager.look_for_key as it was before the in-memory index."""
+    txt = txt.casefold()
+    retvals = defaultdict(float)
+    main_txts = [txt]
+    main_txts.extend(defaults.guess_singulars(txt))
+    if len(main_txts) == 1:
+        main_txts.extend(defaults.guess_plurals(txt))
+    for t in main_txts:
+        if rm.fetch_one(rm.ingredients_table, ingkey=t) is not None:
+            retvals[t] = 0.9
+        exact = rm.fetch_all(rm.keylookup_table, item=t)
+        for o in exact:
+            retvals[o.ingkey] += (float(o.count) / len(exact)) * 2
+    words = KeyManager.word_splitter.split(txt)
+    nwords = len(words)
+    extra_words = []
+    for word in words:
+        singulars = defaults.guess_singulars(word)
+        for s in singulars:
+            if s not in extra_words:
+                extra_words.append(s)
+        if not singulars:
+            for p in defaults.guess_plurals(word):
+                if p not in extra_words:
+                    extra_words.append(p)
+    words.extend(extra_words)
+    for word in words:
+        if not word:
+            return
+        srch = rm.fetch_all(rm.keylookup_table, word=word)
+        total_count = sum([m.count for m in srch])
+        for match in srch:
+            ik = match.ingkey
+            words_in_key = len(ik.split())
+            wordcount = words_in_key if words_in_key > nwords else nwords
+            retvals[ik] += (match.count / total_count) * (1 / wordcount)
+            if word in ik:
+                retvals[ik] += 0.1
+    retv = list(retvals.items())
+    retv.sort(key=lambda x: x[1])
+    return retv
+
+
+@pytest.mark.usefixtures("new_database")
+class TestKeyManagerIndex(unittest.TestCase):
+    def setUp(self):
+        self.rd = self.new_database()
+        # A new KeyManager seeds keylookup from defaults.keydic
+        self.km = KeyManager(recipe_manager=self.rd)
+        rec = self.rd.add_rec({"title": "Keys"})
+        for item, key in [
+            ("all-purpose flour", "flour, all-purpose"),
+            ("whole wheat flour", "flour, whole-wheat"),
+            ("large eggs", "egg"),
+            ("Red Onion", "onion, red"),
+            ("garlic cloves", "garlic"),
+            ("brown sugar", "sugar, brown"),
+            ("brown sugar", "sugar, brown"),
+        ]:
+            self.rd.add_ing_and_update_keydic({"recipe_id": rec.id, "item": item, "ingkey": key})
+        self.rec = rec
+
+    def assertMatchesDatabase(self):
+        for item in ITEMS:
+            self.assertEqual(self.km.look_for_key(item), sql_look_for_key(self.rd, item), item)
+            fast = self.rd.fetch_all(self.rd.keylookup_table, item=item, sort_by=[("count", 1)])
+            if fast:
+                self.assertEqual(self.km.get_key_fast(item), fast[-1].ingkey)
+
+    def test_rankings_match_database(self):
+        self.assertTrue(self.rd.fetch_len(self.rd.keylookup_table))
+        self.assertMatchesDatabase()
+
+    def test_index_follows_keydic_changes(self):
+        self.km.look_for_key("flour")
+        self.rd.add_ing_and_update_keydic({"recipe_id": self.rec.id, "item": "smoked paprika", "ingkey": "paprika, smoked"})
+        self.rd.add_ing_to_keydic("Whole Wheat Flour", "flour, whole-wheat")
+        self.rd.remove_ing_from_keydic("brown sugar", "sugar, brown")
+        self.rd.remove_ing_from_keydic("Red Onion", "onion, red")
+        self.rd.add_ings([{"recipe_id": self.rec.id, "item": "basil", "ingkey": "basil"}])
+        self.assertMatchesDatabase()
+        self.rd.delete_key_from_keydic("egg")
+        self.assertMatchesDatabase()
+
+    def test_index_forgets_keys_no_longer_used(self):
+        def score():
+            self.assertEqual(self.km.look_for_key("zucchini"), sql_look_for_key(self.rd, "zucchini"))
+            return dict(self.km.look_for_key("zucchini") or []).get("zucchini", 0)
+
+        before = score()
+        ing = self.rd.add_ing({"recipe_id": self.rec.id, "item": "zucchini", "ingkey": "zucchini"})
+        in_use = score()
+        self.assertGreater(in_use, before)
+        self.rd.modify_ing(ing, {"ingkey": "squash, summer"})
+        self.assertEqual(score(), before)
+        self.rd.update_by_criteria(self.rd.ingredients_table, {"ingkey": "squash, summer"}, {"ingkey": "zucchini"})
+        self.assertEqual(score(), in_use)
+        self.rd.delete_ing(ing)
+        self.assertEqual(score(), before)
+
+    def test_index_is_read_once(self):
+        self.km.look_for_key("flour")
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sqlalchemy.event.listen(self.rd.db, "before_cursor_execute", before_cursor_execute)
+        try:
+            self.km.get_keys(ITEMS)
+        finally:
+            sqlalchemy.event.remove(self.rd.db, "before_cursor_execute", before_cursor_execute)
+        self.assertEqual(len(statements), 1)
+
+    def test_deleting_ingredients_does_not_reread_them(self):
+        self.km.look_for_key("garlic")
+        last_id = self.km.last_ingredient_id
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, *args):
+            statements.append((statement, parameters))
+
+        self.rd.delete_ing(self.rd.get_ings(self.rec)[-1])
+        sqlalchemy.event.listen(self.rd.db, "before_cursor_execute", before_cursor_execute)
+        try:
+            self.km.get_keys(ITEMS)
+            lookups = len(statements)
+            self.km.get_keys(ITEMS)
+        finally:
+            sqlalchemy.event.remove(self.rd.db, "before_cursor_execute", before_cursor_execute)
+        # We go on from the last ingredient we saw, and look up each key
+        # that comes up just once.
+        self.assertEqual([parameters for statement, parameters in statements if "ingredients.id >" in statement], [(last_id,), (last_id,)])
+        self.assertEqual(len(statements), lookups + 1)
+        self.assertMatchesDatabase()
+
+    def test_get_keys(self):
+        self.assertEqual(self.km.get_keys(ITEMS + ITEMS[:3]), [self.km.get_key(item) for item in ITEMS + ITEMS[:3]])
+
+
+if __name__ == "__main__":
+    unittest.main()
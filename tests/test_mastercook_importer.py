@@ -0,0 +1,97 @@
+import tempfile
+import tracemalloc
+import unittest
+import unittest.mock
+from pathlib import Path
+
+from gourmand.importers import xml_importer
+from gourmand.plugins.import_export.mastercook_import_plugin.mastercook_importer import MastercookImporter, Mx2Cleaner
+
+TEST_FILE_DIRECTORY = Path(__file__).parent / "recipe_files"
+
+# One of each thing our cleaner fixes: a quote inside an attribute, and
+# a line that is not in cp1252.
+BROKEN_RECIPE = b"""<RcpE name="Pie" author="n/a">\r
+<IngR name="9" pie plate" unit="each" qty="1"></IngR>\r
+<IngR name="cr\xe8me fra\x81che" unit="cup" qty="1"></IngR>\r
+</RcpE>\r
+"""
+
+
+def clean_line_by_line(filename):
+    # How Mx2Cleaner used to clean a whole file at once.
+    cleaner = Mx2Cleaner()
+    with open(filename, "rb") as infile:
+        return "".join(cleaner.fix_attrs(cleaner.toss_regs(cleaner.decode(line))) for line in infile.readlines())
+
+
+def read_all(cleaned, size):
+    pieces = []
+    while True:
+        piece = cleaned.read(size)
+        if not piece:
+            return "".join(pieces)
+        assert len(piece) <= size
+        pieces.append(piece)
+
+
+def write_mx2(filename, copies):
+    # athenos.mx2's recipes and ours, copies times over.
+    athenos = (TEST_FILE_DIRECTORY / "athenos.mx2").read_bytes()
+    recipes = athenos[athenos.index(b"<RcpE") : athenos.index(b"</mx2>")]
+    with open(filename, "wb") as out:
+        out.write(athenos[: athenos.index(b"<RcpE")])
+        for n in range(copies):
+            out.write(recipes + BROKEN_RECIPE)
+        # No line break at the end.
+        out.write(b"</mx2>")
+
+
+class TestMx2Cleaner(unittest.TestCase):
+    def setUp(self):
+        self.directory = Path(tempfile.mkdtemp())
+        self.small = self.directory / "small.mx2"
+        write_mx2(self.small, 1)
+        self.big = self.directory / "big.mx2"
+        write_mx2(self.big, 8)
+
+    def test_same_as_line_by_line(self):
+        for filename in [TEST_FILE_DIRECTORY / "athenos.mx2", self.small, self.big]:
+            expected = clean_line_by_line(filename)
+            with Mx2Cleaner().open(filename) as cleaned:
+                self.assertEqual(cleaned.read(), expected)
+            with Mx2Cleaner().open(filename) as cleaned:
+                self.assertEqual(read_all(cleaned, 1000), expected)
+        self.assertIn("""<IngR name='9" pie plate' unit="each" qty="1">""", expected)
+        self.assertIn("cr\xe8me fra\x81che", expected)
+
+    def test_lines_across_chunks(self):
+        expected = clean_line_by_line(self.small)
+        for chunk_size in [1, 10, 100]:
+            with unittest.mock.patch.object(xml_importer, "CHUNK_SIZE", chunk_size):
+                with Mx2Cleaner().open(self.small) as cleaned:
+                    self.assertEqual(read_all(cleaned, 4096), expected)
+
+    def test_peak_memory(self):
+        self.assertGreater(self.big.stat().st_size, 2 * 16 * xml_importer.CHUNK_SIZE)
+        with Mx2Cleaner().open(self.big) as cleaned:
+            tracemalloc.start()
+            try:
+                while cleaned.read(xml_importer.CHUNK_SIZE):
+                    pass
+                peak = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        self.assertLess(peak, 16 * xml_importer.CHUNK_SIZE)
+
+    def test_import(self):
+        importer = MastercookImporter(str(self.small))
+        importer.do_run()
+        self.assertEqual(importer.rh.count, 101)
+        self.assertEqual(importer.added_recs[-1].title, "Pie")
+        # We clean the file as we read it, leaving no cleaned copy behind.
+        self.assertEqual(sorted(self.directory.iterdir()), [self.big, self.small])
+
+
+if __name__ == "__main__":
+    unittest.main()
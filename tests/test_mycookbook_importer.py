@@ -0,0 +1,39 @@
+import io
+import shutil
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+from PIL import Image
+
+from gourmand.plugins.import_export.mycookbook_plugin.mycookbook_importer_plugin import MCBPlugin
+
+TEST_FILE_DIRECTORY = Path(__file__).parent / "recipe_files"
+
+
+class TestMCBImport(unittest.TestCase):
+    def test_import(self):
+        directory = Path(tempfile.mkdtemp())
+        filename = directory / "mycookbook.mcb"
+        shutil.copy(TEST_FILE_DIRECTORY / "mycookbook.mcb", filename)
+
+        importer = MCBPlugin().get_importer(str(filename))
+        importer.do_run()
+
+        self.assertEqual(importer.rh.count, 1)
+        rec = importer.added_recs[0]
+        self.assertEqual(rec.title, "Best Brownies")
+        self.assertEqual(rec.link, "https://www.allrecipes.com/recipe/10549/best-brownies/")
+        # The image comes straight from the archive...
+        Image.open(io.BytesIO(importer.rh.rd.get_image(rec))).verify()
+        # ...which we never unzip.
+        self.assertEqual(list(directory.iterdir()), [filename])
+
+    def test_not_a_zip_file(self):
+        with self.assertRaises(zipfile.BadZipfile):
+            MCBPlugin().get_importer(str(TEST_FILE_DIRECTORY / "athenos.mx2"))
+
+
+if __name__ == "__main__":
+    unittest.main()
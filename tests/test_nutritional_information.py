@@ -1,8 +1,25 @@
+from collections import namedtuple
 from unittest.mock import Mock
 
 import pytest
+import sqlalchemy
 
-from gourmand.plugins.nutritional_information.nutrition import NutritionData
+from gourmand.convert import get_converter
+from gourmand.plugins.nutritional_information import databaseGrabber
+from gourmand.plugins.nutritional_information.data_plugin import NutritionDataPlugin
+from gourmand.plugins.nutritional_information.nutrition import NutritionData, NutritionInfoList
+from gourmand.plugins.nutritional_information.parser_data import SUMMABLE_FIELDS
+
+Ingredient = namedtuple("Ingredient", "amount unit ingkey")
+
+INGREDIENTS = [
+    Ingredient(2, "c.", "flour, all-purpose"),
+    Ingredient(1, "c.", "milk"),
+    Ingredient(2, "", "egg"),
+    Ingredient(1, "tbs.", "butter"),
+    Ingredient(3, "clove", "garlic"),
+    Ingredient(1, "pinch", "unicorn dust"),
+]
 
 
 @pytest.mark.parametrize(
@@ -21,3 +38,131 @@ def test_get_matches(description, mock_content, expected):
 
     ret = nd.get_matches(description)
     assert ret == expected
+
+
+def nutrition_database(new_database):
+    rd = new_database()
+    plugin = NutritionDataPlugin()
+    plugin.db = rd
+    plugin.create_tables()
+    rd.metadata.create_all()
+    return rd
+
+
+@pytest.fixture
+def nutrition_data(new_database):
+    rd = nutrition_database(new_database)
+    for ndbno, desc, kcal, weights in [
+        (20081, "WHEAT FLOUR,WHITE,ALL-PURPOSE,ENRICHED", 364, [(1, "cup", 125)]),
+        (1077, "MILK,WHL,3.25% MILKFAT", 61, [(1, "cup", 244)]),
+        (1123, "EGG,WHL,RAW,FRSH", 143, [(1, "large", 50), (1, "medium", 44)]),
+        (1001, "BUTTER,WITH SALT", 717, [(1, "cup, melted", 227), (1, "cup, whipped", 151), (1, "pat (1\" sq, 1/3\" high)", 5)]),
+        (11215, "GARLIC,RAW", 149, []),
+    ]:
+        rd.do_add_nutrition({"ndbno": ndbno, "desc": desc, "kcal": kcal})
+        for amount, unit, gramwt in weights:
+            rd.do_add(rd.usda_weights_table, {"ndbno": ndbno, "amount": amount, "unit": unit, "gramwt": gramwt})
+    nd = NutritionData(rd, get_converter())
+    for key, ndbno in [("flour, all-purpose", 20081), ("milk", 1077), ("egg", 1123), ("butter", 1001), ("garlic", 11215)]:
+        nd.set_key_from_ndbno(key, ndbno)
+    nd.set_conversion("garlic", "clove", 0.33)
+    return nd
+
+
+def count_queries(rd, func):
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    sqlalchemy.event.listen(rd.db, "before_cursor_execute", before_cursor_execute)
+    try:
+        ret = func()
+    finally:
+        sqlalchemy.event.remove(rd.db, "before_cursor_execute", before_cursor_execute)
+    return ret, len(statements)
+
+
+def kcal(nd, ingredients):
+    return nd.get_nutinfo_for_inglist(ingredients, nd.db).kcal
+
+
+def test_nutrition_is_read_once(nutrition_data):
+    first, first_queries = count_queries(nutrition_data.db, lambda: kcal(nutrition_data, INGREDIENTS))
+    second, second_queries = count_queries(nutrition_data.db, lambda: kcal(nutrition_data, INGREDIENTS))
+    assert first == second == kcal(NutritionData(nutrition_data.db, nutrition_data.conv), INGREDIENTS) > 0
+    assert first_queries > 0
+    assert second_queries == 0
+    hits, misses, rate = nutrition_data.get_cache_stats()["alias"]
+    assert misses == len(INGREDIENTS)
+    assert rate == hits / (hits + misses) > 0.5
+
+
+def test_setters_invalidate_cache(nutrition_data):
+    def assertMatchesDatabase(ingredients):
+        assert kcal(nutrition_data, ingredients) == kcal(NutritionData(nutrition_data.db, nutrition_data.conv), ingredients)
+
+    garlic = [Ingredient(3, "clove", "garlic"), Ingredient(1, "c.", "garlic")]
+    before = kcal(nutrition_data, garlic)
+    nutrition_data.set_conversion("garlic", "clove", 0.05)
+    assertMatchesDatabase(garlic)
+    nutrition_data.set_key_from_ndbno("garlic", 1001)
+    assertMatchesDatabase(garlic)
+    assert kcal(nutrition_data, garlic) != before
+    # Unlike butter, the converter has no default density for this.
+    butter = [Ingredient(1, "c.", "spread, buttery")]
+    nutrition_data.set_key_from_ndbno("spread, buttery", 1001)
+    before = kcal(nutrition_data, butter)
+    nutrition_data.set_density_for_key("spread, buttery", "whipped")
+    assertMatchesDatabase(butter)
+    assert kcal(nutrition_data, butter) != before
+    assert not nutrition_data.get_nutinfo("unicorn dust")
+    ndbno = nutrition_data.add_custom_nutrition_info({"desc": "unicorn dust", "kcal": 1000})
+    assert nutrition_data.get_nutinfo("unicorn dust").ndbno == ndbno
+
+
+def test_list_totals(nutrition_data):
+    rd = nutrition_data.db
+    nutinfo = nutrition_data.get_nutinfo_for_inglist(INGREDIENTS, rd)
+    nested = NutritionInfoList([nutinfo, nutrition_data.get_nutinfo_for_item("milk", 2, "c.")])
+    for field in SUMMABLE_FIELDS:
+        expected = sum(getattr(ni, field) for ni in nutinfo)
+        assert getattr(nutinfo, field) == pytest.approx(expected)
+        assert getattr(nested, field) == pytest.approx(expected + getattr(nested[1], field))
+    assert nutinfo.desc == ", ".join(str(ni.desc) for ni in nutinfo)
+    assert nutinfo._get_vapor()
+
+    # Turning vapor into matter changes our totals.
+    kcal = nested.kcal
+    nutrition_data.set_key_from_ndbno("unicorn dust", 1001)
+    nutrition_data.set_conversion("unicorn dust", "pinch", 1)
+    nested._reset()
+    assert nested.kcal == pytest.approx(kcal + 717 * 0.01)
+
+
+def test_bulk_loaders_match_line_by_line(new_database, tmp_path):
+    line_by_line = nutrition_database(new_database)
+    databaseGrabber.DatabaseGrabber(line_by_line).grab_data_line_by_line()
+    bulk = nutrition_database(new_database)
+    with bulk.db.connect() as connection:
+        databaseGrabber.load_usda_data(connection, bulk.nutrition_table, bulk.usda_weights_table)
+    prebuilt = nutrition_database(new_database)
+    databaseGrabber.build_nutrition_database(tmp_path / "nutrition.sqlite")
+    prebuilt.load_nutrition_database(tmp_path / "nutrition.sqlite")
+    # Loading again replaces rather than adds to what we have.
+    prebuilt.load_nutrition_database(tmp_path / "nutrition.sqlite")
+
+    for table in ["nutrition_table", "usda_weights_table"]:
+        counts = [rd.fetch_len(getattr(rd, table)) for rd in (line_by_line, bulk, prebuilt)]
+        assert counts[0] > 1000
+        assert counts == [counts[0]] * 3
+    def spot_values(rd):
+        rows = [rd.fetch_one(rd.nutrition_table, ndbno=ndbno) for ndbno in (1001, 6425, 20081)]
+        weights = rd.fetch_all(rd.usda_weights_table, ndbno=1001)
+        return [tuple(row) for row in rows], sorted((w.seq, w.amount, w.unit, w.gramwt, w.ndata, w.stdev) for w in weights)
+
+    rows, weights = spot_values(line_by_line)
+    assert spot_values(bulk) == spot_values(prebuilt) == (rows, weights)
+    butter = line_by_line.fetch_one(line_by_line.nutrition_table, ndbno=1001)
+    assert (butter.desc, butter.kcal, butter.gramdsc1, butter.gramwt2, butter.foodgroup) == ("BUTTER,WITH SALT", 717, "1 cup", 14.2, "Dairy & Egg Products")
+    assert weights[:2] == [(1, 1, "cup", 227, None, None), (2, 1, "tbsp", 14.2, None, None)]
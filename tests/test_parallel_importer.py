@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from gourmand import check_encodings
+from gourmand.importers import importer, parallel_importer
+from gourmand.importers.parallel_importer import RECIPES, ParallelImporter, parse_file, start_worker
+from gourmand.plugins.import_export.mealmaster_plugin.mealmaster_importer_plugin import MealmasterImporterPlugin
+
+TEST_FILE_DIRECTORY = Path(__file__).parent / "recipe_files"
+FILES = [str(TEST_FILE_DIRECTORY / fn) for fn in ["mealmaster.mmf", "mealmaster_2_col.mmf"]]
+
+
+def describe(rd, recs):
+    return sorted(
+        (r.title, r.yields, r.yield_unit, [(i.amount, i.unit, i.item, i.ingkey, i.inggroup, i.optional) for i in rd.get_ings(r)]) for r in recs
+    )
+
+
+def test_parallel_import_matches_serial_import():
+    plugin = MealmasterImporterPlugin()
+    serial = []
+    for fn in FILES:
+        file_importer = plugin.get_importer(fn)
+        file_importer.pre_run()
+        file_importer.do_run()
+        serial.extend(file_importer.added_recs)
+    parallel = ParallelImporter([(fn, plugin) for fn in FILES], 2, None)
+    parallel.do_run()
+    assert not parallel.failed_files and not parallel.files_to_ask
+    assert len(serial) > len(FILES)
+    assert describe(parallel.rd, parallel.added_recs) == describe(parallel.rd, serial)
+
+
+def test_workers_have_no_database(monkeypatch):
+    expected = list(MealmasterImporterPlugin().get_importer(FILES[1]).parse())
+    rd = importer.Importer().rd
+    # start_worker sets these for good, as a worker would.
+    monkeypatch.setattr(check_encodings, "ask_user", check_encodings.ask_user)
+    monkeypatch.setattr(importer, "worker_recipe_manager", None)
+    start_worker(rd.km.get_index(), rd.get_unique_values("unit", rd.ingredients_table))
+
+    def get_recipe_manager():
+        raise AssertionError("A worker opened the database")
+
+    monkeypatch.setattr(importer, "get_recipe_manager", get_recipe_manager)
+    assert parse_file(MealmasterImporterPlugin, FILES[1]) == (RECIPES, expected)
+    assert isinstance(importer.worker_recipe_manager, parallel_importer.WorkerRecipeManager)
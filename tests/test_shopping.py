@@ -0,0 +1,100 @@
+import unittest
+
+from gourmand.shopping import Shopper, ShoppingAggregator
+
+RECIPES = {
+    "pancakes": [
+        ("1", "c.", "flour, all purpose"),
+        (2, "c.", "milk"),
+        (1, "tsp.", "salt"),
+        (2, "", "egg"),
+        (None, None, "vanilla extract"),
+        (1, "tbs.", "sugar"),
+    ],
+    "omelette": [
+        (3, "", "egg"),
+        (0.5, "c.", "milk"),
+        (50, "g", "cheese, cheddar"),
+        (1, "tsp.", "salt"),
+        ((1, 2), "tbs.", "butter"),
+        (2, "cloves", "garlic"),
+    ],
+    "cake": [
+        (2, "c.", "flour, all purpose"),
+        (8, "tbs.", "butter"),
+        (4, "oz", "cheese, cheddar"),
+        (1, "tsp.", "vanilla extract"),
+        (1, "pinch", "salt"),
+        (3, "cloves", "garlic"),
+        (1, "tsp.", "sugar"),
+    ],
+}
+
+
+def organized(sh, dic):
+    """Return dic (as handed to Shopper.organize) split into shopping list and pantry."""
+    data = {k: v for k, v in dic.items() if k not in sh.pantry}
+    pantry = {k: v for k, v in dic.items() if k in sh.pantry}
+    return sh.organize(data), sh.organize(pantry)
+
+
+def scaled(ingredients, mult):
+    ret = []
+    for a, u, k in ingredients:
+        if isinstance(a, tuple):
+            a = (a[0] * mult, a[1] * mult)
+        elif a:
+            a = float(a) * mult
+        ret.append((a, u, k))
+    return ret
+
+
+class TestShoppingAggregator(unittest.TestCase):
+    def assertMatchesShopper(self, aggregator, recipes):
+        lst = []
+        for name, mult in recipes:
+            lst.extend(scaled(RECIPES[name], mult))
+        sh = Shopper(lst)
+        self.assertEqual(organized(sh, aggregator.dic), (sh.organize(sh.dic), sh.organize(sh.mypantry)))
+
+    def test_add(self):
+        aggregator = ShoppingAggregator()
+        recipes = []
+        for name in RECIPES:
+            aggregator.add(name, RECIPES[name])
+            recipes.append((name, 1))
+            self.assertMatchesShopper(aggregator, recipes)
+
+    def test_remove(self):
+        aggregator = ShoppingAggregator()
+        for name in RECIPES:
+            aggregator.add(name, RECIPES[name])
+        aggregator.remove("omelette")
+        self.assertMatchesShopper(aggregator, [("pancakes", 1), ("cake", 1)])
+        aggregator.remove("pancakes")
+        self.assertMatchesShopper(aggregator, [("cake", 1)])
+        aggregator.remove("cake")
+        self.assertEqual(aggregator.dic, {})
+        self.assertEqual(aggregator.totals, {})
+
+    def test_rescale(self):
+        aggregator = ShoppingAggregator()
+        aggregator.add("pancakes", RECIPES["pancakes"], 2)
+        aggregator.add("cake", RECIPES["cake"])
+        self.assertMatchesShopper(aggregator, [("pancakes", 2), ("cake", 1)])
+        aggregator.rescale("pancakes", 3)
+        self.assertMatchesShopper(aggregator, [("pancakes", 3), ("cake", 1)])
+        aggregator.rescale("cake", 0.5)
+        self.assertMatchesShopper(aggregator, [("pancakes", 3), ("cake", 0.5)])
+
+    def test_only_touched_keys_are_formatted(self):
+        aggregator = ShoppingAggregator()
+        aggregator.add("pancakes", RECIPES["pancakes"])
+        milk = aggregator.dic["milk"]
+        aggregator.add("cake", RECIPES["cake"])
+        self.assertIs(aggregator.dic["milk"], milk)
+        self.assertIsNot(aggregator.dic["flour, all purpose"], milk)
+
+
+if __name__ == "__main__":
+    unittest.main()